@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+dashboard.py
+品种池总览页 (见 src/analysis/dashboard.py): 由 data/processed 中的分析结果生成 output/index.html，
+每个品种一行 —— 名称、最后笔端点、当前候选和最近走势迷你图 (叠加笔)，点击名称打开完整交互式图表。
+
+用法:
+    # 批量计算后生成总览页
+    uv run run_pipeline.py data/raw/*.xlsx
+    uv run dashboard.py
+
+    # 只计算不预先生成图表时，链接到按需图表服务 (serve_charts.py)
+    uv run dashboard.py --chart-url http://127.0.0.1:8766/chart/
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到 path
+PROJECT_ROOT = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from run_pipeline import DATA_PROCESSED_DIR, OUTPUT_DIR
+from src.analysis.dashboard import SPARK_WINDOW, SPARK_POINTS
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="生成品种池总览页 (最新笔状态 + 迷你走势图)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+    uv run dashboard.py                                             # 写入 output/index.html
+    uv run dashboard.py --chart-url http://127.0.0.1:8766/chart/    # 链接到按需图表服务
+        """
+    )
+    parser.add_argument("directory", nargs="?", type=Path, default=DATA_PROCESSED_DIR,
+                        help=f"分析结果目录 (默认 {DATA_PROCESSED_DIR})")
+    parser.add_argument("-o", "--output", type=Path, default=OUTPUT_DIR / "index.html",
+                        help=f"总览页保存路径 (默认 {OUTPUT_DIR / 'index.html'})")
+    parser.add_argument("--chart-url", default=None,
+                        help="按需图表服务的图表地址前缀，没有预先生成的交互式图表时链接到服务")
+    parser.add_argument("--window", type=int, default=SPARK_WINDOW,
+                        help=f"迷你走势图的合并K线根数 (默认 {SPARK_WINDOW})")
+    parser.add_argument("--points", type=int, default=SPARK_POINTS,
+                        help=f"迷你走势图降采样后的点数 (默认 {SPARK_POINTS})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="读取分析结果的并行进程数 (默认 min(4, CPU 核数)，1 表示串行)")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    if not args.directory.is_dir():
+        print(f"目录不存在: {args.directory}")
+        return 1
+    if args.window < 2 or args.points < 1:
+        print("--window 至少为 2，--points 至少为 1")
+        return 1
+
+    from src.analysis.dashboard import build_dashboard
+
+    start = time.perf_counter()
+    workers = args.workers or min(4, os.cpu_count() or 1)
+    summaries = build_dashboard(args.directory, args.output, chart_url=args.chart_url,
+                                window=args.window, points=args.points, max_workers=workers)
+    failed = [s for s in summaries if s.error]
+    print(f"总览页已保存至: {args.output}  ({len(summaries)} 个品种，{time.perf_counter() - start:.2f}s)")
+    for s in failed:
+        print(f"  ❌ {s.key}: {s.error}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
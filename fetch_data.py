@@ -15,6 +15,9 @@ fetch_data.py
     
     # 自定义日期范围
     uv run fetch_data.py --start 2023-01-01 --end 2024-12-30
+    
+    # 剖析获取/保存阶段 (也可通过环境变量 TL_PROFILE 开启)
+    uv run fetch_data.py TL.CFE --profile cprofile,tracemalloc:fetch
 
 要求:
     - Wind 金融终端已启动并登录
@@ -23,6 +26,7 @@ fetch_data.py
 
 import argparse
 import sys
+from contextlib import nullcontext
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -32,6 +36,7 @@ sys.path.insert(0, str(PROJECT_ROOT))
 
 from src.io.data_config import DATA_SOURCES, get_config, list_configs
 from src.io.adapters.wind_api_adapter import WindAPIAdapter
+from src.instrument import PipelineMetrics, ProfileConfig
 
 
 def parse_args():
@@ -81,7 +86,20 @@ def parse_args():
         help="列出所有可用的数据代码"
     )
     
-    return parser.parse_args()
+    parser.add_argument(
+        "--profile",
+        metavar="SPEC",
+        default=None,
+        help="性能剖析: 'cprofile'、'tracemalloc' 或二者，可加 ':fetch' / ':save' 只剖析指定阶段；"
+             "默认读取环境变量 TL_PROFILE，结果写在输出目录"
+    )
+    
+    args = parser.parse_args()
+    try:
+        args.profile = ProfileConfig.parse(args.profile) if args.profile else ProfileConfig.from_env()
+    except ValueError as e:
+        parser.error(str(e))
+    return args
 
 
 def main():
@@ -147,15 +165,19 @@ def main():
             
             print(f"\n📊 {cfg.symbol} ({cfg.name})")
             try:
-                adapter.fetch_and_save(
-                    symbol=cfg.symbol,
-                    output_dir=args.output,
-                    start_date=start_date,
-                    end_date=end_date,
-                    fields=cfg.fields,
-                    trading_calendar=cfg.trading_calendar,
-                    name=cfg.name,
-                )
+                # 未开启剖析时不激活计量记录，fetch_and_save 中的阶段钩子为空操作
+                metrics = PipelineMetrics(input_file=cfg.symbol, symbol=cfg.symbol,
+                                          profile=args.profile, output_dir=Path(args.output))
+                with (metrics.record() if args.profile else nullcontext()):
+                    adapter.fetch_and_save(
+                        symbol=cfg.symbol,
+                        output_dir=args.output,
+                        start_date=start_date,
+                        end_date=end_date,
+                        fields=cfg.fields,
+                        trading_calendar=cfg.trading_calendar,
+                        name=cfg.name,
+                    )
                 success_count += 1
                 
                 # --------------------------------------------------------
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+live.py
+实时图表: 在本地启动图表服务 (见 src/analysis/live.py)，监视一个数据文件，
+文件更新后只把新K线和变化的笔/标记推送到已打开的页面 (SSE)，页面无需刷新。
+
+合并和笔识别从检查点续算，每次更新只计算新增的K线。
+数据文件按固定间隔轮询 (修改时间和大小)，签名在 --debounce 秒内不再变化才重新读取。
+
+用法:
+    # 打开 http://127.0.0.1:8765/ 查看 (Ctrl+C 退出)
+    uv run live.py data/raw/TL.CFE.xlsx
+
+    # 指定端口并自动打开浏览器
+    uv run live.py data/raw/TL.CFE.xlsx --port 9000 --open
+
+    # 每 20 根K线最多显示 2 个 H/L 标记
+    uv run live.py data/raw/TL.CFE.xlsx --max-markers-per-bucket 2
+"""
+
+import argparse
+import sys
+import time
+import webbrowser
+from pathlib import Path
+from typing import Optional
+
+# 添加项目根目录到 path
+PROJECT_ROOT = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _signature(path: Path):
+    """文件签名 (修改时间 ns, 大小)，文件不存在时为 None"""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def serve(path: Path, host: str = '127.0.0.1', port: int = 8765, interval: float = 1.0,
+          debounce: float = 1.0, open_browser: bool = False, max_per_bucket: Optional[int] = None) -> None:
+    """
+    启动实时图表服务并监视数据文件，直到 Ctrl+C。
+
+    Args:
+        path: 数据文件
+        host: 监听地址
+        port: 端口
+        interval: 轮询间隔 (秒)
+        debounce: 文件签名保持不变多少秒后重新读取
+        open_browser: 是否自动打开浏览器
+        max_per_bucket: H/L 标记密度上限 (每 20 根K线最多保留的标记数)，None 表示不限
+    """
+    from src.io import load_ohlc
+    from src.analysis.live import LiveFeed, LiveChartServer
+
+    data = load_ohlc(path)
+    feed = LiveFeed(data.df, title=f"{data.name} [{data.symbol}] (实时)", max_per_bucket=max_per_bucket)
+    server = LiveChartServer(feed, host=host, port=port).start()
+    print(f"实时图表: {server.url}  (监视 {path}，Ctrl+C 退出)")
+    if open_browser:
+        webbrowser.open(server.url)
+
+    seen = _signature(path)
+    pending = None      # (签名, 最后一次变化的时间)
+    try:
+        while True:
+            time.sleep(interval)
+            sig = _signature(path)
+            if sig is None or sig == seen:
+                pending = None
+                continue
+            now = time.monotonic()
+            if pending is None or pending[0] != sig:
+                pending = (sig, now)
+                continue
+            if now - pending[1] < debounce:
+                continue
+            seen, pending = sig, None
+            stamp = time.strftime('%H:%M:%S')
+            try:
+                messages = feed.update(load_ohlc(path).df)
+            except Exception as e:
+                print(f"[{stamp}] ❌ 读取失败: {type(e).__name__}: {e}")
+                continue
+            kinds = ', '.join(m['type'] for m in messages) or '无变化'
+            print(f"[{stamp}] 更新: {kinds}  ({feed.subscriber_count} 个页面)")
+    except KeyboardInterrupt:
+        print("\n停止服务")
+    finally:
+        server.stop()
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="实时图表服务: 数据文件更新后推送新K线和笔/标记变化",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+    uv run live.py data/raw/TL.CFE.xlsx               # http://127.0.0.1:8765/
+    uv run live.py data/raw/TL.CFE.xlsx --open        # 自动打开浏览器
+        """
+    )
+    parser.add_argument("file", type=Path, help="数据文件")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址 (默认 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="端口 (默认 8765)")
+    parser.add_argument("--interval", type=float, default=1.0, help="轮询间隔秒数，默认 1")
+    parser.add_argument("--debounce", type=float, default=1.0,
+                        help="文件写入稳定多少秒后重新读取，默认 1")
+    parser.add_argument("--max-markers-per-bucket", type=int, default=None, metavar="N",
+                        help="H/L 标记密度上限: 每 20 根K线最多保留 N 个 (默认不限)")
+    parser.add_argument("--open", action="store_true", help="自动打开浏览器")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    if not args.file.exists():
+        print(f"文件不存在: {args.file}")
+        return 1
+    if args.max_markers_per_bucket is not None and args.max_markers_per_bucket < 1:
+        print("--max-markers-per-bucket 必须 ≥ 1")
+        return 1
+    serve(args.file, host=args.host, port=args.port, interval=args.interval,
+          debounce=args.debounce, open_browser=args.open, max_per_bucket=args.max_markers_per_bucket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
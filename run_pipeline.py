@@ -11,17 +11,34 @@ run_pipeline.py
 用法:
     uv run run_pipeline.py              # 交互式选择数据文件
     uv run run_pipeline.py data/raw/TL.CFE.xlsx  # 直接指定文件
+    uv run run_pipeline.py data/raw/TL.CFE.xlsx --string-columns  # 额外输出旧版字符串列 (strokes CSV 随之为逐K线完整表)
+    uv run run_pipeline.py data/raw/TL.CFE.xlsx --wide-strokes    # strokes CSV 输出逐K线完整表
+    uv run run_pipeline.py data/raw/*.xlsx --metrics run_metrics.jsonl  # 指定计量记录文件
+    uv run run_pipeline.py data/raw/TL.CFE.xlsx --profile cprofile,tracemalloc:merge,strokes  # 剖析指定阶段
+    TL_PROFILE=cprofile uv run run_pipeline.py data/raw/TL.CFE.xlsx   # 同上，通过环境变量开启
+    uv run run_pipeline.py data/raw/*.xlsx --plots none               # 筛选时不生成静态图表
+    uv run run_pipeline.py data/raw/TL.CFE.xlsx --full-history         # 笔端点标记图绘制全部历史
+    uv run run_pipeline.py data/raw/*.xlsx --incremental               # 从上次的检查点继续合并/笔识别
+    uv run run_pipeline.py data/raw/*.xlsx --incremental --delta       # 另外输出笔端点事件的变更集
+    uv run run_pipeline.py data/raw/*.xlsx --plots none --no-interactive  # 只计算，图表由 serve_charts.py 按需生成
+    uv run run_pipeline.py data/raw/TL.CFE.xlsx --max-markers-per-bucket 2  # 交互式图表每 20 根K线最多 2 个 H/L 标记
     
 输出文件:
     - data/processed/*_processed.csv   (带状态标签的原始K线)
     - data/processed/*_merged.csv      (合并后的K线)
-    - data/processed/*_strokes.csv     (带笔端点标记的最终结果)
-    - output/*_merged_kline.png        (合并后K线图)
-    - output/*_strokes.png             (笔端点标记图)
+    - data/processed/*_strokes.csv     (笔端点事件表: T/B/Tx/Bx/Tc/Bc 每个标记一行)
+    - data/processed/*_checkpoint.npz  (合并器/笔过滤检查点，--incremental 时读写)
+    - data/processed/*_strokes_delta.csv (与上次运行相比的笔端点事件变更集，--delta 时输出)
+    - data/processed/*_meta.json       (品种代码、名称，供按需图表服务使用)
+    - output/*_merged_kline.png        (合并后K线图，--plots 控制格式；all 时只输出 PNG)
+    - output/*_strokes.png/.svg        (笔端点标记图，--plots 控制格式)
+    - output/*_interactive.html        (交互式图表，--no-interactive 时不生成)
+    - output/pipeline_metrics.jsonl    (各阶段耗时/CPU/峰值内存及计数，每个品种追加一行)
 """
 
 import sys
 from pathlib import Path
+from typing import Optional
 
 # 确保 src 模块可导入
 sys.path.insert(0, str(Path(__file__).parent))
@@ -31,6 +48,9 @@ DATA_RAW_DIR = Path("data/raw")
 DATA_PROCESSED_DIR = Path("data/processed")
 OUTPUT_DIR = Path("output")
 
+# 各阶段计量记录 (JSON lines，追加写入)
+METRICS_FILE = OUTPUT_DIR / "pipeline_metrics.jsonl"
+
 # 支持的数据文件扩展名
 SUPPORTED_EXTENSIONS = {'.xlsx', '.xls', '.csv'}
 
@@ -177,7 +197,55 @@ def select_file_interactive() -> list[str]:
             sys.exit(0)
 
 
-def main(input_file: str):
+def main(input_file: str, string_columns: bool = False, wide_strokes: bool = False,
+         metrics=None, plots: str = 'all', render_pool=None, full_history: bool = False,
+         strict: bool = False, incremental: bool = False, delta: bool = False,
+         interactive: bool = True, max_markers_per_bucket: Optional[int] = None):
+    """
+    处理单个数据文件，并计量各阶段耗时和计数。
+
+    Args:
+        input_file: 数据文件路径
+        string_columns: CSV 中是否同时输出旧版字符串列；字符串列只存在于逐K线格式，因此隐含 wide_strokes
+        wide_strokes: strokes CSV 是否输出逐K线完整表 (默认为稀疏事件表)
+        metrics: 计量记录 (PipelineMetrics)，None 则新建 (剖析配置取自环境变量 TL_PROFILE)
+        plots: 静态图表格式 'none' / 'png' / 'svg' / 'all'
+        render_pool: 静态图表渲染池 (RenderPool)，None 则在当前进程同步渲染
+        full_history: 笔端点标记图是否绘制全部历史 (默认只画最后 100 根)
+        strict: 严格模式，原始数据存在 OHLC 不一致或价格缺失时报错
+        incremental: 从上次保存的检查点继续合并和笔识别 (结果与从头计算一致)，并更新检查点
+        delta: 与上次的笔端点事件表对比，另外输出变更集 *_strokes_delta.csv (仅稀疏事件表格式)
+        interactive: 是否生成交互式 HTML 图表 (False 时由 serve_charts.py 在打开时按需生成)
+        max_markers_per_bucket: 交互式图表的 H/L 标记密度上限 (每 MARKER_BUCKET_BARS 根K线最多保留的标记数)，
+                                None 表示不限
+
+    Returns:
+        PipelineMetrics: 本次处理的计量记录 (失败时异常照常抛出，记录状态为 failed)
+
+    Raises:
+        ValueError: delta 与逐K线格式 (wide_strokes / string_columns) 同时指定
+    """
+    wide_strokes = wide_strokes or string_columns
+    if delta and wide_strokes:
+        raise ValueError("delta 仅支持稀疏事件表格式，不能与 wide_strokes / string_columns 同时使用")
+    from src.instrument import PipelineMetrics, ProfileConfig
+    from src.analysis.render import RenderPool, plot_formats
+    if metrics is None:
+        metrics = PipelineMetrics(input_file=str(input_file), profile=ProfileConfig.from_env())
+    pool = render_pool if render_pool is not None else RenderPool(max_workers=0)
+    with metrics.record():
+        _run(input_file, string_columns, wide_strokes, plot_formats(plots), pool, full_history, strict,
+             incremental, delta, interactive, max_markers_per_bucket)
+    print(f"\n⏱  {metrics.format_stages()} | 总计 {metrics.wall_s:.2f}s")
+    return metrics
+
+
+def _run(input_file: str, string_columns: bool, wide_strokes: bool, formats: tuple, render_pool,
+         full_history: bool, strict: bool, incremental: bool, delta: bool, interactive: bool,
+         max_markers_per_bucket: Optional[int]):
+    from src.instrument import stage, count, annotate
+    from src.analysis.render import merged_chart_job, merged_plot_formats, strokes_chart_job
+    
     print("=" * 60)
     print("K 线分析流水线 (Bill Williams / Chan Theory)")
     print("=" * 60)
@@ -189,7 +257,10 @@ def main(input_file: str):
     # Step 1: 加载数据 (提前到这里以便使用数据中的名称来创建目录)
     print(f"\n[Step 1/4] 加载数据: {input_file}")
     from src.io import load_ohlc
-    data = load_ohlc(input_file)
+    with stage('load'):
+        data = load_ohlc(input_file, strict=strict)
+    annotate(symbol=data.symbol, name=data.name)
+    count(rows_in=len(data.df))
     print(f"  加载完成: {data}")
     print(f"  日期范围: {data.date_range[0].date()} ~ {data.date_range[1].date()}")
 
@@ -214,76 +285,114 @@ def main(input_file: str):
     ticker_output_dir = OUTPUT_DIR / dir_name
     ticker_processed_dir.mkdir(parents=True, exist_ok=True)
     ticker_output_dir.mkdir(parents=True, exist_ok=True)
+    annotate(output_dir=ticker_output_dir)
     
     # 输出路径
     processed_csv = ticker_processed_dir / f"{base_name}_processed.csv"
     merged_csv = ticker_processed_dir / f"{base_name}_merged.csv"
     strokes_csv = ticker_processed_dir / f"{base_name}_strokes.csv"
+    checkpoint_file = ticker_processed_dir / f"{base_name}_checkpoint.npz"
+    delta_csv = ticker_processed_dir / f"{base_name}_strokes_delta.csv"
+    meta_file = ticker_processed_dir / f"{base_name}_meta.json"
     merged_plot = ticker_output_dir / f"{base_name}_merged_kline.png"
     strokes_plot = ticker_output_dir / f"{base_name}_strokes.png"
     
+    from src.analysis.chart_service import write_meta
+    write_meta(meta_file, data.symbol, data.name, input_file)
+    
     # Step 2: 处理原始数据，添加K线状态
     print(f"\n[Step 2/4] 添加 K 线状态标签...")
     from src.analysis import process_and_save
-    process_and_save(data, str(processed_csv))
+    with stage('kline_status'):
+        process_and_save(data, str(processed_csv), string_columns=string_columns)
+    
+    # 增量计算: 从检查点继续合并和笔识别
+    engine = None
+    if incremental:
+        from src.analysis.incremental import IncrementalEngine, load_checkpoint
+        try:
+            engine = IncrementalEngine(load_checkpoint(checkpoint_file))
+        except ValueError as e:
+            print(f"  ⚠️ {e}，从头计算")
+            engine = IncrementalEngine()
     
     # Step 3: K 线合并
     print(f"\n[Step 3/4] 合并包含关系的 K 线...")
     from src.analysis.merging import apply_kline_merging
-    apply_kline_merging(str(processed_csv), str(merged_csv), 
-                        save_plot_path=str(merged_plot))
+    with stage('merge'):
+        merged = apply_kline_merging(str(processed_csv), str(merged_csv),
+                                     string_columns=string_columns, plot=False,
+                                     merge=engine.merge if engine else None)
+    if engine is not None:
+        if engine.mode == 'warm':
+            print(f"  从检查点继续: 跳过 {engine.resumed_from} 根原始K线")
+        else:
+            from src.analysis.incremental import COLD_REASONS
+            print(f"  从头计算: {COLD_REASONS.get(engine.reason, engine.reason)}")
+        count(resumed_bars=engine.resumed_from)
+    if merged is not None:
+        count(merged_bars=len(merged.df), merge_count=merged.merge_count)
+        # 静态图表交给渲染池，不阻塞后续计算
+        render_pool.submit(merged_chart_job(merged.df, merged_plot, formats))
     
     # Step 4: 分型识别与笔过滤
     print(f"\n[Step 4/4] 识别分型并生成有效笔...")
     from src.analysis.fractals import process_strokes
-    process_strokes(str(merged_csv), str(strokes_csv),
-                    save_plot_path=str(strokes_plot))
+    with stage('strokes'):
+        stroke_result = process_strokes(str(merged_csv), str(strokes_csv),
+                                        string_columns=string_columns, wide=wide_strokes, plot=False,
+                                        compute=engine.strokes if engine else None,
+                                        delta_path=str(delta_csv) if delta else None)
+    if engine is not None:
+        from src.analysis.incremental import save_checkpoint
+        if engine.checkpoint is not None:
+            save_checkpoint(engine.checkpoint, checkpoint_file)
+            print(f"  检查点已保存: {checkpoint_file.name} (覆盖 {engine.checkpoint.raw_next} 根原始K线)")
+        else:
+            checkpoint_file.unlink(missing_ok=True)
+    if stroke_result is not None:
+        count(raw_fractals=stroke_result.raw_count, strokes=len(stroke_result.strokes),
+              replaced=len(stroke_result.replaced))
+        render_pool.submit(strokes_chart_job(merged.df, stroke_result, strokes_plot, formats,
+                                             full_history=full_history))
 
     # Step 5: 生成交互式图表
-    print(f"\n[Step 5/5] 生成交互式 HTML 图表...")
-    from src.analysis import ChartBuilder, compute_ema
     interactive_plot = ticker_output_dir / f"{base_name}_interactive.html"
-    
-    # 重新加载数据以获取绘图所需的DataFrame
-    import pandas as pd
-    
-    # 注意：这里我们使用合并后的数据来画图，因为它更干净
-    # 但strokes是基于合并后数据的索引，所以是对齐的
-    merged_df = pd.read_csv(merged_csv)
-    # 转换 datetime
-    merged_df['datetime'] = pd.to_datetime(merged_df['datetime'])
-    
-    # 读取 strokes
-    strokes_df = pd.read_csv(strokes_csv)
-    # 转换 strokes 为 [(idx, type)] 格式
-    stroke_list = [
-        (idx, row['valid_fractal']) 
-        for idx, row in strokes_df.iterrows()
-        if pd.notna(row['valid_fractal']) and row['valid_fractal'] != ''
-    ]
-    
-    # 读取候选分型显示列 (candidate_display)
-    # 格式为 3元组: (display_idx, type, display_idx) - 第三个元素用于兼容
-    if 'candidate_display' in strokes_df.columns:
-        for idx, row in strokes_df.iterrows():
-            if pd.notna(row['candidate_display']) and row['candidate_display'] != '':
-                # 可能有多个候选分型，用逗号分隔
-                for marker_type in row['candidate_display'].split(','):
-                    stroke_list.append((idx, marker_type.strip(), idx))
-    
-    # 计算技术指标
-    merged_df['ema20'] = compute_ema(merged_df, 20)
-    
-    # 使用 ChartBuilder 构建图表
-    chart = ChartBuilder(merged_df)
-    chart.add_candlestick()
-    chart.add_indicator('EMA20', merged_df['ema20'], '#FFA500')  # 橙色
-    chart.add_strokes(stroke_list)
-    chart.add_fractal_markers(stroke_list)
-    
-    # 设置标题: Name [Symbol]
-    chart_title = f"{data.name} [{data.symbol}]"
-    chart.build(str(interactive_plot), title=chart_title)
+    if not interactive:
+        print(f"\n[Step 5/5] 跳过交互式图表 (由 serve_charts.py 按需生成)")
+    else:
+        print(f"\n[Step 5/5] 生成交互式 HTML 图表...")
+        from src.analysis.interactive import symbol_chart
+        
+        # 重新加载数据以获取绘图所需的DataFrame
+        import pandas as pd
+        from src.analysis.fractals import stroke_events
+        from src.analysis.merging import MergeProvenance
+        
+        with stage('chart'):
+            with stage('prepare'):
+                # 注意：这里我们使用合并后的数据来画图，因为它更干净
+                # 但strokes是基于合并后数据的索引，所以是对齐的
+                merged_df = pd.read_csv(merged_csv)
+                # 转换 datetime
+                merged_df['datetime'] = pd.to_datetime(merged_df['datetime'])
+                
+                # 笔事件表 (稀疏，每个 T/B/Tx/Bx/Tc/Bc 标记一行)，直接交给 ChartBuilder
+                # raw_idx 列 (分型极值所在的原始K线) 来自合并K线的来源索引
+                if stroke_result is not None:
+                    events = stroke_events(stroke_result, merged_df['datetime'],
+                                           merged_df['high'].to_numpy(), merged_df['low'].to_numpy(),
+                                           MergeProvenance.from_frame(merged_df))
+                else:
+                    events = []
+                
+                # K 线 + EMA20 (橙色) + 笔 + H/L 信号标记
+                chart = symbol_chart(merged_df, events, max_per_bucket=max_markers_per_bucket)
+            
+            # 设置标题: Name [Symbol]
+            chart_title = f"{data.name} [{data.symbol}]"
+            with stage('build'):
+                chart.build(str(interactive_plot), title=chart_title)
     
     print("\n" + "=" * 60)
     print("流水线完成！")
@@ -292,22 +401,67 @@ def main(input_file: str):
     print(f"  CSV (data/processed/):")
     print(f"    - {processed_csv.name}  (带状态标签的原始K线)")
     print(f"    - {merged_csv.name}     (合并后的K线)")
-    print(f"    - {strokes_csv.name}    (带笔端点标记的最终结果)")
+    print(f"    - {strokes_csv.name}    (笔端点事件表{'，逐K线格式' if wide_strokes else ''})")
+    if delta:
+        print(f"    - {delta_csv.name}    (笔端点事件变更集)")
     print(f"  图表 (output/):")
-    print(f"    - {merged_plot.name}  (合并后K线图)")
-    print(f"    - {strokes_plot.name}       (笔端点标记图)")
-    print(f"    - {interactive_plot.name}   (交互式HTML图表) 🆕")
+    if formats:
+        suffix = '/'.join(formats)
+        merged_suffix = '/'.join(merged_plot_formats(formats))
+        print(f"    - {merged_plot.stem}.{merged_suffix}  (合并后K线图{'，后台渲染' if render_pool.max_workers > 0 else ''})")
+        print(f"    - {strokes_plot.stem}.{suffix}       (笔端点标记图{'，后台渲染' if render_pool.max_workers > 0 else ''})")
+    if interactive:
+        print(f"    - {interactive_plot.name}   (交互式HTML图表) 🆕")
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="K 线分析流水线")
+    parser.add_argument("files", nargs="*", help="数据文件路径 (不指定则交互式选择)")
+    parser.add_argument("--string-columns", action="store_true",
+                        help="CSV 中同时输出旧版字符串列 (kline_status, valid_fractal 等)；"
+                             "字符串列只存在于逐K线格式，因此隐含 --wide-strokes")
+    parser.add_argument("--wide-strokes", action="store_true",
+                        help="strokes CSV 输出逐K线完整表 (默认为稀疏事件表)")
+    parser.add_argument("--metrics", type=Path, default=METRICS_FILE,
+                        help=f"各阶段计量记录 (JSON lines) 追加写入的文件 (默认 {METRICS_FILE})")
+    parser.add_argument("--no-metrics", action="store_true", help="不写入计量记录文件")
+    parser.add_argument("--profile", metavar="SPEC", default=None,
+                        help="性能剖析: 'cprofile'、'tracemalloc' 或二者，可加 ':阶段' 只剖析指定阶段 "
+                             "(如 cprofile,tracemalloc:merge,strokes.plot)；默认读取环境变量 TL_PROFILE，"
+                             "结果 (.prof/.alloc 及 top 摘要) 写在各品种输出目录")
+    parser.add_argument("--plots", choices=["none", "png", "svg", "all"], default="all",
+                        help="静态图表 (合并K线图、笔端点标记图) 的输出格式，none 表示不生成 (默认 all)")
+    parser.add_argument("--strict", action="store_true",
+                        help="严格模式: 原始数据存在 OHLC 不一致 (low > min(open, close) 等) 或价格缺失时报错")
+    parser.add_argument("--full-history", action="store_true",
+                        help="笔端点标记图绘制全部历史 (集合绘制，默认只画最后 100 根)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量计算: 从上次保存的检查点继续合并和笔识别 (历史数据被修订时自动从头计算)")
+    parser.add_argument("--delta", action="store_true",
+                        help="与上次的笔端点事件表对比，另外输出变更集 *_strokes_delta.csv (新增/移除/变更类型的端点、"
+                             "新的 Tx/Bx、移动的候选分型)")
+    parser.add_argument("--no-interactive", action="store_true",
+                        help="不生成交互式 HTML 图表 (批量计算时使用，图表由 serve_charts.py 在打开时按需生成)")
+    parser.add_argument("--max-markers-per-bucket", type=int, default=None, metavar="N",
+                        help="交互式图表的 H/L 标记密度上限: 每 20 根K线最多保留 N 个 (默认不限)")
+    parser.add_argument("--render-workers", type=int, default=None,
+                        help="静态图表渲染进程数 (默认 min(4, CPU 核数)，0 表示在主进程中同步渲染)")
+    args = parser.parse_args()
+    if args.delta and (args.wide_strokes or args.string_columns):
+        parser.error("--delta 仅支持稀疏事件表格式，不能与 --wide-strokes / --string-columns 同时使用")
+    if args.max_markers_per_bucket is not None and args.max_markers_per_bucket < 1:
+        parser.error("--max-markers-per-bucket 必须 ≥ 1")
+    
     # 默认数据文件
     DEFAULT_FILE = "data/raw/TB10Y.WI.xlsx"
     input_files = []
     
     # 支持命令行参数或交互式选择
-    if len(sys.argv) > 1:
+    if args.files:
         # 命令行参数传入多个文件
-        input_files = sys.argv[1:]
+        input_files = args.files
     elif sys.stdin.isatty():
         # 交互式终端，让用户选择
         input_files = select_file_interactive()
@@ -316,18 +470,56 @@ if __name__ == "__main__":
         print(f"非交互模式，使用默认文件: {DEFAULT_FILE}")
         input_files = [DEFAULT_FILE]
     
-    # 批量处理
+    from src.instrument import PipelineMetrics, ProfileConfig, write_jsonl, summary_table
+    from src.analysis.render import RenderPool
+    
+    try:
+        profile = ProfileConfig.parse(args.profile) if args.profile else ProfileConfig.from_env()
+    except ValueError as e:
+        parser.error(str(e))
+    
+    # 批量处理 (静态图表在渲染池中与后续品种的计算并行)
     total = len(input_files)
+    records = []
+    render_pool = RenderPool(max_workers=0 if args.plots == 'none' else args.render_workers)
     for i, f in enumerate(input_files, 1):
         if total > 1:
             print("\n" + "#" * 60)
             print(f"正在处理第 {i}/{total} 个文件: {Path(f).name}")
             print("#" * 60)
         
+        metrics = PipelineMetrics(input_file=str(f), profile=profile)
+        records.append(metrics)
         try:
-            main(f)
+            main(f, string_columns=args.string_columns, wide_strokes=args.wide_strokes,
+                 metrics=metrics, plots=args.plots, render_pool=render_pool,
+                 full_history=args.full_history, strict=args.strict, incremental=args.incremental,
+                 delta=args.delta, interactive=not args.no_interactive,
+                 max_markers_per_bucket=args.max_markers_per_bucket)
         except Exception as e:
             print(f"\n❌ 处理失败 {f}: {e}")
             # 如果是批量处理，不要因为一个失败就退出全部（除非是严重错误）
             if total == 1:
                 raise
+        finally:
+            # 每个品种处理完立即写入，批量中途中断也不丢失已完成的记录
+            if not args.no_metrics:
+                write_jsonl([metrics], args.metrics)
+    
+    if render_pool.max_workers > 0 and args.plots != 'none':
+        print(f"\n等待静态图表渲染完成...")
+    render_pool.close()
+    if render_pool.files:
+        print(f"静态图表: {len(render_pool.files)} 个文件")
+    for path, error in render_pool.errors:
+        print(f"❌ 图表渲染失败 {path}: {error}")
+    
+    if total > 1:
+        import pandas as pd
+        print("\n" + "=" * 60)
+        print(f"批量处理汇总 ({total} 个文件)")
+        print("=" * 60)
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(summary_table(records).to_string(index=False))
+    if not args.no_metrics:
+        print(f"\n计量记录已追加至: {args.metrics}")
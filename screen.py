@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+screen.py
+品种池筛选: 一次计算 data/raw 中所有品种的最新笔状态 (不生成图表)，输出一张汇总表。
+
+用法:
+    # 全部品种，结果写入 output/screen.csv
+    uv run screen.py
+
+    # 最新一根K线出现新候选分型 (Tc/Bc) 的品种
+    uv run screen.py --recent 0 --kind Tc Bc
+
+    # 最近 3 根K线内确认了 T/B 或出现 H/L 信号的品种，4 个进程
+    uv run screen.py --recent 3 --kind T B H L --workers 4
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到 path
+PROJECT_ROOT = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.analysis.fractals import MIN_DIST, StrokeRules
+from src.analysis.screener import screen_universe, filter_recent, SCREEN_COLUMNS
+
+
+DATA_EXTENSIONS = ('.xlsx', '.csv')
+
+# 终端显示的列 (完整列写入 CSV)
+DISPLAY_COLUMNS = [
+    'symbol', 'name', 'last_datetime', 'last_close',
+    'endpoint', 'bars_since_endpoint', 'candidate', 'bars_since_candidate',
+    'setup', 'bars_since_setup',
+]
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="品种池最新笔状态筛选",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+    uv run screen.py                              # 全部品种
+    uv run screen.py --recent 0 --kind Tc Bc      # 最新K线出现新候选分型
+    uv run screen.py --sort bars_since_setup      # 按最近 H/L 信号排序
+        """
+    )
+
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="数据文件或目录 (默认 data/raw)"
+    )
+
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("output/screen.csv"),
+        help="汇总表输出路径，默认 output/screen.csv"
+    )
+
+    parser.add_argument(
+        "--recent",
+        type=int,
+        default=None,
+        metavar="N",
+        help="只保留最近 N 根合并K线内出现新事件的品种 (0 = 仅最新一根)"
+    )
+
+    parser.add_argument(
+        "--kind",
+        nargs="+",
+        choices=["T", "B", "Tc", "Bc", "H", "L"],
+        default=None,
+        help="--recent 考察的事件类型 (默认全部)"
+    )
+
+    parser.add_argument(
+        "--sort",
+        choices=SCREEN_COLUMNS,
+        default=None,
+        help="排序列 (默认 symbol，使用 --recent 时按最近事件排序)"
+    )
+
+    parser.add_argument(
+        "--min-dist",
+        type=int,
+        default=MIN_DIST,
+        help=f"笔过滤的最小间隔，默认 {MIN_DIST}"
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="并行进程数 (默认 CPU 核数，1 表示串行)"
+    )
+
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="显示数据加载过程的输出"
+    )
+
+    return parser.parse_args()
+
+
+def collect_paths(paths: list[str]) -> list[Path]:
+    """展开目录为其中的数据文件"""
+    result = []
+    for p in map(Path, paths or ["data/raw"]):
+        if p.is_dir():
+            result.extend(sorted(f for f in p.iterdir() if f.suffix.lower() in DATA_EXTENSIONS))
+        else:
+            result.append(p)
+    return result
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    paths = collect_paths(args.paths)
+    if not paths:
+        print("未找到数据文件")
+        return 1
+
+    workers = args.workers if args.workers is not None else (os.cpu_count() or 1)
+    start = time.perf_counter()
+    table = screen_universe(paths, StrokeRules(min_dist=args.min_dist),
+                            max_workers=min(workers, len(paths)), verbose=args.verbose)
+    elapsed = time.perf_counter() - start
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    table.to_csv(args.output, index=False, encoding='utf-8-sig')
+
+    view = table
+    if args.recent is not None:
+        view = filter_recent(table, bars=args.recent, kinds=args.kind)
+    if args.sort:
+        view = view.sort_values(args.sort, kind='stable')
+
+    errors = table[table['error'] != '']
+    print(f"筛选 {len(table)} 个品种，用时 {elapsed:.2f}s，结果已保存: {args.output}")
+    if args.recent is not None:
+        print(f"最近 {args.recent} 根K线内有新事件: {len(view)} 个")
+    if len(view):
+        columns = DISPLAY_COLUMNS + (['bars_since_event'] if 'bars_since_event' in view.columns else [])
+        print(view[columns].to_string(index=False))
+    for symbol, error in zip(errors['symbol'], errors['error']):
+        print(f"⚠️ {symbol}: {error}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+serve_charts.py
+按需图表服务 (见 src/analysis/chart_service.py): 交互式图表在第一次打开时才由 data/processed 中
+缓存的分析结果生成，页面保存在限制总大小的 LRU 缓存中，品种的分析结果更新后自动重新生成。
+
+批量流水线因此只需计算，不必为每个品种预先生成图表:
+    uv run run_pipeline.py data/raw/*.xlsx --plots none --no-interactive
+
+用法:
+    # 打开 http://127.0.0.1:8766/ 选择品种 (Ctrl+C 退出)
+    uv run serve_charts.py
+
+    # 缓存上限 64 MB，打印每次请求的命中情况和耗时
+    uv run serve_charts.py --cache-mb 64 --verbose
+
+    # 每 20 根K线最多显示 2 个 H/L 标记
+    uv run serve_charts.py --max-markers-per-bucket 2
+"""
+
+import argparse
+import functools
+import sys
+import webbrowser
+from pathlib import Path
+
+# 添加项目根目录到 path
+PROJECT_ROOT = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from run_pipeline import DATA_PROCESSED_DIR
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="按需图表服务: 打开品种时才由缓存的分析结果生成交互式图表",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+    uv run serve_charts.py                            # http://127.0.0.1:8766/
+    uv run serve_charts.py --cache-mb 64 --verbose    # 限制缓存大小并打印请求
+        """
+    )
+    parser.add_argument("directory", nargs="?", type=Path, default=DATA_PROCESSED_DIR,
+                        help=f"分析结果目录 (默认 {DATA_PROCESSED_DIR})")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址 (默认 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8766, help="端口 (默认 8766)")
+    parser.add_argument("--cache-mb", type=float, default=256, help="缓存页面的总大小上限 (MB)，默认 256")
+    parser.add_argument("--max-markers-per-bucket", type=int, default=None, metavar="N",
+                        help="H/L 标记密度上限: 每 20 根K线最多保留 N 个 (默认不限)")
+    parser.add_argument("--open", action="store_true", help="自动打开浏览器")
+    parser.add_argument("--verbose", action="store_true", help="打印每次图表请求 (缓存/生成及耗时)")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    if not args.directory.is_dir():
+        print(f"目录不存在: {args.directory}")
+        return 1
+    if args.cache_mb <= 0:
+        print("--cache-mb 必须大于 0")
+        return 1
+    if args.max_markers_per_bucket is not None and args.max_markers_per_bucket < 1:
+        print("--max-markers-per-bucket 必须 ≥ 1")
+        return 1
+
+    from src.analysis.chart_service import ChartCatalog, ChartCache, ChartServer, render_chart
+
+    catalog = ChartCatalog(args.directory)
+    render = functools.partial(render_chart, max_per_bucket=args.max_markers_per_bucket)
+    cache = ChartCache(max_bytes=int(args.cache_mb * (1 << 20)), render=render)
+    server = ChartServer(catalog, cache, host=args.host, port=args.port, verbose=args.verbose)
+    print(f"图表服务: {server.url}  ({len(catalog.entries())} 个品种，缓存上限 {args.cache_mb:g} MB)，Ctrl+C 退出")
+    if args.open:
+        webbrowser.open(server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n停止服务")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
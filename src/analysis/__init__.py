@@ -7,12 +7,16 @@ from .kline_logic import BarRelationship, classify_k_line_combination
 from .process_ohlc import add_kline_status, process_and_save
 
 from .indicators import compute_ema, compute_sma, compute_bollinger_bands
+from .streaming import EMAState, SMAState, BollingerState, BarClassifier, LiveIndicators
+from .signals import SetupSide, SetupSignals, causal_events, compute_setups
 from .interactive import plot_interactive_kline, ChartBuilder
 
 __all__ = [
     "BarRelationship", "classify_k_line_combination",
     "add_kline_status", "process_and_save",
     "compute_ema", "compute_sma", "compute_bollinger_bands",
+    "EMAState", "SMAState", "BollingerState", "BarClassifier", "LiveIndicators",
+    "SetupSide", "SetupSignals", "causal_events", "compute_setups",
     "plot_interactive_kline", "ChartBuilder",
 ]
 
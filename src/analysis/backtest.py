@@ -0,0 +1,437 @@
+"""
+analysis/backtest.py
+笔端点与 H/L 信号的向量化回测模块。
+
+每个信号独立开仓 (信号评估，不做资金与持仓管理)，出场规则:
+    - 止损 / 止盈: 入场价的固定比例，按持仓窗口内的最高价、最低价判断首次触及
+      (同一根K线同时触及时按止损处理)
+    - 时间出场: 持有 max_hold 根K线后按收盘价出场
+
+信号类型 (SIGNAL_KINDS):
+    - 'strokes': 笔端点确认 (底分型被确认 → 做多，顶分型被确认 → 做空)；确认K线上的反向分型
+                 要等下一根K线收盘才能识别，因此在确认K线的下一根K线收盘入场
+    - 'setups':  H/L 信号 (H → 做多，L → 做空)；强势信号K线在其收盘入场，
+                 突破确认的信号在下一根K线收盘入场
+
+所有K线均为合并后的K线，入场、出场与持仓窗口都以合并K线计。
+
+用法:
+    from src.analysis.backtest import params_grid, backtest_universe, backtest_summary
+
+    grid = params_grid(kind=['strokes', 'setups'], stop=[0.005, 0.01], target=[0.01, 0.02])
+    results = backtest_universe(Path("data/raw").glob("*.xlsx"), grid, max_workers=8)
+    print(backtest_summary(results))        # 每个文件 × 参数一行，另附 file='ALL' 的汇总行
+"""
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from ..io import OHLCData, load_ohlc
+from .fractals import StrokeResult, StrokeRules, compute_strokes, stroke_events, _detect_columns
+from .merging import merge_kline_bars
+from .signals import SetupSignals, causal_events, compute_setups
+
+
+SIGNAL_KINDS = ('strokes', 'setups')
+
+# 出场原因编码
+EXIT_TIME = 0
+EXIT_STOP = 1
+EXIT_TARGET = 2
+EXIT_REASONS = np.array(['time', 'stop', 'target'], dtype=object)
+
+
+@dataclass(frozen=True)
+class BacktestParams:
+    """
+    回测参数。
+
+    Attributes:
+        kind: 信号类型，见 SIGNAL_KINDS
+        stop: 止损比例 (如 0.01 = 1%)，None 表示不设止损
+        target: 止盈比例，None 表示不设止盈
+        max_hold: 最长持有K线数
+    """
+    kind: str = 'setups'
+    stop: Optional[float] = 0.01
+    target: Optional[float] = 0.02
+    max_hold: int = 20
+
+
+def params_grid(
+    kind: Iterable[str] = ('setups',),
+    stop: Iterable[Optional[float]] = (0.01,),
+    target: Iterable[Optional[float]] = (0.02,),
+    max_hold: Iterable[int] = (20,),
+) -> list[BacktestParams]:
+    """
+    生成回测参数网格 (笛卡尔积)。
+
+    Example:
+        >>> params_grid(kind=['strokes', 'setups'], stop=[0.005, 0.01])  # 4 组参数
+    """
+    for k in kind:
+        if k not in SIGNAL_KINDS:
+            raise ValueError(f"未知信号类型: {k}，可选: {', '.join(SIGNAL_KINDS)}")
+    return [
+        BacktestParams(kind=k, stop=s, target=t, max_hold=h)
+        for k, s, t, h in itertools.product(kind, stop, target, max_hold)
+    ]
+
+
+@dataclass
+class Trades:
+    """
+    回测成交记录 (列式数组)，按 entry_idx 升序，所有数组等长。
+
+    Attributes:
+        entry_idx: 入场K线位置 (int32)
+        exit_idx: 出场K线位置 (int32)
+        side: 方向，1 = 做多，-1 = 做空 (int8)
+        entry_price: 入场价 (入场K线收盘价) (float64)
+        exit_price: 出场价 (float64)
+        exit_reason: 出场原因 EXIT_TIME / EXIT_STOP / EXIT_TARGET (int8)
+    """
+    entry_idx: np.ndarray
+    exit_idx: np.ndarray
+    side: np.ndarray
+    entry_price: np.ndarray
+    exit_price: np.ndarray
+    exit_reason: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.entry_idx)
+
+    @property
+    def returns(self) -> np.ndarray:
+        """每笔收益率 (按方向计算)"""
+        return self.side * (self.exit_price / self.entry_price - 1.0)
+
+    @property
+    def hold(self) -> np.ndarray:
+        """持有K线数"""
+        return self.exit_idx - self.entry_idx
+
+    def to_frame(self) -> pd.DataFrame:
+        """转换为 DataFrame，附带 ret / hold 列，exit_reason 还原为字符串"""
+        return pd.DataFrame({
+            'entry_idx': self.entry_idx,
+            'exit_idx': self.exit_idx,
+            'side': self.side,
+            'entry_price': self.entry_price,
+            'exit_price': self.exit_price,
+            'exit_reason': EXIT_REASONS[self.exit_reason.astype(np.int64)],
+            'ret': self.returns,
+            'hold': self.hold,
+        })
+
+
+def stroke_entries(result: StrokeResult, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    笔端点确认信号: 方向与分型相反 (底分型确认做多)。
+
+    确认K线 confirm_idx 上的反向分型需要与下一根K线比较才能成立，
+    因此在 confirm_idx + 1 收盘入场，否则会用到入场时尚未收盘的K线。
+
+    Returns:
+        tuple: (entry_idx int64 数组, side int8 数组)，入场位置超出 n 的信号被丢弃
+    """
+    conf = result.confirmations
+    entry_idx = conf.confirm_idx.astype(np.int64) + 1
+    keep = entry_idx < n
+    return entry_idx[keep], (-conf.fractal_type[keep]).astype(np.int8)
+
+
+def setup_entries(setups: SetupSignals, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    H/L 信号: 强势信号在信号K线入场，否则在确认突破的下一根K线入场。
+
+    Returns:
+        tuple: (entry_idx int64 数组, side int8 数组)，入场位置超出 n 的信号被丢弃
+    """
+    entry_idx = setups.bar_idx.astype(np.int64) + (~setups.strong).astype(np.int64)
+    keep = entry_idx < n
+    return entry_idx[keep], setups.side[keep].astype(np.int8)
+
+
+def simulate_trades(
+    highs, lows, closes, entry_idx, side,
+    stop: Optional[float] = None,
+    target: Optional[float] = None,
+    max_hold: int = 20,
+) -> Trades:
+    """
+    向量化模拟出场: 对每个信号取其后 max_hold 根K线构成二维窗口，一次性判断止损/止盈的首次触及。
+
+    Args:
+        highs / lows / closes: K线价格
+        entry_idx: 入场K线位置 (在该K线收盘入场)
+        side: 方向，1 = 做多，-1 = 做空
+        stop: 止损比例，None 表示不设
+        target: 止盈比例，None 表示不设
+        max_hold: 最长持有K线数
+
+    Returns:
+        Trades: 没有后续K线的信号 (入场于最后一根) 不计入
+    """
+    if max_hold < 1:
+        raise ValueError(f"max_hold 必须 ≥ 1，当前: {max_hold}")
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    closes = np.asarray(closes, dtype=np.float64)
+    entry_idx = np.asarray(entry_idx, dtype=np.int64)
+    side = np.asarray(side, dtype=np.int8)
+    n = len(closes)
+
+    order = np.argsort(entry_idx, kind='stable')
+    entry_idx, side = entry_idx[order], side[order]
+    keep = (entry_idx >= 0) & (entry_idx < n - 1)
+    entry_idx, side = entry_idx[keep], side[keep]
+    entry_price = closes[entry_idx]
+
+    # 持仓窗口: [entry+1, entry+max_hold]，超出末尾的部分截断
+    offsets = np.arange(1, max_hold + 1)
+    window = entry_idx[:, None] + offsets[None, :]
+    valid = window < n
+    window = np.minimum(window, n - 1)
+    last = np.minimum(entry_idx + max_hold, n - 1)
+
+    is_long = (side == 1)[:, None]
+    # 做多: 最低价触及止损、最高价触及止盈；做空相反
+    adverse = np.where(is_long, lows[window], highs[window])
+    favorable = np.where(is_long, highs[window], lows[window])
+    sign = side.astype(np.float64)[:, None]
+
+    def first_hit(prices, level, direction):
+        """每行首次满足 direction * (price - level) >= 0 的窗口位置，未触及为 max_hold"""
+        hit = valid & (direction * (prices - level[:, None]) >= 0)
+        return np.where(hit.any(axis=1), hit.argmax(axis=1), max_hold)
+
+    never = np.full(len(entry_idx), max_hold)
+    if stop is not None:
+        stop_price = entry_price * (1.0 - side * stop)
+        stop_at = first_hit(adverse, stop_price, -sign)
+    else:
+        stop_price, stop_at = entry_price, never
+    if target is not None:
+        target_price = entry_price * (1.0 + side * target)
+        target_at = first_hit(favorable, target_price, sign)
+    else:
+        target_price, target_at = entry_price, never
+
+    hit_stop = (stop_at < max_hold) & (stop_at <= target_at)
+    hit_target = (target_at < max_hold) & ~hit_stop
+    exit_idx = np.where(hit_stop, entry_idx + 1 + stop_at,
+                        np.where(hit_target, entry_idx + 1 + target_at, last))
+    exit_price = np.where(hit_stop, stop_price, np.where(hit_target, target_price, closes[last]))
+    exit_reason = np.where(hit_stop, EXIT_STOP, np.where(hit_target, EXIT_TARGET, EXIT_TIME))
+
+    return Trades(
+        entry_idx=entry_idx.astype(np.int32),
+        exit_idx=exit_idx.astype(np.int32),
+        side=side,
+        entry_price=entry_price,
+        exit_price=exit_price.astype(np.float64),
+        exit_reason=exit_reason.astype(np.int8),
+    )
+
+
+def trade_stats(returns, hold=None, exit_reason=None, equity: bool = True) -> dict:
+    """
+    成交统计。
+
+    Args:
+        returns: 每笔收益率
+        hold: 每笔持有K线数 (可选)
+        exit_reason: 每笔出场原因编码 (可选)
+        equity: 是否按成交顺序复利计算 total_ret / max_drawdown (跨品种汇总时无时间顺序，应关闭)
+
+    Returns:
+        dict: trades, win_rate, mean_ret, total_ret, profit_factor, max_drawdown, mean_hold, stop_rate, target_rate
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    n = len(returns)
+    gains = returns[returns > 0].sum()
+    losses = -returns[returns < 0].sum()
+    stats = {
+        'trades': n,
+        'win_rate': float((returns > 0).mean()) if n else np.nan,
+        'mean_ret': float(returns.mean()) if n else np.nan,
+        'total_ret': np.nan,
+        'profit_factor': float(gains / losses) if losses > 0 else (np.inf if gains > 0 else np.nan),
+        'max_drawdown': np.nan,
+        'mean_hold': float(np.mean(hold)) if hold is not None and n else np.nan,
+        'stop_rate': float(np.mean(exit_reason == EXIT_STOP)) if exit_reason is not None and n else np.nan,
+        'target_rate': float(np.mean(exit_reason == EXIT_TARGET)) if exit_reason is not None and n else np.nan,
+    }
+    if equity and n:
+        curve = np.cumprod(1.0 + returns)
+        peak = np.maximum.accumulate(np.concatenate([[1.0], curve]))[1:]
+        stats['total_ret'] = float(curve[-1] - 1.0)
+        stats['max_drawdown'] = float((1.0 - curve / peak).max())
+    return stats
+
+
+@dataclass
+class SymbolSignals:
+    """
+    单个品种的回测输入: 合并K线价格与两类信号的入场位置 (与参数无关，每个品种只算一次)。
+
+    Attributes:
+        symbol: 资产代码
+        highs / lows / closes: 合并K线价格 (float64)
+        entries: {信号类型: (entry_idx, side)}
+    """
+    symbol: str
+    highs: np.ndarray
+    lows: np.ndarray
+    closes: np.ndarray
+    entries: dict
+
+
+def prepare_signals(
+    source: Union[OHLCData, pd.DataFrame],
+    rules: Optional[StrokeRules] = None,
+    merged: bool = False,
+    symbol: str = "",
+) -> SymbolSignals:
+    """
+    合并 K 线、识别笔并计算 H/L 信号，整理为回测输入。
+
+    Args:
+        source: OHLCData 或 DataFrame
+        rules: 笔过滤规则，None 表示默认规则
+        merged: source 是否已经是合并后的 K 线，是则跳过合并
+        symbol: 资产代码，source 为 OHLCData 时默认取其 symbol
+    """
+    if isinstance(source, OHLCData):
+        symbol = symbol or source.symbol
+        df = source.df
+    else:
+        df = source
+    if not merged:
+        df = merge_kline_bars(df).df
+
+    col_dt, _, col_high, col_low, col_close = _detect_columns(df)
+    highs = df[col_high].to_numpy(dtype=np.float64)
+    lows = df[col_low].to_numpy(dtype=np.float64)
+    closes = df[col_close].to_numpy(dtype=np.float64)
+
+    result = compute_strokes(highs, lows, rules)
+    events = stroke_events(result, df[col_dt], highs, lows)
+    bars = pd.DataFrame({'high': highs, 'low': lows, 'close': closes})
+    setups = compute_setups(bars, causal_events(events))
+
+    return SymbolSignals(
+        symbol=symbol,
+        highs=highs,
+        lows=lows,
+        closes=closes,
+        entries={
+            'strokes': stroke_entries(result, len(bars)),
+            'setups': setup_entries(setups, len(bars)),
+        },
+    )
+
+
+def backtest_signals(signals: SymbolSignals, grid: Iterable[BacktestParams]) -> dict[BacktestParams, Trades]:
+    """
+    对单个品种运行多组回测参数。
+
+    Returns:
+        dict: {BacktestParams: Trades}，顺序与 grid 一致
+    """
+    results = {}
+    for params in grid:
+        entry_idx, side = signals.entries[params.kind]
+        results[params] = simulate_trades(
+            signals.highs, signals.lows, signals.closes, entry_idx, side,
+            stop=params.stop, target=params.target, max_hold=params.max_hold,
+        )
+    return results
+
+
+def _backtest_file(path: str, grid: list[BacktestParams],
+                   rules: Optional[StrokeRules]) -> dict[BacktestParams, Trades]:
+    """工作进程: 加载单个文件，计算一次信号，运行全部参数"""
+    return backtest_signals(prepare_signals(load_ohlc(path), rules), grid)
+
+
+def backtest_universe(
+    paths: Iterable[Union[str, Path]],
+    grid: Iterable[BacktestParams],
+    rules: Optional[StrokeRules] = None,
+    max_workers: Optional[int] = None,
+) -> dict[str, dict[BacktestParams, Trades]]:
+    """
+    对整个品种池回测，每个品种的合并、笔识别与信号只计算一次。
+
+    结果按文件名索引而不是资产代码: 同一代码可能有多个数据文件
+    (如 TL.CFE.xlsx 与 TL_CFE.xlsx)，按代码索引会互相覆盖。
+
+    Args:
+        paths: 原始数据文件路径 (xlsx/csv)
+        grid: 回测参数列表，见 params_grid()
+        rules: 笔过滤规则，None 表示默认规则
+        max_workers: 并行进程数 (按品种分配)，None 或 1 表示串行
+
+    Returns:
+        dict: {文件名: {BacktestParams: Trades}}
+
+    Raises:
+        ValueError: 不同目录下有同名文件
+    """
+    paths = [str(p) for p in paths]
+    names = [Path(p).name for p in paths]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"文件名重复: {', '.join(duplicates)}")
+    grid = list(grid)
+    if max_workers is None or max_workers <= 1:
+        return {name: _backtest_file(p, grid, rules) for name, p in zip(names, paths)}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(names, executor.map(_backtest_file, paths, itertools.repeat(grid),
+                                            itertools.repeat(rules))))
+
+
+def backtest_summary(results: Mapping[str, Mapping[BacktestParams, Trades]]) -> pd.DataFrame:
+    """
+    汇总回测结果: 每个 (文件, 参数) 一行，另为每组参数附一行 file='ALL' 的全品种汇总。
+
+    汇总行把所有品种的成交合并统计，没有统一的时间顺序，total_ret / max_drawdown 为 NaN。
+
+    Args:
+        results: backtest_universe() 的返回值
+
+    Returns:
+        pd.DataFrame: file 列 + 参数列 (kind, stop, target, max_hold) + trade_stats() 的统计列
+    """
+    rows = []
+    pooled: dict[BacktestParams, list[Trades]] = {}
+    for name, by_params in results.items():
+        for params, trades in by_params.items():
+            pooled.setdefault(params, []).append(trades)
+            rows.append({
+                'file': name, 'kind': params.kind, 'stop': params.stop,
+                'target': params.target, 'max_hold': params.max_hold,
+                **trade_stats(trades.returns, trades.hold, trades.exit_reason),
+            })
+    for params, items in pooled.items():
+        rows.append({
+            'file': 'ALL', 'kind': params.kind, 'stop': params.stop,
+            'target': params.target, 'max_hold': params.max_hold,
+            **trade_stats(
+                np.concatenate([t.returns for t in items]),
+                np.concatenate([t.hold for t in items]),
+                np.concatenate([t.exit_reason for t in items]),
+                equity=False,
+            ),
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,385 @@
+"""
+analysis/chart_service.py
+按需图表服务: 批量流水线只做计算 (run_pipeline.py --plots none --no-interactive)，
+交互式图表在第一次被请求时才由缓存的分析结果 (data/processed 中的 *_merged.csv、*_strokes.csv) 生成。
+
+生成的页面保存在按字节数限制的 LRU 缓存中；每次请求检查该品种输入文件的签名 (修改时间 ns, 大小)，
+流水线重新输出后旧页面自动失效并重新生成。没人打开的品种不产生任何图表开销。
+
+用法:
+    from src.analysis.chart_service import ChartCatalog, ChartCache, ChartServer
+
+    catalog = ChartCatalog(Path("data/processed"))
+    server = ChartServer(catalog, ChartCache(max_bytes=256 << 20), port=8766).start()
+    # 浏览器打开 server.url，点击品种时生成图表
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Union
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+from .delta import load_events
+from .fractals import compute_strokes, stroke_events
+from .interactive import symbol_chart
+from .merging import PROVENANCE_COLUMNS, MergeProvenance
+
+
+# 流水线为每个品种写入的元数据 (代码、名称、原始文件)
+META_SUFFIX = '_meta.json'
+MERGED_SUFFIX = '_merged.csv'
+STROKES_SUFFIX = '_strokes.csv'
+
+# 缓存页面的默认总字节数上限
+DEFAULT_CACHE_BYTES = 256 << 20
+
+
+def write_meta(path: Union[str, Path], symbol: str, name: str, input_file: str) -> None:
+    """写入品种元数据 (run_pipeline 调用)"""
+    meta = {'symbol': symbol, 'name': name, 'input_file': str(input_file)}
+    Path(path).write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+
+
+def read_meta(path: Union[str, Path]) -> dict:
+    """读取品种元数据，文件不存在或损坏时返回空字典"""
+    try:
+        return json.loads(Path(path).read_text(encoding='utf-8'))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _signature(path: Path) -> Optional[tuple]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+@dataclass
+class ChartEntry:
+    """
+    一个品种的缓存分析结果。
+
+    Attributes:
+        key: 品种键 '<品种目录>/<文件基本名>'，如 'tl_cfe_30年期国债期货/TL_CFE'
+        merged_csv: 合并后的K线
+        strokes_csv: 笔端点事件表
+        meta_path: 元数据 (旧版流水线的输出没有，此时标题取品种目录名)
+    """
+    key: str
+    merged_csv: Path
+    strokes_csv: Path
+    meta_path: Path
+
+    @classmethod
+    def from_merged(cls, merged_csv: Path) -> 'ChartEntry':
+        base = merged_csv.name[:-len(MERGED_SUFFIX)]
+        directory = merged_csv.parent
+        return cls(key=f"{directory.name}/{base}", merged_csv=merged_csv,
+                   strokes_csv=directory / f"{base}{STROKES_SUFFIX}",
+                   meta_path=directory / f"{base}{META_SUFFIX}")
+
+    @property
+    def meta(self) -> dict:
+        return read_meta(self.meta_path)
+
+    @property
+    def title(self) -> str:
+        meta = self.meta
+        if meta.get('name') and meta.get('symbol'):
+            return f"{meta['name']} [{meta['symbol']}]"
+        return self.key.split('/', 1)[0]
+
+    def signature(self) -> tuple:
+        """输入文件的签名，任一文件变化 (流水线重新输出) 时不同"""
+        return tuple(_signature(p) for p in (self.merged_csv, self.strokes_csv, self.meta_path))
+
+
+class ChartCatalog:
+    """processed 目录中可生成图表的品种 (以 *_merged.csv 为准)"""
+
+    def __init__(self, processed_dir: Union[str, Path]):
+        self.processed_dir = Path(processed_dir)
+        self._entries: dict[str, ChartEntry] = {}
+        self.refresh()
+
+    def refresh(self) -> dict[str, ChartEntry]:
+        """重新扫描目录"""
+        self._entries = {
+            entry.key: entry
+            for entry in map(ChartEntry.from_merged, sorted(self.processed_dir.glob(f"*/*{MERGED_SUFFIX}")))
+        }
+        return self._entries
+
+    def entries(self) -> list[ChartEntry]:
+        return list(self._entries.values())
+
+    def get(self, key: str) -> Optional[ChartEntry]:
+        """按键查找，找不到时重新扫描一次 (流水线新增的品种)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self.refresh().get(key)
+        return entry
+
+
+def load_chart_inputs(entry: ChartEntry) -> tuple[pd.DataFrame, object]:
+    """
+    读取一个品种的合并K线和笔事件表。
+
+    事件表缺失或为逐K线完整表 (--wide-strokes) 时由合并K线重新识别笔。
+
+    Returns:
+        tuple: (合并K线 DataFrame, 笔事件表；K线不足时为空列表)
+    """
+    merged_df = pd.read_csv(entry.merged_csv)
+    merged_df['datetime'] = pd.to_datetime(merged_df['datetime'])
+    events = load_events(entry.strokes_csv)
+    if events is None and len(merged_df) >= 3:
+        highs = merged_df['high'].to_numpy(dtype=np.float64)
+        lows = merged_df['low'].to_numpy(dtype=np.float64)
+        provenance = (MergeProvenance.from_frame(merged_df)
+                      if set(PROVENANCE_COLUMNS) <= set(merged_df.columns) else None)
+        events = stroke_events(compute_strokes(highs, lows), merged_df['datetime'], highs, lows, provenance)
+    return merged_df, events if events is not None else []
+
+
+def render_chart(entry: ChartEntry, max_per_bucket: Optional[int] = None) -> bytes:
+    """
+    由缓存的分析结果生成交互式图表页面。
+
+    Args:
+        entry: 品种
+        max_per_bucket: 可选，H/L 标记密度上限 (见 interactive.symbol_chart)；
+                        ChartCache 需要单参数的生成函数，用 functools.partial 绑定
+    """
+    merged_df, events = load_chart_inputs(entry)
+    return symbol_chart(merged_df, events, max_per_bucket=max_per_bucket).to_html(entry.title).encode('utf-8')
+
+
+class ChartCache:
+    """
+    生成页面的 LRU 缓存，按页面总字节数限制；超过上限时淘汰最久未访问的页面。
+
+    Attributes:
+        max_bytes: 总字节数上限
+        hits / misses: 命中 / 生成次数
+        invalidations: 因输入变化而重新生成的次数
+        evictions: 因超过上限而淘汰的页面数
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES, render=render_chart):
+        """
+        Args:
+            max_bytes: 缓存页面的总字节数上限
+            render: 页面生成函数 ChartEntry -> bytes
+        """
+        self.max_bytes = max_bytes
+        self.render = render
+        self.hits = self.misses = self.invalidations = self.evictions = 0
+        self._pages: OrderedDict[str, tuple[tuple, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # 同一品种的并发请求只生成一次
+        self._building: dict[str, threading.Lock] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def get(self, entry: ChartEntry) -> tuple[bytes, bool]:
+        """
+        取得品种的页面，缓存中没有或输入已变化时生成。
+
+        Returns:
+            tuple: (页面内容, 是否命中缓存)
+        """
+        with self._lock:
+            build_lock = self._building.setdefault(entry.key, threading.Lock())
+        with build_lock:
+            signature = entry.signature()
+            with self._lock:
+                cached = self._pages.get(entry.key)
+                if cached is not None and cached[0] == signature:
+                    self._pages.move_to_end(entry.key)
+                    self.hits += 1
+                    return cached[1], True
+                if cached is not None:
+                    self.invalidations += 1
+                    self._drop(entry.key)
+            payload = self.render(entry)
+            with self._lock:
+                self.misses += 1
+                self._store(entry.key, signature, payload)
+            return payload, False
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """丢弃一个品种 (key=None 时全部) 的页面"""
+        with self._lock:
+            for k in ([key] if key is not None else list(self._pages)):
+                self._drop(k)
+
+    def stats(self) -> dict:
+        return {
+            'pages': len(self._pages), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+            'hits': self.hits, 'misses': self.misses,
+            'invalidations': self.invalidations, 'evictions': self.evictions,
+        }
+
+    def _drop(self, key: str) -> None:
+        cached = self._pages.pop(key, None)
+        if cached is not None:
+            self._bytes -= len(cached[1])
+
+    def _store(self, key: str, signature: tuple, payload: bytes) -> None:
+        """加入缓存并淘汰最久未访问的页面 (调用方持有锁)；超过上限的单个页面不缓存"""
+        self._drop(key)
+        if len(payload) > self.max_bytes:
+            return
+        self._pages[key] = (signature, payload)
+        self._bytes += len(payload)
+        while self._bytes > self.max_bytes:
+            _, (_, old) = self._pages.popitem(last=False)
+            self._bytes -= len(old)
+            self.evictions += 1
+
+
+# ============================================================
+# HTTP 服务
+# ============================================================
+
+def index_page(catalog: ChartCatalog) -> str:
+    """品种列表页面 (链接到 /chart/<key>)"""
+    rows = '\n'.join(
+        f'<li><a href="/chart/{quote(e.key)}">{escape(e.title)}</a> <span>{escape(e.key)}</span></li>'
+        for e in catalog.refresh().values()
+    )
+    return f'''<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <title>图表</title>
+    <style>
+        body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+               background: #131722; color: #d1d4dc; padding: 20px; }}
+        a {{ color: #4ECDC4; text-decoration: none; }}
+        li {{ margin: 4px 0; }}
+        span {{ color: #787b86; font-size: 12px; margin-left: 8px; }}
+    </style>
+</head>
+<body>
+    <h3>品种 ({len(catalog.entries())})</h3>
+    <ul>
+{rows}
+    </ul>
+</body>
+</html>
+'''
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """GET / 品种列表，GET /chart/<key> 图表页面，GET /stats 缓存统计"""
+
+    def do_GET(self):
+        server = self.server
+        path = unquote(self.path.split('?', 1)[0])
+        if path in ('/', '/index.html'):
+            self._send(index_page(server.catalog).encode('utf-8'), 'text/html; charset=utf-8')
+        elif path == '/stats':
+            self._send(json.dumps(server.cache.stats()).encode('utf-8'), 'application/json')
+        elif path.startswith('/chart/'):
+            entry = server.catalog.get(path[len('/chart/'):].rstrip('/'))
+            if entry is None:
+                self.send_error(404)
+                return
+            start = time.perf_counter()
+            try:
+                payload, hit = server.cache.get(entry)
+            except Exception as e:
+                self.send_error(500, explain=f"{type(e).__name__}: {e}")
+                return
+            if server.verbose:
+                print(f"[{time.strftime('%H:%M:%S')}] {entry.key}  {'缓存' if hit else '生成'}  "
+                      f"{(time.perf_counter() - start) * 1000:.0f}ms")
+            self._send(payload, 'text/html; charset=utf-8')
+        else:
+            self.send_error(404)
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 不逐个请求打印访问日志
+        pass
+
+
+class ChartServer:
+    """
+    本地按需图表服务。
+
+    Attributes:
+        catalog: 品种目录
+        cache: 页面缓存
+        url: 首页地址
+    """
+
+    def __init__(self, catalog: ChartCatalog, cache: Optional[ChartCache] = None,
+                 host: str = '127.0.0.1', port: int = 8766, verbose: bool = False):
+        """
+        Args:
+            catalog: 品种目录
+            cache: 页面缓存，None 表示默认上限的新缓存
+            host: 监听地址 (默认只允许本机访问)
+            port: 端口，0 表示自动选择
+            verbose: 是否打印每次图表请求 (命中/生成及耗时)
+        """
+        self.catalog = catalog
+        self.cache = cache if cache is not None else ChartCache()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.catalog = catalog
+        self._httpd.cache = self.cache
+        self._httpd.verbose = verbose
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def chart_url(self, key: str) -> str:
+        return f"{self.url}chart/{quote(key)}"
+
+    def start(self) -> 'ChartServer':
+        """在后台线程中运行"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='chart-service', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """在当前线程中运行，直到 Ctrl+C"""
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
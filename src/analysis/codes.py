@@ -0,0 +1,250 @@
+"""
+analysis/codes.py
+K 线状态与分型标记的紧凑编码。
+
+字符串列 ('TREND_UP_(M)', 'TOP', 'Tx', 'Tc,Bc') 占用内存大、CSV 体积大，
+下游还需要字符串匹配 ('x' in f_type, .split(','))。这里定义 int8 枚举编码和
+uint8 位标志，以及与旧字符串格式之间的编码/解码函数。
+
+编码列:
+    kline_code          int8   K 线关系 (KlineCode)
+    raw_fractal_code    int8   原始分型 (FractalCode)
+    valid_fractal_code  int8   笔端点分型类型 (FractalCode)，状态由 bar_flags 区分
+    bar_flags           uint8  位标志 (BarFlag): 合并/确认/替换/候选
+
+字符串列 (kline_status, raw_fractal, valid_fractal, candidate_display) 可由
+add_string_columns() 从编码列还原，作为可选的导出格式。
+"""
+
+from enum import IntEnum, IntFlag
+
+import numpy as np
+import pandas as pd
+
+
+# 编码列名
+COL_KLINE_CODE = "kline_code"
+COL_RAW_FRACTAL_CODE = "raw_fractal_code"
+COL_VALID_FRACTAL_CODE = "valid_fractal_code"
+COL_BAR_FLAGS = "bar_flags"
+
+
+class KlineCode(IntEnum):
+    """K 线与前一根 K 线的关系 (与 BarRelationship 对应，另加 INITIAL / MIXED)"""
+    INITIAL = 0
+    TREND_UP = 1
+    TREND_DOWN = 2
+    INSIDE = 3
+    OUTSIDE = 4
+    MIXED = 5
+
+
+class FractalCode(IntEnum):
+    """分型类型，与合并模块中的趋势方向一致 (1 = 上，-1 = 下)"""
+    NONE = 0
+    TOP = 1
+    BOTTOM = -1
+
+
+class BarFlag(IntFlag):
+    """每根 K 线的位标志"""
+    MERGED = 1                  # 合并K线 (kline_status 的 _(M) 后缀)
+    CONFIRMED = 2               # 确认的笔端点 (T/B)
+    REPLACED = 4                # 被替换的分型 (Tx/Bx)
+    CANDIDATE = 8               # 当前候选分型 (Tc/Bc，位于分型K线)
+    SHOW_TOP_CANDIDATE = 16     # 该K线显示 Tc 候选标记 (右肩K线)
+    SHOW_BOTTOM_CANDIDATE = 32  # 该K线显示 Bc 候选标记 (右肩K线)
+
+
+FRACTAL_STATE_FLAGS = BarFlag.CONFIRMED | BarFlag.REPLACED | BarFlag.CANDIDATE
+
+_KLINE_NAMES = np.array([c.name for c in KlineCode], dtype=object)
+_KLINE_LOOKUP = {c.name: c.value for c in KlineCode}
+_MERGED_SUFFIX = "_(M)"
+_MERGED_MARKER = "MERGED"  # 合并过程中的临时标记
+
+# FractalCode + 1 作为查表下标: BOTTOM, NONE, TOP
+_RAW_FRACTAL_NAMES = np.array(['BOTTOM', '', 'TOP'], dtype=object)
+_FRACTAL_LETTERS = np.array(['B', '', 'T'], dtype=object)
+
+
+def _as_str_array(values) -> np.ndarray:
+    """将字符串序列转为 object 数组，NaN/None 视为空字符串"""
+    return pd.Series(values, dtype=object).fillna('').astype(str).to_numpy(dtype=object)
+
+
+# ============================================================
+# kline_status
+# ============================================================
+
+def encode_kline_status(status) -> tuple[np.ndarray, np.ndarray]:
+    """
+    将 kline_status 字符串编码为 (kline_code, MERGED 标志)。
+
+    Args:
+        status: 字符串序列，如 'TREND_UP', 'TREND_DOWN_(M)', 'MERGED'
+
+    Returns:
+        tuple: (kline_code int8 数组, bar_flags uint8 数组)
+    """
+    status = _as_str_array(status)
+    merged = np.array([s.endswith(_MERGED_SUFFIX) or s == _MERGED_MARKER for s in status], dtype=bool)
+    codes = np.array(
+        [_KLINE_LOOKUP.get(s.removesuffix(_MERGED_SUFFIX), KlineCode.INITIAL) for s in status],
+        dtype=np.int8,
+    )
+    flags = np.where(merged, BarFlag.MERGED, 0).astype(np.uint8)
+    return codes, flags
+
+
+def decode_kline_status(codes, flags=None) -> np.ndarray:
+    """
+    将 kline_code (+ MERGED 标志) 还原为 kline_status 字符串。
+
+    与旧格式一致：首根 K 线 (INITIAL) 不带 _(M) 后缀。
+    """
+    names = _KLINE_NAMES[np.asarray(codes, dtype=np.int64)]
+    if flags is None:
+        return names
+    merged = (np.asarray(flags) & BarFlag.MERGED).astype(bool) & (np.asarray(codes) != KlineCode.INITIAL)
+    return np.where(merged, names + _MERGED_SUFFIX, names)
+
+
+# ============================================================
+# raw_fractal
+# ============================================================
+
+def encode_raw_fractal(values) -> np.ndarray:
+    """'TOP' / 'BOTTOM' / '' -> FractalCode (int8)"""
+    values = _as_str_array(values)
+    return np.select(
+        [values == 'TOP', values == 'BOTTOM'],
+        [FractalCode.TOP, FractalCode.BOTTOM],
+        FractalCode.NONE,
+    ).astype(np.int8)
+
+
+def decode_raw_fractal(codes) -> np.ndarray:
+    """FractalCode -> 'TOP' / 'BOTTOM' / ''"""
+    return _RAW_FRACTAL_NAMES[np.asarray(codes, dtype=np.int64) + 1]
+
+
+# ============================================================
+# valid_fractal / candidate_display
+# ============================================================
+
+def encode_valid_fractal(values) -> tuple[np.ndarray, np.ndarray]:
+    """
+    'T'/'B'/'Tx'/'Bx'/'Tc'/'Bc' -> (valid_fractal_code, 状态标志)。
+    """
+    values = _as_str_array(values)
+    first = np.array([s[:1] for s in values], dtype=object)
+    suffix = np.array([s[1:2] for s in values], dtype=object)
+    codes = np.select(
+        [first == 'T', first == 'B'], [FractalCode.TOP, FractalCode.BOTTOM], FractalCode.NONE
+    ).astype(np.int8)
+    flags = np.select(
+        [codes == 0, suffix == 'x', suffix == 'c'],
+        [0, BarFlag.REPLACED, BarFlag.CANDIDATE],
+        BarFlag.CONFIRMED,
+    ).astype(np.uint8)
+    return codes, flags
+
+
+def decode_valid_fractal(codes, flags) -> np.ndarray:
+    """(valid_fractal_code, bar_flags) -> 'T'/'B'/'Tx'/'Bx'/'Tc'/'Bc'/''"""
+    codes = np.asarray(codes, dtype=np.int64)
+    flags = np.asarray(flags)
+    letters = _FRACTAL_LETTERS[codes + 1]
+    suffix = np.select(
+        [(flags & BarFlag.REPLACED).astype(bool), (flags & BarFlag.CANDIDATE).astype(bool)],
+        ['x', 'c'],
+        '',
+    ).astype(object)
+    return np.where(codes != 0, letters + suffix, '')
+
+
+def encode_candidate_display(values) -> np.ndarray:
+    """'Tc' / 'Bc' / 'Tc,Bc' -> SHOW_*_CANDIDATE 标志 (uint8)"""
+    values = _as_str_array(values)
+    show_top = np.array(['Tc' in s for s in values], dtype=bool)
+    show_bottom = np.array(['Bc' in s for s in values], dtype=bool)
+    return (
+        np.where(show_top, BarFlag.SHOW_TOP_CANDIDATE, 0)
+        | np.where(show_bottom, BarFlag.SHOW_BOTTOM_CANDIDATE, 0)
+    ).astype(np.uint8)
+
+
+def decode_candidate_display(flags) -> np.ndarray:
+    """
+    SHOW_*_CANDIDATE 标志 -> 'Tc' / 'Bc' / 'Tc,Bc' / ''。
+
+    注：旧格式中同一K线上重复的标记 (如 'Tc,Tc') 解码后只保留一个。
+    """
+    flags = np.asarray(flags)
+    show_top = (flags & BarFlag.SHOW_TOP_CANDIDATE).astype(bool)
+    show_bottom = (flags & BarFlag.SHOW_BOTTOM_CANDIDATE).astype(bool)
+    return np.select(
+        [show_top & show_bottom, show_top, show_bottom],
+        ['Tc,Bc', 'Tc', 'Bc'],
+        '',
+    ).astype(object)
+
+
+def decode_stroke_markers(valid_codes, flags) -> list:
+    """
+    从编码列生成 ChartBuilder 使用的标记列表。
+
+    Returns:
+        list: [(idx, 'T'/'B'/'Tx'/'Bx'/'Tc'/'Bc'), ...] 笔端点标记 (按索引排序)，
+              其后追加 [(display_idx, 'Tc'/'Bc', display_idx), ...] 候选分型显示标记
+    """
+    valid_codes = np.asarray(valid_codes)
+    flags = np.asarray(flags)
+    idx = np.flatnonzero(valid_codes)
+    names = decode_valid_fractal(valid_codes[idx], flags[idx])
+    markers = list(zip(idx.tolist(), names.tolist()))
+
+    for flag, name in ((BarFlag.SHOW_TOP_CANDIDATE, 'Tc'), (BarFlag.SHOW_BOTTOM_CANDIDATE, 'Bc')):
+        for i in np.flatnonzero(has_flag(flags, flag)).tolist():
+            markers.append((i, name, i))
+    markers[len(idx):] = sorted(markers[len(idx):], key=lambda m: m[0])
+    return markers
+
+
+def has_flag(flags, flag: BarFlag) -> np.ndarray:
+    """向量化的位标志判断"""
+    return (np.asarray(flags) & flag).astype(bool)
+
+
+# ============================================================
+# DataFrame 级别的转换
+# ============================================================
+
+def add_string_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    根据编码列还原字符串列 (导出旧格式时使用)，原地修改并返回 df。
+
+    只还原存在对应编码列的字符串列。
+    """
+    flags = df[COL_BAR_FLAGS].to_numpy() if COL_BAR_FLAGS in df.columns else None
+    if COL_KLINE_CODE in df.columns:
+        df['kline_status'] = decode_kline_status(df[COL_KLINE_CODE].to_numpy(), flags)
+    if COL_RAW_FRACTAL_CODE in df.columns:
+        df['raw_fractal'] = decode_raw_fractal(df[COL_RAW_FRACTAL_CODE].to_numpy())
+    if COL_VALID_FRACTAL_CODE in df.columns and flags is not None:
+        df['valid_fractal'] = decode_valid_fractal(df[COL_VALID_FRACTAL_CODE].to_numpy(), flags)
+        df['candidate_display'] = decode_candidate_display(flags)
+    return df
+
+
+def drop_string_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """删除已有编码列替代的字符串列，原地修改并返回 df"""
+    pairs = {
+        'kline_status': COL_KLINE_CODE,
+        'raw_fractal': COL_RAW_FRACTAL_CODE,
+        'valid_fractal': COL_VALID_FRACTAL_CODE,
+        'candidate_display': COL_VALID_FRACTAL_CODE,
+    }
+    to_drop = [s for s, c in pairs.items() if s in df.columns and c in df.columns]
+    return df.drop(columns=to_drop, inplace=True) or df
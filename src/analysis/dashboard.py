@@ -0,0 +1,298 @@
+"""
+analysis/dashboard.py
+品种池总览页: 一个 HTML 页面，每个品种一行 —— 名称、最新笔状态 (最后端点、当前候选) 和最近合并K线收盘价的
+迷你走势图 (叠加笔端点连线)，链接到该品种的完整交互式图表。
+
+数据来自 data/processed 中流水线已输出的分析结果 (*_merged.csv、*_strokes.csv)，不重新计算。
+迷你走势图在一次批处理中生成: 所有品种最近 window 根收盘价右对齐堆叠为一个矩阵，
+按列分桶降采样并逐行归一化后转为内联 SVG 折线；页面不加载任何脚本或外部资源，数百个品种也能即时打开。
+
+用法:
+    from src.analysis.dashboard import build_dashboard
+
+    build_dashboard(Path("data/processed"), Path("output/index.html"))
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from html import escape
+from pathlib import Path
+from typing import Optional, Sequence, Union
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from .chart_service import ChartCatalog, ChartEntry
+from .delta import load_events
+
+
+# 迷你走势图: 最近的合并K线根数、降采样后的点数、尺寸 (px)
+SPARK_WINDOW = 240
+SPARK_POINTS = 60
+SPARK_WIDTH = 160
+SPARK_HEIGHT = 32
+
+
+@dataclass
+class SymbolSummary:
+    """
+    一个品种在总览页中的一行。
+
+    Attributes:
+        key: 品种键 (见 chart_service.ChartEntry)
+        title: 显示名称
+        merged_bars: 合并K线根数
+        last_datetime / last_close: 最后一根合并K线
+        endpoint / endpoint_price / bars_since_endpoint: 最后一个笔端点 ('T'/'B'，没有时为空字符串)
+        candidate / candidate_price / bars_since_candidate: 当前候选分型 ('Tc'/'Bc'，以右肩K线计距今根数)
+        closes: 最近 window 根合并K线的收盘价
+        strokes: 窗口内的笔端点 [(窗口内位置, 价格), ...]
+        error: 读取失败时的错误信息
+    """
+    key: str
+    title: str
+    merged_bars: int = 0
+    last_datetime: Optional[pd.Timestamp] = None
+    last_close: float = np.nan
+    endpoint: str = ''
+    endpoint_price: float = np.nan
+    bars_since_endpoint: int = -1
+    candidate: str = ''
+    candidate_price: float = np.nan
+    bars_since_candidate: int = -1
+    closes: np.ndarray = field(default_factory=lambda: np.empty(0))
+    strokes: list = field(default_factory=list)
+    error: str = ''
+
+
+def load_summary(entry: ChartEntry, window: int = SPARK_WINDOW) -> SymbolSummary:
+    """
+    读取一个品种的最新笔状态和最近 window 根收盘价 (只读取 datetime / close 两列)。
+
+    事件表缺失或为逐K线完整表时，笔状态和笔端点连线留空。
+    """
+    summary = SymbolSummary(key=entry.key, title=entry.title)
+    try:
+        bars = pd.read_csv(entry.merged_csv, usecols=['datetime', 'close'])
+    except (FileNotFoundError, ValueError) as e:
+        summary.error = f"{type(e).__name__}: {e}"
+        return summary
+    n = len(bars)
+    summary.merged_bars = n
+    if n == 0:
+        return summary
+    closes = bars['close'].to_numpy(dtype=np.float64)
+    summary.last_datetime = pd.to_datetime(bars['datetime'].iloc[-1])
+    summary.last_close = closes[-1]
+    summary.closes = closes[-window:]
+
+    events = load_events(entry.strokes_csv)
+    if events is None:
+        return summary
+    kinds = events['kind'].to_numpy(dtype=object)
+    bar_idx = events['bar_idx'].to_numpy()
+    prices = events['price'].to_numpy(dtype=np.float64)
+
+    endpoints = np.flatnonzero(np.isin(kinds, ('T', 'B')))
+    if len(endpoints):
+        i = endpoints[-1]
+        summary.endpoint, summary.endpoint_price = kinds[i], prices[i]
+        summary.bars_since_endpoint = n - 1 - int(bar_idx[i])
+        start = n - len(summary.closes)
+        shown = endpoints[bar_idx[endpoints] >= start]
+        summary.strokes = list(zip((bar_idx[shown] - start).tolist(), prices[shown].tolist()))
+    # 当前候选在分型K线上的一行 (bar_idx == fractal_idx)，距今根数以右肩K线计
+    current = np.flatnonzero(np.isin(kinds, ('Tc', 'Bc')) & (bar_idx == events['fractal_idx'].to_numpy()))
+    if len(current):
+        i = current[-1]
+        summary.candidate, summary.candidate_price = kinds[i], prices[i]
+        summary.bars_since_candidate = n - 1 - min(int(bar_idx[i]) + 1, n - 1)
+    return summary
+
+
+def sparklines(summaries: Sequence[SymbolSummary], window: int = SPARK_WINDOW, points: int = SPARK_POINTS,
+               width: int = SPARK_WIDTH, height: int = SPARK_HEIGHT) -> list[str]:
+    """
+    批量生成迷你走势图 (内联 SVG)。
+
+    各品种最近 window 根收盘价右对齐堆叠为 (品种数, window) 矩阵 (不足的在左侧填 NaN)，
+    每 window // points 根取桶内最后一根降采样，再逐行按收盘价与窗口内笔端点价格的范围归一化。
+
+    Returns:
+        list[str]: 与 summaries 一一对应的 SVG 片段 (没有数据时为空字符串)
+    """
+    if not summaries:
+        return []
+    step = max(1, window // points)
+    window = step * max(1, window // step)
+    matrix = np.full((len(summaries), window), np.nan)
+    for row, s in zip(matrix, summaries):
+        closes = s.closes[-window:]
+        if len(closes):
+            row[window - len(closes):] = closes
+
+    sampled = matrix[:, step - 1::step]
+    # 窗口内位置 -> 横坐标 (降采样点取桶内最后一根)
+    x_scale = width / max(window - 1, 1)
+    xs = np.arange(step - 1, window, step) * x_scale
+
+    lo = np.where(np.isnan(matrix), np.inf, matrix).min(axis=1)
+    hi = np.where(np.isnan(matrix), -np.inf, matrix).max(axis=1)
+    for i, s in enumerate(summaries):
+        if s.strokes:
+            stroke_prices = [p for _, p in s.strokes]
+            lo[i] = min(lo[i], min(stroke_prices))
+            hi[i] = max(hi[i], max(stroke_prices))
+    span = np.where(hi > lo, hi - lo, 1.0)
+    pad = 2.0
+    ys = pad + (height - 2 * pad) * (1.0 - (sampled - lo[:, None]) / span[:, None])
+
+    svgs = []
+    for i, s in enumerate(summaries):
+        valid = ~np.isnan(ys[i])
+        if not valid.any():
+            svgs.append('')
+            continue
+        line = ' '.join(f"{x:.1f},{y:.1f}" for x, y in zip(xs[valid].tolist(), ys[i][valid].tolist()))
+        parts = [f'<polyline points="{line}" fill="none" stroke="#787b86" stroke-width="1"/>']
+        if s.strokes:
+            # s.strokes 的位置相对 s.closes 的起点，矩阵右对齐
+            offset = window - len(s.closes)
+            stroke_pts = ' '.join(
+                f"{(pos + offset) * x_scale:.1f},"
+                f"{pad + (height - 2 * pad) * (1.0 - (price - lo[i]) / span[i]):.1f}"
+                for pos, price in s.strokes if pos + offset >= 0
+            )
+            parts.append(f'<polyline points="{stroke_pts}" fill="none" stroke="#9c27b0" stroke-width="1.5"/>')
+        svgs.append(f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">{"".join(parts)}</svg>')
+    return svgs
+
+
+def _fmt_price(value: float) -> str:
+    return '' if np.isnan(value) else f"{value:g}"
+
+
+def _state_cell(kind: str, price: float, age: int) -> str:
+    """笔状态单元格，如 'T 3.42 · 5 根前'"""
+    if not kind:
+        return '<td class="muted">-</td>'
+    css = 'top' if kind.startswith('T') else 'bottom'
+    return f'<td><span class="{css}">{kind}</span> {_fmt_price(price)} <span class="muted">· {age} 根前</span></td>'
+
+
+def dashboard_html(summaries: Sequence[SymbolSummary], svgs: Sequence[str], links: Sequence[Optional[str]],
+                   title: str = '品种总览') -> str:
+    """
+    组装总览页 (纯 HTML + 内联 SVG，不加载脚本)。
+
+    Args:
+        summaries: 各品种的状态
+        svgs: sparklines() 的结果
+        links: 各品种完整图表的链接，None 表示没有
+        title: 页面标题
+    """
+    rows = []
+    for s, svg, link in zip(summaries, svgs, links):
+        name = escape(s.title)
+        name = f'<a href="{escape(link)}">{name}</a>' if link else name
+        if s.error:
+            rows.append(f'<tr><td>{name}</td><td colspan="5" class="error">{escape(s.error)}</td></tr>')
+            continue
+        last = s.last_datetime.strftime('%Y-%m-%d') if s.last_datetime is not None else ''
+        rows.append(
+            f'<tr><td>{name}</td><td class="muted">{last}</td><td>{_fmt_price(s.last_close)}</td>'
+            f'{_state_cell(s.endpoint, s.endpoint_price, s.bars_since_endpoint)}'
+            f'{_state_cell(s.candidate, s.candidate_price, s.bars_since_candidate)}'
+            f'<td>{svg}</td></tr>'
+        )
+    body = '\n'.join(rows)
+    return f'''<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{escape(title)}</title>
+    <style>
+        body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+               background: #131722; color: #d1d4dc; margin: 0; padding: 16px 20px; font-size: 13px; }}
+        h1 {{ font-size: 16px; font-weight: 500; }}
+        table {{ border-collapse: collapse; }}
+        th {{ text-align: left; color: #787b86; font-weight: 500; padding: 6px 12px;
+              border-bottom: 1px solid #2a2e39; position: sticky; top: 0; background: #131722; }}
+        td {{ padding: 4px 12px; border-bottom: 1px solid #1e222d; white-space: nowrap; }}
+        tr:hover td {{ background: #1e222d; }}
+        a {{ color: #d1d4dc; text-decoration: none; }}
+        a:hover {{ color: #4ECDC4; }}
+        svg {{ display: block; }}
+        .muted {{ color: #787b86; }}
+        .top {{ color: #ef5350; }}
+        .bottom {{ color: #26a69a; }}
+        .error {{ color: #ef5350; }}
+    </style>
+</head>
+<body>
+    <h1>{escape(title)} ({len(summaries)})</h1>
+    <table>
+        <tr><th>品种</th><th>最后K线</th><th>收盘</th><th>最后端点</th><th>当前候选</th><th>最近走势 / 笔</th></tr>
+{body}
+    </table>
+</body>
+</html>
+'''
+
+
+def build_dashboard(
+    processed_dir: Union[str, Path],
+    output_path: Union[str, Path],
+    chart_dir: Optional[Union[str, Path]] = None,
+    chart_url: Optional[str] = None,
+    window: int = SPARK_WINDOW,
+    points: int = SPARK_POINTS,
+    max_workers: Optional[int] = None,
+) -> list[SymbolSummary]:
+    """
+    生成品种总览页。
+
+    Args:
+        processed_dir: 流水线的分析结果目录 (data/processed)
+        output_path: 总览页保存路径 (如 output/index.html)
+        chart_dir: 交互式图表所在目录 (output)，存在 <品种目录>/<基本名>_interactive.html 时链接到该文件；
+                   None 表示 output_path 所在目录
+        chart_url: 可选，按需图表服务的图表地址前缀 (如 http://127.0.0.1:8766/chart/)，
+                   没有预先生成的图表时链接到服务
+        window: 迷你走势图的合并K线根数
+        points: 迷你走势图降采样后的点数
+        max_workers: 读取分析结果的并行进程数 (按品种分配)，None 或 1 表示串行
+
+    Returns:
+        list[SymbolSummary]: 各品种的状态 (按名称排序)
+    """
+    output_path = Path(output_path)
+    chart_dir = Path(chart_dir) if chart_dir is not None else output_path.parent
+    entries = ChartCatalog(processed_dir).entries()
+    if max_workers is None or max_workers <= 1:
+        summaries = [load_summary(e, window) for e in entries]
+    else:
+        chunksize = max(1, len(entries) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            summaries = list(executor.map(load_summary, entries, itertools.repeat(window), chunksize=chunksize))
+    summaries.sort(key=lambda s: s.title)
+    svgs = sparklines(summaries, window, points)
+
+    links = []
+    for s in summaries:
+        directory, base = s.key.split('/', 1)
+        html = chart_dir / directory / f"{base}_interactive.html"
+        if html.exists():
+            links.append(Path(os.path.relpath(html, output_path.parent)).as_posix())
+        elif chart_url:
+            links.append(chart_url + quote(s.key))
+        else:
+            links.append(None)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(dashboard_html(summaries, svgs, links), encoding='utf-8')
+    return summaries
@@ -0,0 +1,189 @@
+"""
+analysis/delta.py
+笔端点事件表的增量变更 (changeset)。
+
+每日更新通常只改变最后一两个笔端点，下游无需重新读取完整的 *_strokes.csv，
+只需读取本次运行与上次结果的差异并应用到已有的事件表上:
+
+    change           含义                                  行内容
+    added            新增笔端点 (T/B)                      新行
+    retyped          同一分型的笔端点类型变化 (T <-> B)    新行，prev_* 为被取代的旧行
+    replaced         新的被替换端点 (Tx/Bx)                新行
+    candidate        新的候选分型 (Tc/Bc)                  新行
+    candidate_moved  当前候选移动到另一个分型              新行，prev_* 为旧的当前候选行
+    updated          同一标记的时间/价格/来源变化          新行
+    removed          不再存在的标记                        旧行
+
+事件行以 (bar_idx, fractal_idx, kind) 唯一确定 (见 fractals.stroke_events)。
+
+用法:
+    from src.analysis.delta import load_events, events_delta, apply_delta
+
+    delta = events_delta(load_events(strokes_csv), new_events)
+    events = apply_delta(events, delta)      # 下游: 与 new_events 完全一致
+"""
+
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .fractals import EVENT_COLUMNS, _KIND_ORDER
+
+
+EVENT_KEY = ['bar_idx', 'fractal_idx', 'kind']
+PREV_COLUMNS = ['prev_bar_idx', 'prev_fractal_idx', 'prev_kind']
+
+CHANGE_TYPES = {
+    'added': '新增笔端点',
+    'retyped': '笔端点类型变化',
+    'replaced': '新的被替换端点',
+    'candidate': '新的候选分型',
+    'candidate_moved': '当前候选移动',
+    'updated': '标记内容变化',
+    'removed': '移除的标记',
+}
+
+_ENDPOINT_KINDS = ('T', 'B')
+_REPLACED_KINDS = ('Tx', 'Bx')
+_CANDIDATE_KINDS = ('Tc', 'Bc')
+
+
+def load_events(path: Union[str, Path]) -> Optional[pd.DataFrame]:
+    """
+    读取上一次输出的笔端点事件表。
+
+    Returns:
+        pd.DataFrame: 事件表；文件不存在或不是稀疏事件表格式 (如逐K线完整表) 时返回 None
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    events = pd.read_csv(path, encoding='utf-8', float_precision='round_trip', keep_default_na=False)
+    if not set(EVENT_COLUMNS) <= set(events.columns):
+        return None
+    events['datetime'] = pd.to_datetime(events['datetime'])
+    for col in ('bar_idx', 'fractal_idx', 'raw_idx'):
+        if col in events.columns:
+            events[col] = events[col].astype(np.int32)
+    events['price'] = events['price'].astype(np.float64)
+    events['kind'] = events['kind'].astype(str)
+    return events
+
+
+def _sort_events(events: pd.DataFrame) -> pd.DataFrame:
+    """与 stroke_events 相同的排序: bar_idx，同一K线内按标记类型"""
+    order = np.lexsort((events['kind'].map(_KIND_ORDER).to_numpy(), events['bar_idx'].to_numpy()))
+    return events.iloc[order].reset_index(drop=True)
+
+
+def events_delta(old: Optional[pd.DataFrame], new: pd.DataFrame) -> pd.DataFrame:
+    """
+    对比两次的笔端点事件表，生成变更集。
+
+    Args:
+        old: 上一次的事件表，None 表示没有 (全部为新增)
+        new: 本次的事件表 (stroke_events 的结果)
+
+    Returns:
+        pd.DataFrame: 列为 change + 事件表的列 + PREV_COLUMNS，按 bar_idx 排序；
+                      没有旧行可对应时 prev_bar_idx / prev_fractal_idx 为 -1，prev_kind 为空字符串
+    """
+    columns = list(new.columns)
+    if old is None:
+        old = new.iloc[:0]
+    values = [c for c in columns if c not in EVENT_KEY and c in old.columns]
+
+    both = old[EVENT_KEY + values].merge(new, on=EVENT_KEY, how='outer', suffixes=('_old', ''), indicator=True)
+    added = both[both['_merge'] == 'right_only']
+    removed = both[both['_merge'] == 'left_only']
+    common = both[both['_merge'] == 'both']
+    changed = np.zeros(len(common), dtype=bool)
+    for col in values:
+        changed |= (common[col] != common[col + '_old']).to_numpy()
+
+    new_rows = added[columns].reset_index(drop=True)
+    old_rows = removed[EVENT_KEY + [c + '_old' for c in values]].reset_index(drop=True)
+    old_rows.columns = EVENT_KEY + values
+    kinds = new_rows['kind'].to_numpy(dtype=object)
+
+    change = np.full(len(new_rows), 'added', dtype=object)
+    change[np.isin(kinds, _REPLACED_KINDS)] = 'replaced'
+    change[np.isin(kinds, _CANDIDATE_KINDS)] = 'candidate'
+    prev = np.full((len(new_rows), 2), -1, dtype=np.int32)
+    prev_kind = np.full(len(new_rows), '', dtype=object)
+
+    # 与被移除的旧行配对: 同一分型的 T <-> B，当前候选 (分型K线上的 Tc/Bc 行) 的移动
+    old_kinds = old_rows['kind'].to_numpy(dtype=object)
+    old_current = np.flatnonzero(np.isin(old_kinds, _CANDIDATE_KINDS)
+                                 & (old_rows['bar_idx'] == old_rows['fractal_idx']).to_numpy())
+    old_endpoints = {
+        int(f): i for i, f in zip(np.flatnonzero(np.isin(old_kinds, _ENDPOINT_KINDS)),
+                                  old_rows['fractal_idx'].to_numpy()[np.isin(old_kinds, _ENDPOINT_KINDS)])
+    }
+    paired = np.zeros(len(old_rows), dtype=bool)
+    for i, (bar, frac, kind) in enumerate(new_rows[EVENT_KEY].itertuples(index=False)):
+        j = None
+        if kind in _ENDPOINT_KINDS and int(frac) in old_endpoints:
+            j, label = old_endpoints[int(frac)], 'retyped'
+        elif kind in _CANDIDATE_KINDS and bar == frac and len(old_current):
+            j, label = old_current[0], 'candidate_moved'
+        if j is None or paired[j]:
+            continue
+        paired[j] = True
+        change[i] = label
+        prev[i] = old_rows.loc[j, ['bar_idx', 'fractal_idx']].to_numpy()
+        prev_kind[i] = old_kinds[j]
+
+    parts = [
+        new_rows.assign(change=change, prev_bar_idx=prev[:, 0], prev_fractal_idx=prev[:, 1], prev_kind=prev_kind),
+        common.loc[changed, columns].assign(change='updated'),
+        old_rows[~paired].assign(change='removed'),
+    ]
+    parts = [p for p in parts if len(p)]
+    delta = pd.concat(parts, ignore_index=True) if parts else new_rows
+    delta = delta.reindex(columns=['change'] + columns + PREV_COLUMNS)
+    # 旧表缺少的列 (如 raw_idx) 及没有对应旧行的 prev_* 填 -1 / 空字符串
+    int_columns = [c for c in columns if pd.api.types.is_integer_dtype(new[c])] + PREV_COLUMNS[:2]
+    delta[int_columns] = delta[int_columns].fillna(-1)
+    delta['prev_kind'] = delta['prev_kind'].fillna('')
+    dtypes = {c: new[c].dtype for c in columns}
+    dtypes.update(prev_bar_idx=np.int32, prev_fractal_idx=np.int32)
+    return _sort_events(delta.astype(dtypes))
+
+
+def apply_delta(events: Optional[pd.DataFrame], delta: pd.DataFrame) -> pd.DataFrame:
+    """
+    将变更集应用到旧的事件表上 (下游使用)。
+
+    Args:
+        events: 旧事件表，None 表示空表
+        delta: events_delta() 的结果
+
+    Returns:
+        pd.DataFrame: 新的事件表
+    """
+    columns = [c for c in delta.columns if c != 'change' and c not in PREV_COLUMNS]
+    if events is None:
+        events = delta[columns].iloc[:0]
+
+    # 需要删除的旧行: removed / updated 本身，retyped / candidate_moved 的 prev_*
+    change = delta['change']
+    drop = delta.loc[change.isin(['removed', 'updated']), EVENT_KEY]
+    moved = delta.loc[change.isin(['retyped', 'candidate_moved']), PREV_COLUMNS]
+    moved.columns = EVENT_KEY
+    drop = pd.concat([drop, moved])
+    keys = pd.MultiIndex.from_frame(events[EVENT_KEY])
+    kept = events[~keys.isin(pd.MultiIndex.from_frame(drop.astype(events[EVENT_KEY].dtypes)))]
+
+    added = delta.loc[change != 'removed', columns]
+    result = pd.concat([kept[columns], added], ignore_index=True) if len(added) else kept[columns]
+    return _sort_events(result.astype(events[columns].dtypes))
+
+
+def delta_summary(delta: pd.DataFrame) -> str:
+    """变更集的一行摘要，如 '新增笔端点 1, 当前候选移动 1'"""
+    counts = delta['change'].value_counts()
+    parts = [f"{label} {counts[key]}" for key, label in CHANGE_TYPES.items() if key in counts]
+    return ", ".join(parts) if parts else "无变化"
@@ -5,10 +5,21 @@ analysis/fractals.py
 直接从合并后的K线数据中识别分型，并应用笔的过滤规则。
 支持标准 OHLC 格式（推荐）和旧版中文列名格式（向后兼容）。
 """
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
 from ..io.schema import COL_DATETIME, COL_OPEN, COL_HIGH, COL_LOW, COL_CLOSE
+from ..instrument import stage
+from .merging import MergeProvenance, PROVENANCE_COLUMNS
+from .codes import (
+    COL_RAW_FRACTAL_CODE, COL_VALID_FRACTAL_CODE, COL_BAR_FLAGS,
+    FractalCode, BarFlag, FRACTAL_STATE_FLAGS,
+    encode_kline_status, encode_raw_fractal, add_string_columns,
+)
 
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial'] 
 plt.rcParams['axes.unicode_minus'] = False
@@ -37,80 +48,273 @@ def _detect_columns(df: pd.DataFrame) -> tuple[str, str, str, str, str]:
     raise ValueError(f"无法识别列名格式，当前列: {df.columns.tolist()}")
 
 
-def process_strokes(input_path, output_path, save_plot_path=None):
+@dataclass(frozen=True)
+class StrokeRules:
     """
-    从合并后的K线数据中：
-    1. 识别原始分型（顶/底）
-    2. 应用笔的规则过滤（顶底交替 + 极值更新 + 间隔约束）
+    笔过滤规则参数。
+
+    Attributes:
+        min_dist: 顶底分型最小间隔 (合并K线索引差)
+        validate_extreme: 确认笔时是否验证端点为区间内真正的极值点
+        check_replace_dist: 同向替换笔端点时是否要求与上上笔终点满足最小间隔
     """
-    print(f"读取合并后的K线数据: {input_path}")
-    
-    # 尝试多种编码
-    try:
-        df = pd.read_csv(input_path, encoding='utf-8')
-    except UnicodeDecodeError:
-        df = pd.read_csv(input_path, encoding='gbk')
-    
-    # 检测列名格式
-    col_dt, col_open, col_high, col_low, col_close = _detect_columns(df)
-    print(f"检测到列名格式: high={col_high}, low={col_low}")
-    
-    highs = df[col_high].tolist()
-    lows = df[col_low].tolist()
-    n = len(df)
-    
+    min_dist: int = MIN_DIST
+    validate_extreme: bool = True
+    check_replace_dist: bool = True
+
+
+@dataclass
+class StrokeConfirmations:
+    """
+    笔端点确认信息 (列式数组)。
+
+    每一行对应一个被反向分型确认过的笔端点，所有数组等长。
+
+    Attributes:
+        fractal_idx: 分型所在的合并K线索引 (int32)
+        fractal_type: 分型类型，1 = 顶分型，-1 = 底分型 (int8)
+        confirm_idx: 确认该分型的K线索引，即出现反向分型的那根K线 (int32)
+        price: 分型极值价格，顶分型为 high，底分型为 low (float64)
+        replaced_by_idx: 之后替换该端点的分型索引，未被替换为 -1 (int32)
+    """
+    fractal_idx: np.ndarray
+    fractal_type: np.ndarray
+    confirm_idx: np.ndarray
+    price: np.ndarray
+    replaced_by_idx: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.fractal_idx)
+
+    @property
+    def lag(self) -> np.ndarray:
+        """确认滞后 (合并K线根数) = confirm_idx - fractal_idx"""
+        return self.confirm_idx - self.fractal_idx
+
+    def to_frame(self) -> pd.DataFrame:
+        """转换为 DataFrame，附带 lag 列"""
+        return pd.DataFrame({
+            'fractal_idx': self.fractal_idx,
+            'fractal_type': self.fractal_type,
+            'confirm_idx': self.confirm_idx,
+            'price': self.price,
+            'replaced_by_idx': self.replaced_by_idx,
+            'lag': self.lag,
+        })
+
+
+@dataclass
+class StrokeResult:
+    """
+    笔识别结果。
+
+    Attributes:
+        raw_fractals: 每根合并K线的原始分型 ('', 'TOP', 'BOTTOM')
+        strokes: 有效笔端点 [(index, type), ...]
+        replaced: 被替换的分型 [(index, type), ...]
+        candidate_history: 候选分型记录 [(fractal_idx, type, candidate_bar_idx), ...]
+        current_candidate: 当前候选分型 (index, type)，没有则为 None
+        confirmations: 笔端点确认信息
+        rules: 生成该结果所用的过滤规则
+    """
+    raw_fractals: list
+    strokes: list
+    replaced: list
+    candidate_history: list
+    current_candidate: Optional[tuple]
+    confirmations: StrokeConfirmations
+    rules: StrokeRules = StrokeRules()
+
+    @property
+    def raw_count(self) -> int:
+        """原始分型数量"""
+        return sum(1 for x in self.raw_fractals if x)
+
+    @property
+    def stroke_idx(self) -> np.ndarray:
+        """有效笔端点索引 (int32)"""
+        return np.array([idx for idx, _ in self.strokes], dtype=np.int32)
+
+    @property
+    def stroke_type(self) -> np.ndarray:
+        """有效笔端点类型，1 = 顶，-1 = 底 (int8)"""
+        return np.array([1 if t == 'TOP' else -1 for _, t in self.strokes], dtype=np.int8)
+
+
+def _build_confirmations(stroke_confirm_info, replaced_by, highs, lows, raw_fractals) -> StrokeConfirmations:
+    """将确认信息字典转换为列式数组"""
+    fractal_idx = np.fromiter(stroke_confirm_info.keys(), dtype=np.int32, count=len(stroke_confirm_info))
+    confirm_idx = np.fromiter(stroke_confirm_info.values(), dtype=np.int32, count=len(stroke_confirm_info))
+    is_top = np.array([raw_fractals[i] == 'TOP' for i in fractal_idx], dtype=bool)
+    fractal_type = np.where(is_top, 1, -1).astype(np.int8)
+    price = np.where(
+        is_top,
+        np.asarray(highs, dtype=np.float64)[fractal_idx],
+        np.asarray(lows, dtype=np.float64)[fractal_idx],
+    ) if len(fractal_idx) else np.empty(0, dtype=np.float64)
+    replaced_by_idx = np.array(
+        [replaced_by.get(int(i), -1) for i in fractal_idx], dtype=np.int32
+    )
+    return StrokeConfirmations(
+        fractal_idx=fractal_idx,
+        fractal_type=fractal_type,
+        confirm_idx=confirm_idx,
+        price=price,
+        replaced_by_idx=replaced_by_idx,
+    )
+
+
+def find_raw_fractals(highs, lows) -> list:
+    """
+    识别原始分型（纯3根K线组合，向量化实现）。
+
+    注：分型识别只看相邻3根K线，距离约束在笔过滤阶段处理。
+
+    Returns:
+        list: 每根K线的分型类型 ('', 'TOP', 'BOTTOM')
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    n = len(highs)
+    raw_fractals = np.full(n, '', dtype=object)
     if n < 3:
-        print("数据不足，无法识别分型")
-        return
+        return raw_fractals.tolist()
     
-    # ============================================================
-    # 第一步：识别原始分型（纯3根K线组合）
-    # 注：分型识别只看相邻3根K线，距离约束在笔过滤阶段处理
-    # ============================================================
-    raw_fractals = [''] * n  # '', 'TOP', 'BOTTOM'
+    h_prev, h_curr, h_next = highs[:-2], highs[1:-1], highs[2:]
+    l_prev, l_curr, l_next = lows[:-2], lows[1:-1], lows[2:]
     
-    for i in range(1, n - 1):
-        h_prev, h_curr, h_next = highs[i-1], highs[i], highs[i+1]
-        l_prev, l_curr, l_next = lows[i-1], lows[i], lows[i+1]
-        
-        # 顶分型：中间K线的High比左右都高
-        if h_curr > h_prev and h_curr > h_next:
-            raw_fractals[i] = 'TOP'
-        # 底分型：中间K线的Low比左右都低
-        elif l_curr < l_prev and l_curr < l_next:
-            raw_fractals[i] = 'BOTTOM'
-    
-    raw_count = sum(1 for x in raw_fractals if x)
-    print(f"原始分型数量: {raw_count}")
+    # 顶分型：中间K线的High比左右都高
+    is_top = (h_curr > h_prev) & (h_curr > h_next)
+    # 底分型：中间K线的Low比左右都低 (顶分型优先)
+    is_bottom = ~is_top & (l_curr < l_prev) & (l_curr < l_next)
+    
+    raw_fractals[1:-1][is_top] = 'TOP'
+    raw_fractals[1:-1][is_bottom] = 'BOTTOM'
+    return raw_fractals.tolist()
+
+
+def compute_strokes(highs, lows, rules: Optional[StrokeRules] = None) -> StrokeResult:
+    """
+    从合并后K线的高低点序列中识别分型并过滤生成有效笔 (纯计算，不读写文件)。
+
+    Args:
+        highs: 合并K线最高价序列
+        lows: 合并K线最低价序列
+        rules: 笔过滤规则，None 则使用默认规则 (MIN_DIST)
+
+    Returns:
+        StrokeResult: 笔识别结果
+    """
+    return filter_strokes(highs, lows, find_raw_fractals(highs, lows), rules)
+
+
+@dataclass
+class StrokeState:
+    """
+    笔过滤的中间状态。分型按位置顺序处理，处理到任意位置时的状态都可以保存下来，
+    之后从 next_idx 处继续 (见 analysis/incremental.py)。
+
+    Attributes:
+        strokes: 有效笔端点 [(index, type), ...]
+        confirm_info: 笔端点确认信息 {fractal_idx: confirm_idx}
+        replaced_by: 笔端点替换记录 {old_fractal_idx: new_fractal_idx}
+        replaced: 被替换的分型 [(index, type), ...]
+        candidate_history: 候选分型记录 [(fractal_idx, type, candidate_bar_idx), ...]
+        pending: 待确认分型 (index, type)
+        last_stroke_end: 最后一个笔端点 (index, type)
+        next_idx: 下一个待处理分型的最小位置
+    """
+    strokes: list = field(default_factory=list)
+    confirm_info: dict = field(default_factory=dict)
+    replaced_by: dict = field(default_factory=dict)
+    replaced: list = field(default_factory=list)
+    candidate_history: list = field(default_factory=list)
+    pending: Optional[tuple] = None
+    last_stroke_end: Optional[tuple] = None
+    next_idx: int = 0
+
+    def copy(self) -> 'StrokeState':
+        """深拷贝 (继续处理会原地修改列表)"""
+        return StrokeState(
+            strokes=list(self.strokes),
+            confirm_info=dict(self.confirm_info),
+            replaced_by=dict(self.replaced_by),
+            replaced=list(self.replaced),
+            candidate_history=list(self.candidate_history),
+            pending=self.pending,
+            last_stroke_end=self.last_stroke_end,
+            next_idx=self.next_idx,
+        )
+
+
+def filter_strokes(highs, lows, raw_fractals, rules: Optional[StrokeRules] = None) -> StrokeResult:
+    """
+    对已识别的原始分型应用笔的过滤规则。
+
+    原始分型与规则无关，参数扫描时可只计算一次，再对不同规则重复调用本函数。
+
+    Args:
+        highs: 合并K线最高价序列
+        lows: 合并K线最低价序列
+        raw_fractals: find_raw_fractals() 的结果
+        rules: 笔过滤规则，None 则使用默认规则 (MIN_DIST)
+
+    Returns:
+        StrokeResult: 笔识别结果
+    """
+    if rules is None:
+        rules = StrokeRules()
+    highs = np.asarray(highs, dtype=np.float64).tolist()
+    lows = np.asarray(lows, dtype=np.float64).tolist()
+    state = StrokeState()
+    advance_strokes(state, highs, lows, raw_fractals, rules)
+    return stroke_result(state, highs, lows, raw_fractals, rules)
+
+
+def advance_strokes(state: StrokeState, highs: list, lows: list, raw_fractals,
+                    rules: StrokeRules, stop: Optional[int] = None) -> StrokeState:
+    """
+    处理位置在 [state.next_idx, stop) 内的原始分型，原地更新 state。
+
+    Args:
+        state: 笔过滤状态
+        highs: 合并K线最高价 (list)
+        lows: 合并K线最低价 (list)
+        raw_fractals: find_raw_fractals() 的结果
+        rules: 笔过滤规则
+        stop: 处理到的位置 (不含)，None 表示处理到末尾
+
+    Returns:
+        StrokeState: 即传入的 state
+    """
+    min_dist = rules.min_dist
+    n = len(highs)
+    stop = n if stop is None else min(stop, n)
     
     # ============================================================
-    # 第二步：过滤分型，生成有效笔
+    # 过滤分型，生成有效笔
     # 规则：顶底交替 + 极值更新 + 最小间隔约束
     # ============================================================
     
-    # 收集所有原始分型的 (索引, 类型)
-    fractal_points = [(i, raw_fractals[i]) for i in range(n) if raw_fractals[i]]
-    
-    if not fractal_points:
-        print("未找到任何分型")
-        return
+    # 收集待处理原始分型的 (索引, 类型)
+    fractal_points = [(i, raw_fractals[i]) for i in range(state.next_idx, stop) if raw_fractals[i]]
     
     # 有效笔的端点列表: [(index, type), ...]
-    strokes = []
+    strokes = state.strokes
     # 每个笔端点的确认信息: {fractal_idx: confirm_idx}
     # confirm_idx 是该分型被确认时的K线索引（即出现反向分型的那根K线）
-    stroke_confirm_info = {}
-    
-    # 状态变量
-    pending = None
-    last_stroke_end = None
+    stroke_confirm_info = state.confirm_info
+    # 笔端点被替换的记录: {old_fractal_idx: new_fractal_idx}
+    replaced_by = state.replaced_by
     # 被替换的候选列表
-    replaced_candidates = []
+    replaced_candidates = state.replaced
     # 候选分型记录: [(fractal_idx, fractal_type, candidate_bar_idx), ...]
     # candidate_bar_idx 是该分型成为候选时的K线索引（= fractal_idx + 1，右肩K线）
-    candidate_history = []
-    # 当前候选分型 (pending 从未被确认，且不在 replaced_candidates 中)
-    current_candidate = None
+    candidate_history = state.candidate_history
+    
+    # 状态变量
+    pending = state.pending
+    last_stroke_end = state.last_stroke_end
     
     for idx, f_type in fractal_points:
         
@@ -128,14 +332,15 @@ def process_strokes(input_path, output_path, save_plot_path=None):
             # 同向分型：极值比较（需检查新分型与上上笔终点的距离）
             if f_type == last_stroke_end[1]:
                 # 计算与上上笔终点的距离（如果存在的话）
-                prev_stroke_idx = strokes[-2][0] if len(strokes) >= 2 else -MIN_DIST
+                prev_stroke_idx = strokes[-2][0] if len(strokes) >= 2 else -min_dist
                 dist_to_prev = idx - prev_stroke_idx
                 
                 if f_type == 'TOP' and highs[idx] > highs[last_stroke_end[0]]:
                     # 只有当新分型与上上笔终点距离足够时才替换
-                    if dist_to_prev >= MIN_DIST:
+                    if dist_to_prev >= min_dist or not rules.check_replace_dist:
                         old = strokes.pop()
                         replaced_candidates.append(old)
+                        replaced_by[old[0]] = idx
                         strokes.append((idx, f_type))
                         last_stroke_end = (idx, f_type)
                         # 补录候选历史：这个新分型也是一个有效的候选点
@@ -143,9 +348,10 @@ def process_strokes(input_path, output_path, save_plot_path=None):
                         if candidate_bar < n:
                             candidate_history.append((idx, f_type, candidate_bar))
                 elif f_type == 'BOTTOM' and lows[idx] < lows[last_stroke_end[0]]:
-                    if dist_to_prev >= MIN_DIST:
+                    if dist_to_prev >= min_dist or not rules.check_replace_dist:
                         old = strokes.pop()
                         replaced_candidates.append(old)
+                        replaced_by[old[0]] = idx
                         strokes.append((idx, f_type))
                         last_stroke_end = (idx, f_type)
                         # 补录候选历史
@@ -155,7 +361,7 @@ def process_strokes(input_path, output_path, save_plot_path=None):
                 continue
             
             # 反向分型：检查距离
-            if dist < MIN_DIST:
+            if dist < min_dist:
                 continue
             
             pending = (idx, f_type)
@@ -191,7 +397,7 @@ def process_strokes(input_path, output_path, save_plot_path=None):
             # 反向分型：尝试确认pending
             if last_stroke_end is not None:
                 dist = pending_idx - last_stroke_end[0]
-                if dist < MIN_DIST:
+                if dist < min_dist:
                     # pending太近，直接忽略 (不算作 Tx/Bx，因为从未生效过)
                     # replaced_candidates.append(pending)  <-- 删除此行
                     
@@ -199,11 +405,13 @@ def process_strokes(input_path, output_path, save_plot_path=None):
                         if f_type == 'TOP' and highs[idx] > highs[last_stroke_end[0]]:
                             old = strokes.pop()
                             replaced_candidates.append(old)
+                            replaced_by[old[0]] = idx
                             strokes.append((idx, f_type))
                             last_stroke_end = (idx, f_type)
                         elif f_type == 'BOTTOM' and lows[idx] < lows[last_stroke_end[0]]:
                             old = strokes.pop()
                             replaced_candidates.append(old)
+                            replaced_by[old[0]] = idx
                             strokes.append((idx, f_type))
                             last_stroke_end = (idx, f_type)
                         pending = None
@@ -215,7 +423,7 @@ def process_strokes(input_path, output_path, save_plot_path=None):
             # 【关键验证】检查从 last_stroke_end 到 pending 的区间内是否存在更极端的价格
             # 如果存在，说明 pending 不是真正的极值点，这一笔无效
             is_valid_stroke = True
-            if last_stroke_end is not None:
+            if last_stroke_end is not None and rules.validate_extreme:
                 start_idx = last_stroke_end[0]
                 end_idx = pending_idx
                 
@@ -248,6 +456,7 @@ def process_strokes(input_path, output_path, save_plot_path=None):
                 if strokes:
                     old_stroke = strokes.pop()
                     replaced_candidates.append(old_stroke)
+                    replaced_by[old_stroke[0]] = idx
                 
                 # 回溯后，直接将当前反向分型确认为新的笔端点，不再验证
                 # 这样可以避免级联取消
@@ -255,12 +464,28 @@ def process_strokes(input_path, output_path, save_plot_path=None):
                 last_stroke_end = (idx, f_type)
                 pending = None
     
+    state.pending = pending
+    state.last_stroke_end = last_stroke_end
+    state.next_idx = max(stop, state.next_idx)
+    return state
+
+
+def stroke_result(state: StrokeState, highs, lows, raw_fractals, rules: StrokeRules) -> StrokeResult:
+    """
+    由处理完全部分型的状态生成 StrokeResult (不修改 state)。
+    """
+    min_dist = rules.min_dist
+    pending = state.pending
+    last_stroke_end = state.last_stroke_end
+    # 当前候选分型 (pending 从未被确认，且不在 replaced_candidates 中)
+    current_candidate = None
+    
     # 处理最后一个pending
     # pending 状态的分型是"候选分型"，尚未被反向分型确认
     if pending is not None:
         if last_stroke_end is not None:
             dist = pending[0] - last_stroke_end[0]
-            if dist >= MIN_DIST:
+            if dist >= min_dist:
                 # 距离足够但尚未被反向分型确认
                 # 这是一个有效的候选分型
                 current_candidate = pending
@@ -271,56 +496,231 @@ def process_strokes(input_path, output_path, save_plot_path=None):
             # 没有 last_stroke_end，pending 作为第一个候选
             current_candidate = pending
     
-    # ============================================================
-    # 第三步：生成输出
-    # ============================================================
+    return StrokeResult(
+        raw_fractals=raw_fractals,
+        strokes=list(state.strokes),
+        replaced=list(state.replaced),
+        candidate_history=list(state.candidate_history),
+        current_candidate=current_candidate,
+        confirmations=_build_confirmations(state.confirm_info, state.replaced_by, highs, lows, raw_fractals),
+        rules=rules,
+    )
+
+
+def encode_stroke_columns(result: StrokeResult, n: int, merged_flags=None) -> dict[str, np.ndarray]:
+    """
+    将笔识别结果编码为逐K线的 int8 列和位标志 (见 codes.py)。
+
+    标记优先级与旧字符串格式一致：确认(T/B) < 被替换(Tx/Bx) < 当前候选(Tc/Bc)。
+
+    Args:
+        result: 笔识别结果
+        n: K线数量
+        merged_flags: 已有的 bar_flags (保留其中的 MERGED 位)，None 表示全部为 0
+
+    Returns:
+        dict: {raw_fractal_code, valid_fractal_code, bar_flags}
+    """
+    valid_code = np.zeros(n, dtype=np.int8)
+    if merged_flags is None:
+        flags = np.zeros(n, dtype=np.uint8)
+    else:
+        flags = (np.asarray(merged_flags, dtype=np.uint8) & BarFlag.MERGED).astype(np.uint8)
+    
+    def mark(points, state):
+        if not points:
+            return
+        idx = np.array([p[0] for p in points], dtype=np.int64)
+        valid_code[idx] = [FractalCode[p[1]] for p in points]
+        flags[idx] = (flags[idx] & ~FRACTAL_STATE_FLAGS & 0xFF) | state
+    
+    mark(result.strokes, BarFlag.CONFIRMED)
+    mark(result.replaced, BarFlag.REPLACED)
+    
+    # 候选分型显示在右肩K线上
+    display = [(bar_idx, f_type) for _, f_type, bar_idx in result.candidate_history]
+    if result.current_candidate is not None:
+        mark([result.current_candidate], BarFlag.CANDIDATE)
+        idx, f_type = result.current_candidate
+        display.append((idx + 1 if idx + 1 < n else idx, f_type))
+    for bar_idx, f_type in display:
+        flags[bar_idx] |= BarFlag.SHOW_TOP_CANDIDATE if f_type == 'TOP' else BarFlag.SHOW_BOTTOM_CANDIDATE
+    
+    return {
+        COL_RAW_FRACTAL_CODE: encode_raw_fractal(result.raw_fractals),
+        COL_VALID_FRACTAL_CODE: valid_code,
+        COL_BAR_FLAGS: flags,
+    }
+
+
+# 事件表的列 (每行一个 T/B/Tx/Bx/Tc/Bc 标记)
+EVENT_COLUMNS = ['bar_idx', 'fractal_idx', 'datetime', 'price', 'kind']
+_KIND_ORDER = {'T': 0, 'B': 1, 'Tx': 2, 'Bx': 3, 'Tc': 4, 'Bc': 5}
+
+
+def stroke_events(result: StrokeResult, datetimes, highs, lows,
+                  provenance: Optional[MergeProvenance] = None) -> pd.DataFrame:
+    """
+    将笔识别结果整理为稀疏事件表 (只包含有标记的K线)。
+
+    Args:
+        result: 笔识别结果
+        datetimes: 合并K线的时间序列
+        highs: 合并K线最高价
+        lows: 合并K线最低价
+        provenance: 可选，合并K线的来源索引；提供时附加 raw_idx 列
+
+    Returns:
+        pd.DataFrame: 列为 EVENT_COLUMNS，按 bar_idx 排序
+            - bar_idx: 标记显示的K线位置 (候选分型为右肩K线；当前候选另在分型K线上记录一行)
+            - fractal_idx: 分型所在K线位置
+            - price: 分型极值 (顶取最高价，底取最低价)
+            - kind: 'T'/'B' 确认, 'Tx'/'Bx' 被替换, 'Tc'/'Bc' 候选
+            - raw_idx: (可选) 分型极值所在的原始K线位置
+    """
+    n = len(highs)
+    rows = [(idx, idx, f_type[0]) for idx, f_type in result.strokes]
+    rows += [(idx, idx, f_type[0] + 'x') for idx, f_type in result.replaced]
+    rows += [(bar_idx, idx, f_type[0] + 'c') for idx, f_type, bar_idx in result.candidate_history]
+    if result.current_candidate is not None:
+        # 当前候选同时记录在分型K线上 (与逐K线格式的 valid_fractal 列一致) 和右肩K线上
+        idx, f_type = result.current_candidate
+        rows.append((idx, idx, f_type[0] + 'c'))
+        rows.append((idx + 1 if idx + 1 < n else idx, idx, f_type[0] + 'c'))
+
+    if not rows:
+        events = pd.DataFrame({
+            'bar_idx': np.empty(0, dtype=np.int32),
+            'fractal_idx': np.empty(0, dtype=np.int32),
+            'datetime': pd.to_datetime(pd.Series([], dtype=object)),
+            'price': np.empty(0, dtype=np.float64),
+            'kind': pd.Series([], dtype=object),
+        })
+        if provenance is not None:
+            events['raw_idx'] = np.empty(0, dtype=np.int32)
+        return events
+
+    bar_idx, fractal_idx, kind = (np.array(col) for col in zip(*rows))
+    is_top = np.char.startswith(kind.astype(str), 'T')
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    events = pd.DataFrame({
+        'bar_idx': bar_idx.astype(np.int32),
+        'fractal_idx': fractal_idx.astype(np.int32),
+        'datetime': pd.to_datetime(np.asarray(datetimes)[bar_idx]),
+        'price': np.where(is_top, highs[fractal_idx], lows[fractal_idx]),
+        'kind': kind.astype(object),
+    })
+    if provenance is not None:
+        events['raw_idx'] = provenance.extreme_source(fractal_idx, is_top).astype(np.int32)
+    # 当前候选可能已在候选历史中出现，去重
+    events = events.drop_duplicates(subset=['bar_idx', 'fractal_idx', 'kind'])
+    order = np.lexsort((events['kind'].map(_KIND_ORDER).to_numpy(), events['bar_idx'].to_numpy()))
+    return events.iloc[order].reset_index(drop=True)
+
+
+def process_strokes(input_path, output_path, save_plot_path=None,
+                    rules: Optional[StrokeRules] = None,
+                    string_columns: bool = False,
+                    wide: bool = False,
+                    plot: bool = True,
+                    compute=None,
+                    delta_path=None) -> Optional[StrokeResult]:
+    """
+    从合并后的K线数据中：
+    1. 识别原始分型（顶/底）
+    2. 应用笔的规则过滤（顶底交替 + 极值更新 + 间隔约束）
+
+    Args:
+        input_path: 合并后的K线 CSV 路径
+        output_path: 输出 CSV 路径
+        save_plot_path: 可选，保存图表的路径
+        rules: 笔过滤规则，None 则使用默认规则 (MIN_DIST)
+        string_columns: 是否同时输出旧版字符串列 (raw_fractal, valid_fractal, candidate_display)，
+                        仅对逐K线格式有效
+        wide: False 输出稀疏事件表 (见 stroke_events)，True 输出逐K线的完整表
+        plot: 是否在此处绘图；False 时由调用方另行渲染 (见 render.strokes_chart_job)
+        compute: 笔识别函数 (highs, lows, rules) -> StrokeResult，None 则使用 compute_strokes
+                 (增量计算见 incremental.IncrementalEngine.strokes)
+        delta_path: 可选，与 output_path 中上一次的事件表对比，将变更集写入该路径 (见 analysis/delta.py)；
+                    仅对稀疏事件表格式有效
+
+    Returns:
+        StrokeResult: 笔识别结果 (含 confirmations 列式确认信息)，数据不足时返回 None
+    """
+    print(f"读取合并后的K线数据: {input_path}")
     
-    # 创建分型列：合并确认的和被替换的
-    valid_fractals = [''] * n
+    # 尝试多种编码
+    with stage('read_csv'):
+        try:
+            df = pd.read_csv(input_path, encoding='utf-8')
+        except UnicodeDecodeError:
+            df = pd.read_csv(input_path, encoding='gbk')
     
-    # 确认的笔端点用 T/B
-    for idx, f_type in strokes:
-        valid_fractals[idx] = f_type[0]  # 'TOP' -> 'T', 'BOTTOM' -> 'B'
+    # 检测列名格式
+    col_dt, col_open, col_high, col_low, col_close = _detect_columns(df)
+    print(f"检测到列名格式: high={col_high}, low={col_low}")
     
-    # 被替换的用 Tx/Bx
-    for idx, f_type in replaced_candidates:
-        valid_fractals[idx] = f_type[0] + 'x'  # 'TOP' -> 'Tx', 'BOTTOM' -> 'Bx'
+    n = len(df)
     
-    # 当前候选分型用 Tc/Bc
-    if current_candidate is not None:
-        idx, f_type = current_candidate
-        valid_fractals[idx] = f_type[0] + 'c'  # 'TOP' -> 'Tc', 'BOTTOM' -> 'Bc'
+    if n < 3:
+        print("数据不足，无法识别分型")
+        return None
     
-    # 候选分型显示列：记录在右肩K线上的候选分型
-    # 格式：Tc 或 Bc，表示该K线上应显示候选分型标记
-    candidate_display = [''] * n
-    for fractal_idx, fractal_type, display_bar_idx in candidate_history:
-        marker_type = fractal_type[0] + 'c'  # 'TOP' -> 'Tc', 'BOTTOM' -> 'Bc'
-        # 可能多个候选在同一K线上，用逗号分隔
-        if candidate_display[display_bar_idx]:
-            candidate_display[display_bar_idx] += ',' + marker_type
-        else:
-            candidate_display[display_bar_idx] = marker_type
-    # 当前候选分型也加入显示列
-    if current_candidate is not None:
-        idx, f_type = current_candidate
-        display_bar = idx + 1 if idx + 1 < n else idx
-        marker_type = f_type[0] + 'c'
-        if candidate_display[display_bar]:
-            candidate_display[display_bar] += ',' + marker_type
-        else:
-            candidate_display[display_bar] = marker_type
+    with stage('compute'):
+        result = (compute or compute_strokes)(df[col_high].to_numpy(), df[col_low].to_numpy(), rules)
+    raw_count = result.raw_count
+    print(f"原始分型数量: {raw_count}")
     
-    df['raw_fractal'] = raw_fractals
-    df['valid_fractal'] = valid_fractals
-    df['candidate_display'] = candidate_display
+    if raw_count == 0:
+        print("未找到任何分型")
+        return None
+    
+    strokes = result.strokes
+    replaced_candidates = result.replaced
+    
+    # ============================================================
+    # 第三步：生成输出
+    # 默认为稀疏事件表；wide=True 时输出逐K线表 (int8 编码列 + 位标志，字符串列可选)
+    # ============================================================
+    provenance = MergeProvenance.from_frame(df) if set(PROVENANCE_COLUMNS) <= set(df.columns) else None
+    events = stroke_events(result, df[col_dt], df[col_high].to_numpy(), df[col_low].to_numpy(), provenance)
+    
+    if wide:
+        if COL_BAR_FLAGS in df.columns:
+            merged_flags = df[COL_BAR_FLAGS].to_numpy()
+        elif 'kline_status' in df.columns:
+            merged_flags = encode_kline_status(df['kline_status'])[1]
+        else:
+            merged_flags = None
+        
+        for col, values in encode_stroke_columns(result, n, merged_flags).items():
+            df[col] = values
+        if string_columns:
+            add_string_columns(df)
+        output_df = df
+    else:
+        if string_columns:
+            print("警告: 稀疏事件表不含字符串列，string_columns 仅对逐K线格式 (wide=True) 有效，已忽略")
+        output_df = events
+    
+    # 变更集: 须在覆盖 output_path 之前读取上一次的事件表
+    if delta_path is not None and not wide:
+        from .delta import load_events, events_delta, delta_summary
+        with stage('delta'):
+            delta = events_delta(load_events(output_path), events)
+            delta.to_csv(delta_path, index=False, encoding='utf-8')
+        print(f"变更集 ({delta_summary(delta)}) 已保存至: {delta_path}")
     
     # 保存
-    df.to_csv(output_path, index=False, encoding='utf-8')
+    with stage('write_csv'):
+        output_df.to_csv(output_path, index=False, encoding='utf-8')
     
     # 统计
-    print(f"过滤完成。规则: 最小间隔 {MIN_DIST}")
+    print(f"过滤完成。规则: 最小间隔 {result.rules.min_dist}")
     print(f"有效笔端点: {len(strokes)}, 被替换: {len(replaced_candidates)}, 原始分型: {raw_count}")
+    if len(result.confirmations):
+        print(f"确认滞后 (K线根数): 平均 {result.confirmations.lag.mean():.2f}, 最大 {result.confirmations.lag.max()}")
     print(f"结果已保存至: {output_path}")
     
     # 验证：检查是否交替
@@ -335,25 +735,36 @@ def process_strokes(input_path, output_path, save_plot_path=None):
         if alternation_ok:
             print("✅ 顶底分型交替验证通过")
     
+    if plot:
+        with stage('plot'):
+            plot_strokes(df, strokes, plot_markers(result, n),
+                         col_dt, col_open, col_high, col_low, col_close, save_plot_path)
+    
+    return result
+
+
+def plot_markers(result: StrokeResult, n: int) -> list[tuple]:
+    """
+    plot_strokes 使用的标记列表: [(显示位置, 'T'/'B'/'Tx'/'Bx'/'Tc'/'Bc'[, 分型位置]), ...]，按位置排序
+    """
     # 合并所有标记点用于可视化
-    all_markers = [(idx, f_type[0]) for idx, f_type in strokes]  # 'T' or 'B'
-    all_markers += [(idx, f_type[0] + 'x') for idx, f_type in replaced_candidates]  # 'Tx' or 'Bx'
+    all_markers = [(idx, f_type[0]) for idx, f_type in result.strokes]  # 'T' or 'B'
+    all_markers += [(idx, f_type[0] + 'x') for idx, f_type in result.replaced]  # 'Tx' or 'Bx'
     
     # 添加历史候选分型 (显示在右肩K线上)
     # candidate_history: [(fractal_idx, fractal_type, candidate_bar_idx), ...]
-    for fractal_idx, fractal_type, candidate_bar_idx in candidate_history:
+    for fractal_idx, fractal_type, candidate_bar_idx in result.candidate_history:
         marker_type = fractal_type[0] + 'c'  # 'TOP' -> 'Tc', 'BOTTOM' -> 'Bc'
         all_markers.append((candidate_bar_idx, marker_type, fractal_idx))  # 第三个元素是原始分型位置
     
     # 当前候选分型 (最后一个 pending)
-    if current_candidate is not None:
-        idx, f_type = current_candidate
+    if result.current_candidate is not None:
+        idx, f_type = result.current_candidate
         candidate_bar = idx + 1 if idx + 1 < n else idx
         all_markers.append((candidate_bar, f_type[0] + 'c', idx))  # 'Tc' or 'Bc'
     
     all_markers.sort(key=lambda x: x[0])  # 按索引排序
-    
-    plot_strokes(df, strokes, all_markers, col_dt, col_open, col_high, col_low, col_close, save_plot_path)
+    return all_markers
 
 
 def identify_hubs(strokes, highs, lows):
@@ -436,8 +847,16 @@ def identify_hubs(strokes, highs, lows):
     return hubs
 
 
-def plot_strokes(df, strokes, all_markers, col_dt, col_open, col_high, col_low, col_close, save_path=None):
-    """绘制带笔端点标注和S/R线的K线图"""
+def plot_strokes(df, strokes, all_markers, col_dt, col_open, col_high, col_low, col_close, save_path=None,
+                 formats=('png', 'svg'), ax=None):
+    """
+    绘制带笔端点标注和S/R线的K线图
+
+    Args:
+        save_path: PNG 保存路径 (SVG 为同名 .svg)，None 则直接显示
+        formats: 保存的格式 ('png' / 'svg')
+        ax: 复用的空白 Axes (见 render.ChartRenderer)，None 则新建 Figure 并在保存后关闭
+    """
     print("\n开始绘制...")
     
     df[col_dt] = pd.to_datetime(df[col_dt])
@@ -471,7 +890,12 @@ def plot_strokes(df, strokes, all_markers, col_dt, col_open, col_high, col_low,
     
     # 根据数据量调整图表宽度
     fig_width = max(14, len(plot_df) * 0.12)
-    fig, ax = plt.subplots(figsize=(fig_width, 8))
+    owned = ax is None
+    if owned:
+        fig, ax = plt.subplots(figsize=(fig_width, 8))
+    else:
+        fig = ax.figure
+        fig.set_size_inches(fig_width, 8)
     
     width = 0.6
     width2 = 0.05
@@ -549,13 +973,16 @@ def plot_strokes(df, strokes, all_markers, col_dt, col_open, col_high, col_low,
 
     if save_path:
         # 保存 PNG（高DPI）
-        plt.savefig(save_path, dpi=200, bbox_inches='tight')
-        print(f"图表已保存至: {save_path}")
+        if 'png' in formats:
+            fig.savefig(save_path, dpi=200, bbox_inches='tight')
+            print(f"图表已保存至: {save_path}")
         
         # 同时保存 SVG 矢量图
-        svg_path = save_path.replace('.png', '.svg')
-        plt.savefig(svg_path, format='svg', bbox_inches='tight')
-        print(f"矢量图已保存至: {svg_path}")
-        plt.close()
+        if 'svg' in formats:
+            svg_path = save_path.replace('.png', '.svg')
+            fig.savefig(svg_path, format='svg', bbox_inches='tight')
+            print(f"矢量图已保存至: {svg_path}")
+        if owned:
+            plt.close(fig)
     else:
         plt.show()
@@ -0,0 +1,324 @@
+"""
+analysis/incremental.py
+增量计算: 保存合并器与笔过滤状态的检查点，新增K线时从检查点继续，而不是从第一根K线重放。
+
+检查点取在最后一个笔端点 C (合并K线) 处，记 r_c 为 C 的最后一根原始K线:
+    - 合并器: 合并K线 [0..C] (高低点与来源索引)，以及处理完 r_c 时的趋势、合并次数
+    - 笔过滤: 处理完 C 之前全部分型后的状态 (笔端点、确认/替换记录、候选历史、pending、last_stroke_end)
+    - 原始K线 [0..r_c] 的摘要，用于发现历史数据修订
+
+合并K线 C 的最后一根原始K线为 r_c，说明 r_c 之后没有K线再并入 C，[0..C] 即处理完 r_c 时的合并器状态；
+C 之前的分型只依赖合并K线 [0..C]。因此原始K线前缀不变时，从检查点继续的结果与冷启动完全一致。
+新增K线若导致合并K线 C 及之前被修改 (向左回溯)，笔过滤从头重算 (合并仍从检查点继续)。
+
+用法:
+    from src.analysis.incremental import IncrementalEngine, load_checkpoint, save_checkpoint
+
+    engine = IncrementalEngine(load_checkpoint(path))
+    merged = engine.merge(df)                              # MergeResult
+    result = engine.strokes(highs, lows)                   # StrokeResult (highs/lows 为合并K线)
+    print(engine.mode, engine.reason)                      # 'warm' / 'cold' 及冷启动原因
+    save_checkpoint(engine.checkpoint, path)
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .codes import FractalCode
+from .fractals import (
+    StrokeRules, StrokeResult, StrokeState,
+    advance_strokes, find_raw_fractals, stroke_result,
+)
+from .merging import (
+    MergeResult, MergeState, _detect_columns, _price_lists,
+    initial_state, initial_trend, merge_kline_bars, merge_records, merge_result,
+)
+
+
+# 检查点格式版本，合并/笔过滤逻辑或存储格式变化时递增 (旧检查点随之失效)
+CHECKPOINT_VERSION = 1
+
+# 冷启动原因
+COLD_REASONS = {
+    'no_checkpoint': '没有检查点',
+    'truncated': '数据比检查点短',
+    'revision': '检查点之前的历史数据被修订',
+    'rules': '笔过滤规则变化',
+}
+
+
+@dataclass
+class Checkpoint:
+    """
+    检查点: 合并器与笔过滤在最后一个笔端点处的状态。
+
+    Attributes:
+        merge: 合并器状态 (合并K线 [0..C]，raw_next = r_c + 1)
+        strokes: 笔过滤状态 (next_idx = C)
+        rules: 笔过滤规则
+        digest: 原始K线 [0..r_c] 的摘要 (见 prefix_digest)
+    """
+    merge: MergeState
+    strokes: StrokeState
+    rules: StrokeRules
+    digest: str
+
+    @property
+    def raw_next(self) -> int:
+        """检查点覆盖的原始K线根数"""
+        return self.merge.raw_next
+
+
+def prefix_digest(df: pd.DataFrame, n: int) -> str:
+    """原始K线前 n 根 (时间与 OHLC) 的摘要"""
+    cols = list(_detect_columns(df))
+    hashed = pd.util.hash_pandas_object(df[cols].iloc[:n], index=False)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()
+
+
+# ============================================================
+# 引擎
+# ============================================================
+
+class IncrementalEngine:
+    """
+    带检查点的合并 + 笔过滤。先调用 merge()，再以其合并K线的高低点调用 strokes()；
+    strokes() 之后 checkpoint 为新的检查点 (无法建立时沿用旧检查点或为 None)。
+
+    merge / strokes 的签名与 merge_kline_bars / compute_strokes 一致，
+    可直接传给 apply_kline_merging(merge=...) / process_strokes(compute=...)。
+
+    Attributes:
+        checkpoint: 当前检查点
+        mode: 'warm' (从检查点继续) / 'cold' (从头计算)
+        reason: 冷启动原因 (COLD_REASONS 的键)；合并从检查点继续、笔过滤因规则变化从头计算时为 'rules'
+        resumed_from: 从检查点继续时跳过的原始K线根数
+        low_water: merge() 之后与检查点合并K线相同的前缀长度 (冷启动为 0)
+    """
+
+    def __init__(self, checkpoint: Optional[Checkpoint] = None):
+        self.checkpoint = checkpoint
+        self.mode = 'cold'
+        self.reason = ''
+        self.resumed_from = 0
+        self._df = None
+        self._state = None
+        self._resume = None
+        self._low_water = 0
+
+    @property
+    def low_water(self) -> int:
+        return self._low_water if self.mode == 'warm' else 0
+
+    def merge(self, df: pd.DataFrame, string_columns: bool = False) -> MergeResult:
+        """合并原始K线，原始K线前缀与检查点一致时从检查点继续"""
+        _detect_columns(df)
+        self._df = df
+        self._state = self._resume = None
+        if df.empty:
+            self.mode, self.reason, self.resumed_from = 'cold', '', 0
+            return merge_kline_bars(df, string_columns)
+
+        prices = _price_lists(df)
+        ck = self.checkpoint
+        reason = self._check(df, ck)
+        if reason:
+            # 失效的检查点不再沿用
+            self.checkpoint = None
+            state = initial_state(prices[0], prices[1], trend_log=True)
+            self.mode, self.reason, self.resumed_from = 'cold', reason, 0
+        else:
+            state = MergeState(
+                highs=list(ck.merge.highs), lows=list(ck.merge.lows), sources=list(ck.merge.sources),
+                current_trend=ck.merge.current_trend, merge_count=ck.merge.merge_count,
+                initial_trend=ck.merge.initial_trend, raw_next=ck.merge.raw_next,
+                trend_log=[(ck.merge.raw_next - 1, ck.merge.current_trend)],
+            )
+            self._resume = ck
+            self.mode, self.reason, self.resumed_from = 'warm', '', ck.raw_next
+
+        self._low_water = merge_records(state, *prices)
+        self._state = state
+        return merge_result(df, state, string_columns)
+
+    @staticmethod
+    def _check(df: pd.DataFrame, ck: Optional[Checkpoint]) -> str:
+        """检查点能否用于 df，返回冷启动原因 (可用时为 '')"""
+        if ck is None:
+            return 'no_checkpoint'
+        if len(df) < ck.raw_next:
+            return 'truncated'
+        if prefix_digest(df, ck.raw_next) != ck.digest:
+            return 'revision'
+        return ''
+
+    def strokes(self, highs, lows, rules: Optional[StrokeRules] = None) -> StrokeResult:
+        """对 merge() 的合并K线识别笔，合并K线 [0..C] 未被修改时从检查点的笔过滤状态继续"""
+        if self._state is None:
+            raise RuntimeError("strokes() 之前需要先调用 merge()")
+        if rules is None:
+            rules = StrokeRules()
+        highs = np.asarray(highs, dtype=np.float64).tolist()
+        lows = np.asarray(lows, dtype=np.float64).tolist()
+        raw_fractals = find_raw_fractals(highs, lows)
+
+        ck = self._resume
+        if ck is not None and ck.rules != rules:
+            ck = None
+            self.reason = 'rules'
+        if ck is not None and self._low_water >= len(ck.merge):
+            start = ck.strokes
+        else:
+            start = StrokeState()
+
+        state = advance_strokes(start.copy(), highs, lows, raw_fractals, rules)
+        result = stroke_result(state, highs, lows, raw_fractals, rules)
+        self.checkpoint = self._make_checkpoint(result, start, highs, lows, raw_fractals, rules)
+        return result
+
+    def _make_checkpoint(self, result: StrokeResult, start: StrokeState,
+                         highs: list, lows: list, raw_fractals: list,
+                         rules: StrokeRules) -> Optional[Checkpoint]:
+        """在最后一个笔端点处建立检查点，无法建立时沿用仍然有效的旧检查点"""
+        old = self._resume
+        if old is not None and old.rules != rules:
+            old = None
+        if not result.strokes:
+            return old
+
+        state = self._state
+        c = result.strokes[-1][0]
+        r_c = state.sources[c][1]
+        trend = state.trend_at(r_c)
+        raw_highs, raw_lows = (self._df[col].to_numpy(dtype=np.float64)[:r_c + 1]
+                               for col in _detect_columns(self._df)[2:4])
+        # 初始趋势须在前缀内确定，否则新增K线可能改变它
+        if trend is None or initial_trend(raw_highs, raw_lows, default=0) == 0:
+            return old
+        if old is not None and r_c < old.raw_next:
+            return old
+
+        snapshot = start.copy() if start.next_idx <= c else StrokeState()
+        advance_strokes(snapshot, highs, lows, raw_fractals, rules, stop=c)
+        merge = MergeState(
+            highs=state.highs[:c + 1], lows=state.lows[:c + 1], sources=state.sources[:c + 1],
+            current_trend=trend, merge_count=r_c - c, initial_trend=state.initial_trend,
+            raw_next=r_c + 1,
+        )
+        return Checkpoint(merge=merge, strokes=snapshot, rules=rules,
+                          digest=prefix_digest(self._df, r_c + 1))
+
+
+# ============================================================
+# 存取 (npz，不使用 pickle)
+# ============================================================
+
+def _points(points) -> tuple[np.ndarray, np.ndarray]:
+    """[(index, 'TOP'/'BOTTOM'), ...] -> (index int32, FractalCode int8)"""
+    idx = np.array([p[0] for p in points], dtype=np.int32)
+    code = np.array([FractalCode.TOP if p[1] == 'TOP' else FractalCode.BOTTOM for p in points], dtype=np.int8)
+    return idx, code
+
+
+def _from_points(idx, code) -> list:
+    return [(int(i), 'TOP' if c == FractalCode.TOP else 'BOTTOM') for i, c in zip(idx, code)]
+
+
+def _point(point) -> Optional[list]:
+    return None if point is None else [int(point[0]), point[1]]
+
+
+def save_checkpoint(checkpoint: Checkpoint, path: Union[str, Path]) -> None:
+    """
+    保存检查点 (先写临时文件再替换，中途中断不会留下损坏的检查点)。
+
+    Args:
+        checkpoint: 检查点
+        path: 输出路径 (.npz)
+    """
+    ms, ss = checkpoint.merge, checkpoint.strokes
+    meta = {
+        'version': CHECKPOINT_VERSION,
+        'digest': checkpoint.digest,
+        'rules': asdict(checkpoint.rules),
+        'current_trend': ms.current_trend,
+        'merge_count': ms.merge_count,
+        'initial_trend': ms.initial_trend,
+        'raw_next': ms.raw_next,
+        'pending': _point(ss.pending),
+        'last_stroke_end': _point(ss.last_stroke_end),
+        'next_idx': ss.next_idx,
+    }
+    stroke_idx, stroke_code = _points(ss.strokes)
+    replaced_idx, replaced_code = _points(ss.replaced)
+    history_idx, history_code = _points(ss.candidate_history)
+    arrays = dict(
+        meta=np.array(json.dumps(meta)),
+        merged_high=np.asarray(ms.highs, dtype=np.float64),
+        merged_low=np.asarray(ms.lows, dtype=np.float64),
+        sources=np.asarray(ms.sources, dtype=np.int64).reshape(-1, 4),
+        stroke_idx=stroke_idx, stroke_code=stroke_code,
+        replaced_idx=replaced_idx, replaced_code=replaced_code,
+        history_idx=history_idx, history_code=history_code,
+        history_bar=np.array([h[2] for h in ss.candidate_history], dtype=np.int32),
+        confirm=np.array(list(ss.confirm_info.items()), dtype=np.int32).reshape(-1, 2),
+        replaced_by=np.array(list(ss.replaced_by.items()), dtype=np.int32).reshape(-1, 2),
+    )
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: Union[str, Path]) -> Optional[Checkpoint]:
+    """
+    读取检查点。
+
+    Returns:
+        Checkpoint: 文件不存在时返回 None
+
+    Raises:
+        ValueError: 文件损坏或版本不符
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files}
+        meta = json.loads(str(arrays['meta']))
+    except Exception as e:
+        raise ValueError(f"无法读取检查点 {path}: {e}") from e
+    if meta.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"检查点版本不符: {meta.get('version')} (当前 {CHECKPOINT_VERSION})")
+
+    merge = MergeState(
+        highs=arrays['merged_high'].tolist(),
+        lows=arrays['merged_low'].tolist(),
+        sources=arrays['sources'].tolist(),
+        current_trend=meta['current_trend'],
+        merge_count=meta['merge_count'],
+        initial_trend=meta['initial_trend'],
+        raw_next=meta['raw_next'],
+    )
+    strokes = StrokeState(
+        strokes=_from_points(arrays['stroke_idx'], arrays['stroke_code']),
+        confirm_info={int(k): int(v) for k, v in arrays['confirm']},
+        replaced_by={int(k): int(v) for k, v in arrays['replaced_by']},
+        replaced=_from_points(arrays['replaced_idx'], arrays['replaced_code']),
+        candidate_history=[(idx, f_type, int(bar)) for (idx, f_type), bar in zip(
+            _from_points(arrays['history_idx'], arrays['history_code']), arrays['history_bar'])],
+        pending=None if meta['pending'] is None else tuple(meta['pending']),
+        last_stroke_end=None if meta['last_stroke_end'] is None else tuple(meta['last_stroke_end']),
+        next_idx=meta['next_idx'],
+    )
+    return Checkpoint(merge=merge, strokes=strokes, rules=StrokeRules(**meta['rules']),
+                      digest=meta['digest'])
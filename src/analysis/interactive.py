@@ -11,10 +11,14 @@ interactive.py
 """
 
 import json
+import numpy as np
 import pandas as pd
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Union
 from pathlib import Path
 
+from .indicators import compute_ema
+from .signals import SetupSide, compute_setups
+
 
 # 预定义的指标颜色映射
 INDICATOR_COLORS = {
@@ -28,6 +32,9 @@ INDICATOR_COLORS = {
     'sma20': '#74B9FF',
 }
 
+# 标记密度上限 (add_fractal_markers 的 max_per_bucket) 的默认分桶K线根数
+MARKER_BUCKET_BARS = 20
+
 
 class ChartBuilder:
     """
@@ -42,6 +49,8 @@ class ChartBuilder:
         chart.add_strokes(stroke_list)
         chart.add_fractal_markers(stroke_list)
         chart.build('output/chart.html')
+    
+    add_strokes / add_fractal_markers 也可直接接受笔事件表 (fractals.stroke_events)。
     """
     
     def __init__(self, df: pd.DataFrame):
@@ -77,6 +86,26 @@ class ChartBuilder:
         """将 datetime 转换为 Unix 时间戳 (秒)"""
         return int(pd.Timestamp(dt).timestamp())
     
+    def _timestamps(self) -> list:
+        """所有 K 线的 Unix 时间戳 (秒)，与 _timestamp 逐个转换的结果一致"""
+        return ((self.df['datetime'] - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).tolist()
+    
+    def _marker_tuples(self, markers) -> list:
+        """
+        将笔事件表 (fractals.stroke_events 的输出) 转为标记元组列表。
+        
+        候选分型 (Tc/Bc) 为 3元组 (bar_idx, kind, fractal_idx)，其余为 (bar_idx, kind)。
+        已经是列表时原样返回。
+        """
+        if not isinstance(markers, pd.DataFrame):
+            return markers
+        return [
+            (bar_idx, kind, fractal_idx) if kind.endswith('c') else (bar_idx, kind)
+            for bar_idx, kind, fractal_idx in zip(
+                markers['bar_idx'].tolist(), markers['kind'].tolist(), markers['fractal_idx'].tolist()
+            )
+        ]
+    
     def add_candlestick(self) -> 'ChartBuilder':
         """
         添加 K 线蜡烛图层
@@ -84,14 +113,11 @@ class ChartBuilder:
         Returns:
             self: 支持链式调用
         """
-        for _, row in self.df.iterrows():
-            self.candlestick_data.append({
-                'time': self._timestamp(row['datetime']),
-                'open': float(row['open']),
-                'high': float(row['high']),
-                'low': float(row['low']),
-                'close': float(row['close']),
-            })
+        columns = [self.df[col].to_numpy(dtype=np.float64).tolist() for col in ('open', 'high', 'low', 'close')]
+        self.candlestick_data.extend(
+            {'time': t, 'open': o, 'high': h, 'low': l, 'close': c}
+            for t, o, h, l, c in zip(self._timestamps(), *columns)
+        )
         return self
     
     def add_indicator(
@@ -116,14 +142,12 @@ class ChartBuilder:
         if color is None:
             color = INDICATOR_COLORS.get(name.lower(), '#FFFFFF')
         
-        data = []
-        for i, (_, row) in enumerate(self.df.iterrows()):
-            value = series.iloc[i]
-            if pd.notna(value):
-                data.append({
-                    'time': self._timestamp(row['datetime']),
-                    'value': float(value)
-                })
+        values = pd.to_numeric(pd.Series(np.asarray(series)), errors='coerce').to_numpy(dtype=np.float64)
+        data = [
+            {'time': t, 'value': v}
+            for t, v, ok in zip(self._timestamps(), values.tolist(), pd.notna(values).tolist())
+            if ok
+        ]
         
         self.indicators.append({
             'name': name,
@@ -133,17 +157,29 @@ class ChartBuilder:
         })
         return self
     
-    def add_strokes(self, strokes: List[Tuple[int, str]]) -> 'ChartBuilder':
+    def add_strokes(self, strokes: Union[List[Tuple[int, str]], pd.DataFrame]) -> 'ChartBuilder':
         """
         添加笔连线
         
         Args:
-            strokes: 分型标记列表 [(index, 'T'|'B'), ...]
+            strokes: 分型标记列表 [(index, 'T'|'B'), ...]，或笔事件表 (stroke_events)
                      注意：只接受纯 'T' 或 'B'，忽略 'Tx', 'Bx' 等
         
         Returns:
             self: 支持链式调用
         """
+        if isinstance(strokes, pd.DataFrame):
+            # 事件表自带时间和价格，直接取已确认端点
+            events = strokes[strokes['kind'].isin(('T', 'B'))]
+            events = events[(events['bar_idx'] >= 0) & (events['bar_idx'] < len(self.df))]
+            events = events.sort_values('bar_idx', kind='stable')
+            times = (pd.to_datetime(events['datetime']) - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+            self.stroke_lines = [
+                {'time': int(t), 'value': float(p)}
+                for t, p in zip(times.tolist(), events['price'].tolist())
+            ]
+            return self
+        
         if not strokes:
             return self
         
@@ -178,248 +214,34 @@ class ChartBuilder:
         self.stroke_lines = stroke_data
         return self
     
-    def add_fractal_markers(self, fractals: List[Tuple[int, str]]) -> 'ChartBuilder':
+    def add_fractal_markers(
+        self,
+        fractals: Union[List[Tuple[int, str]], pd.DataFrame],
+        max_per_bucket: Optional[int] = None,
+        bucket_bars: int = MARKER_BUCKET_BARS
+    ) -> 'ChartBuilder':
         """
-        添加顶底分型标记
+        添加 H/L 信号标记 (由候选分型 Tc/Bc 计算，见 signals.compute_setups)
         
         Args:
-            fractals: 分型标记列表 [(index, 'T'|'B'|'Tx'|'Bx'|'Tc'|'Bc'), ...]
-                      - T/B: 已确认分型
-                      - Tx/Bx: 被替换的分型
-                      - Tc/Bc: 候选分型 (尚未确认，低滞后)
+            fractals: 分型标记列表 [(index, 'T'|'B'|'Tx'|'Bx'|'Tc'|'Bc'), ...]，或笔事件表 (stroke_events)
+                      - Tc/Bc: 候选分型，产生 L/H 信号
+                      - T/B/Tx/Bx: 不显示 (笔连线已标出端点)
+            max_per_bucket: 可选，标记密度上限: 每 bucket_bars 根K线最多保留的标记数 (按时间先后保留)，
+                            None 表示不限
+            bucket_bars: 密度分桶的K线根数
         
         Returns:
             self: 支持链式调用
         """
-        # 1. 预处理所有标记，转换为统一格式 (index, type) 并排序
-        # 注意: 这里 index 是 `display_idx` (显示位置)
-        processed_markers = []
-        for marker in fractals:
-            if len(marker) == 3:
-                display_idx, f_type, _ = marker
-            else:
-                display_idx, f_type = marker
-            
-            if 0 <= display_idx < len(self.df):
-                processed_markers.append((display_idx, f_type))
-        
-            if 0 <= display_idx < len(self.df):
-                processed_markers.append((display_idx, f_type))
-        
-        # 去重: 确保每个位置每种类型的标记只出现一次
-        processed_markers = list(set(processed_markers))
-        
-        # 按索引排序，确保计数逻辑正确 (从左到右)
-        processed_markers.sort(key=lambda x: x[0])
-        
-        # 2. H/L 计数逻辑
-        h_count = 0  # H1, H2, H3... (Buy setups in Leg Down)
-        l_count = 0  # L1, L2, L3... (Sell setups in Leg Up)
-        
-        last_h_idx = -999
-        last_l_idx = -999
-        
-        processed_markers.sort(key=lambda x: x[0])
-        
-        for display_idx, f_type in processed_markers:
-            row = self.df.iloc[display_idx]
-            base_type = f_type.replace('x', '').replace('c', '')
-            is_candidate = 'c' in f_type
-            is_cancelled = 'x' in f_type
-            is_confirmed = not is_candidate and not is_cancelled # T/B
-            
-            # --- 计数重置逻辑 (互斥重置) ---
-            # 我们不再依赖 T/B 分型，而是依赖信号的触发来重置对手方的计数
-            # 只有当信号真正触发时，才重置对手方
-            
-            # --- 候选标记逻辑 ---
-            # 只处理候选分型 (用户请求：只显示 Hx/Lx)
-            if is_candidate:
-                # 信号确认逻辑：
-                # Hx (Bc): (Next High > Sig High AND Next Close > Sig Close) OR (Signal Bar is Strong)
-                # Lx (Tc): (Next Low < Sig Low AND Next Close < Sig Close) OR (Signal Bar is Strong)
-                
-                # display_idx 是信号K线 (Signal Bar) 的索引
-                next_bar_idx = display_idx + 1
-                has_next_bar = next_bar_idx < len(self.df)
-                
-                # 判断信号线本身是否强势 (Strong Signal Bar)
-                # 强势定义: 收盘价在极值附近 (顶分型收在低位，底分型收在高位)
-                # 并且实体有一定长度 (避免十字星)
-                s_high = float(row['high'])
-                s_low = float(row['low'])
-                s_close = float(row['close'])
-                s_open = float(row['open'])
-                s_range = s_high - s_low
-                
-                is_strong = False
-                if s_range > 0:
-                    if base_type == 'T':
-                        # 顶分型: 收盘在底部 1/3，且是阴线(或实体很小的假阳)
-                        pos = (s_close - s_low) / s_range
-                        if pos < 0.33:
-                            is_strong = True
-                    elif base_type == 'B':
-                        # 底分型: 收盘在顶部 1/3
-                        pos = (s_close - s_low) / s_range
-                        if pos > 0.66:
-                            is_strong = True
-
-                triggered = False
-                
-                if base_type == 'T':
-                    # --- L Setup (Sell) ---
-                    # 1. Strong Signal Exception
-                    if is_strong:
-                        triggered = True
-                    # 2. Next Bar Confirmation
-                    elif has_next_bar:
-                        next_bar = self.df.iloc[next_bar_idx]
-                        next_low = float(next_bar['low'])
-                        next_close = float(next_bar['close'])
-                        # 严格条件：Next Low < Signal Low (突破) AND Next Close < Signal Close (收盘确认)
-                        if next_low < s_low and next_close < s_close:
-                            triggered = True
-                            
-                    if triggered:
-                        # 间距过滤: 防止相邻的K线同时标记 L2, L3
-                        if display_idx - last_l_idx < 2:
-                            continue
-                            
-                        l_count += 1
-                        last_l_idx = display_idx
-                        
-                        # 互斥重置: 触发卖出信号，意味着下跌波段开始，重置买入计数
-                        h_count = 0
-                        
-                        label = f'L{l_count}'
-                        color = '#e040fb' # 亮紫色
-                        pos = 'aboveBar'
-                        self.markers.append({
-                            'time': self._timestamp(row['datetime']),
-                            'position': pos,
-                            'color': color,
-                            'shape': 'circle',
-                            'text': label
-                        })
-                    
-                elif base_type == 'B':
-                    # --- H Setup (Buy) ---
-                    # 1. Strong Signal Exception
-                    if is_strong:
-                        triggered = True
-                    # 2. Next Bar Confirmation
-                    elif has_next_bar:
-                        next_bar = self.df.iloc[next_bar_idx]
-                        next_high = float(next_bar['high'])
-                        next_close = float(next_bar['close'])
-                        # 严格条件：Next High > Signal High (突破) AND Next Close > Signal Close (收盘确认)
-                        if next_high > s_high and next_close > s_close:
-                            triggered = True
-
-                    if triggered:
-                        # 间距过滤
-                        if display_idx - last_h_idx < 2:
-                            continue
-
-                        h_count += 1
-                        last_h_idx = display_idx
-                        
-                        # 互斥重置: 触发买入信号，意味着上涨波段开始，重置卖出计数
-                        l_count = 0
-                        
-                        label = f'H{h_count}'
-                        color = '#ff4081' # 粉红色
-                        pos = 'belowBar'
-                        self.markers.append({
-                            'time': self._timestamp(row['datetime']),
-                            'position': pos,
-                            'color': color,
-                            'shape': 'circle',
-                            'text': label
-                        })
-                continue
-            
-                continue
-            
-            # 用户请求：隐藏所有其他分型 (T/B/Tx/Bx)
-            if not is_candidate:
-                continue
-
-            # 分析右肩 (Signal Bar) 强度
-            # 分型由 左(idx-1) 中(idx) 右(idx+1) 构成
-            # 这里的 display_idx 是分型顶底所在的中间K线
-            # 我们考察右边那根K线(display_idx+1)的收盘力度
-            right_bar_idx = display_idx + 1
-            is_strong_signal = False
-            
-            if 0 <= right_bar_idx < len(self.df):
-                rb = self.df.iloc[right_bar_idx]
-                rb_range = rb['high'] - rb['low']
-                if rb_range > 0:
-                    if base_type == 'T':
-                        # 强顶分型: 右肩收在低位 (Bottom 1/3)
-                        close_pos = (rb['close'] - rb['low']) / rb_range
-                        if close_pos < 0.33:
-                            is_strong_signal = True
-                    elif base_type == 'B':
-                        # 强底分型: 右肩收在高位 (Top 1/3)
-                        close_pos = (rb['close'] - rb['low']) / rb_range
-                        if close_pos > 0.66:
-                            is_strong_signal = True
-
-            if base_type == 'T':
-                price = float(row['high'])
-                
-                # 颜色逻辑: 
-                # - 被破坏(Tx): 灰色 #9e9e9e
-                # - 强信号(Strong T): 亮红 #ff0000 (纯红)
-                # - 普通(T): 暗红 #b71c1c (深红)
-                if is_cancelled:
-                    color = '#9e9e9e'
-                    text_prefix = 'Tx'
-                elif is_strong_signal:
-                    color = '#ff0000' # 强信号高亮
-                    text_prefix = 'T+'
-                else:
-                    color = '#b71c1c' # 普通信号变暗
-                    text_prefix = 'T'
-                    
-                # 简化显示: 只显示 T/B/Tx 标识，不显示价格文本
-                # 原因: Lightweight Charts 不支持多行文本，显示价格会导致标记过宽挤在一起
-                # 价格信息已由箭头位置和左上角 OHLC 面板提供
-                self.markers.append({
-                    'time': self._timestamp(row['datetime']),
-                    'position': 'aboveBar',
-                    'color': color,
-                    'shape': 'arrowDown',
-                    'text': f'{text_prefix}'
-                })
-            elif base_type == 'B':
-                price = float(row['low'])
-                
-                # 颜色逻辑:
-                # - 被破坏(Bx): 灰色 #9e9e9e
-                # - 强信号(Strong B): 亮绿 #00e676 (荧光绿)
-                # - 普通(B): 暗绿 #1b5e20 (深绿)
-                if is_cancelled:
-                    color = '#9e9e9e'
-                    text_prefix = 'Bx'
-                elif is_strong_signal:
-                    color = '#00e676' # 强信号高亮
-                    text_prefix = 'B+'
-                else:
-                    color = '#1b5e20' # 普通信号变暗
-                    text_prefix = 'B'
-                    
-                self.markers.append({
-                    'time': self._timestamp(row['datetime']),
-                    'position': 'belowBar',
-                    'color': color,
-                    'shape': 'arrowUp',
-                    'text': f'{text_prefix}'
-                })
-        
+        setups = compute_setups(self.df, fractals)
+        bar_idx = setups.bar_idx
+        keep = marker_density_mask(bar_idx, max_per_bucket, bucket_bars)
+        
+        times = self._timestamps()
+        self.markers.extend(setup_markers(
+            [times[idx] for idx in bar_idx[keep].tolist()], setups.side[keep], setups.labels[keep]
+        ))
         return self
     
     def build(self, save_path: str, title: Optional[str] = None) -> None:
@@ -430,6 +252,27 @@ class ChartBuilder:
             save_path: HTML 文件保存路径
             title: 图表标题
         """
+        html_content = self.to_html(title)
+        
+        # 保存文件
+        Path(save_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(save_path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+        
+        print(f"交互式图表已保存至: {save_path}")
+    
+    def to_html(self, title: Optional[str] = None, stream_url: Optional[str] = None) -> str:
+        """
+        组装 HTML 页面
+        
+        Args:
+            title: 图表标题
+            stream_url: 可选，SSE 推送地址；提供时页面订阅该地址，
+                        用 series.update() 追加/更新K线并增量更新标记 (见 analysis/live.py)
+        
+        Returns:
+            str: HTML 内容
+        """
         if title is None:
             symbol = self.df['symbol'].iloc[0] if 'symbol' in self.df.columns else ''
             title = f'Fractal Analysis - {symbol}'
@@ -451,8 +294,9 @@ class ChartBuilder:
         indicators_json = json.dumps(self.indicators)
         strokes_json = json.dumps(self.stroke_lines)
         markers_json = json.dumps(self.markers)
+        live_script = _LIVE_SCRIPT.replace('__STREAM_URL__', json.dumps(stream_url)) if stream_url else ''
         
-        html_content = f'''<!DOCTYPE html>
+        return f'''<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
@@ -727,8 +571,52 @@ class ChartBuilder:
         candlestickSeries.setData(candlestickData);
 
         // 设置标记 (分型点)
+        // 标记可能有数万个，全部交给 setMarkers 会让拖动卡顿:
+        // 按时间排序后只设置可见范围 (两侧各留一个可见宽度的边距) 内的标记，
+        // 可见范围变化时每帧最多处理一次，仍在已设置的范围内时不重新设置
+        let markerList = [];
+        let markerWindow = null;    // 已设置标记的时间范围 [from, to]
+        const lowerBound = (arr, t) => {{
+            let lo = 0, hi = arr.length;
+            while (lo < hi) {{
+                const mid = (lo + hi) >> 1;
+                if (arr[mid].time < t) lo = mid + 1; else hi = mid;
+            }}
+            return lo;
+        }};
+        const barTime = (logical) => {{
+            const i = Math.min(Math.max(Math.round(logical), 0), candlestickData.length - 1);
+            return candlestickData[i].time;
+        }};
+        const renderMarkers = (force) => {{
+            // 尚未布局时等待第一次可见范围变化
+            const range = chart.timeScale().getVisibleLogicalRange();
+            if (!range || candlestickData.length === 0) {{
+                markerWindow = null;
+                return;
+            }}
+            const from = barTime(range.from), to = barTime(range.to);
+            if (!force && markerWindow && from >= markerWindow[0] && to <= markerWindow[1]) return;
+            const margin = Math.max(range.to - range.from, 50);
+            markerWindow = [barTime(range.from - margin), barTime(range.to + margin)];
+            const lo = lowerBound(markerList, markerWindow[0]);
+            const hi = lowerBound(markerList, markerWindow[1] + 1);
+            candlestickSeries.setMarkers(markerList.slice(lo, hi));
+        }};
+        const setMarkerData = (list) => {{
+            markerList = list.slice().sort((a, b) => a.time - b.time);
+            renderMarkers(true);
+        }};
+        let markerFrame = null;
+        chart.timeScale().subscribeVisibleLogicalRangeChange(() => {{
+            if (markerFrame !== null) return;
+            markerFrame = requestAnimationFrame(() => {{
+                markerFrame = null;
+                renderMarkers(false);
+            }});
+        }});
         if (markersData.length > 0) {{
-            candlestickSeries.setMarkers(markersData);
+            setMarkerData(markersData);
         }}
 
         // 笔连线 (已禁用，如需启用请取消注释)
@@ -745,6 +633,7 @@ class ChartBuilder:
 
         // 技术指标线
         const legendContainer = document.getElementById('legend');
+        const indicatorSeries = [];
         indicators.forEach((indicator, index) => {{
             const lineSeries = chart.addLineSeries({{
                 color: indicator.color,
@@ -754,6 +643,7 @@ class ChartBuilder:
                 priceLineVisible: false,
             }});
             lineSeries.setData(indicator.data);
+            indicatorSeries.push(lineSeries);
 
             // 添加图例
             const legendItem = document.createElement('div');
@@ -841,17 +731,165 @@ class ChartBuilder:
             const to = candlestickData[candlestickData.length - 1].time;
             chart.timeScale().setVisibleRange({{ from, to }});
         }}
+{live_script}
     </script>
 </body>
 </html>
 '''
-        
-        # 保存文件
-        Path(save_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(save_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        print(f"交互式图表已保存至: {save_path}")
+
+
+# 实时页面的推送处理 (to_html(stream_url=...) 时附加在页面脚本末尾)
+# 消息类型 (见 analysis/live.py):
+#   snapshot  全量数据 (连接建立时、历史K线被修改时)
+#   bars      末尾K线的更新/追加，逐根 series.update()；replace 时弹出最后一根后 setData
+#   markers   H/L 标记的增删 (以 time|text 为键)
+#   strokes   笔端点事件变更集 (analysis/delta.py)，更新标题栏的最新状态
+_LIVE_SCRIPT = """
+        // ---------------- 实时推送 ----------------
+        const markerKey = (m) => m.time + '|' + m.text;
+        const markerMap = new Map(markersData.map(m => [markerKey(m), m]));
+        const applyMarkers = () => setMarkerData([...markerMap.values()]);
+        // 末尾相同时间的点替换，否则追加 (与 series.update 的语义一致)
+        const upsert = (arr, point) => {
+            if (arr.length && arr[arr.length - 1].time === point.time) arr[arr.length - 1] = point;
+            else arr.push(point);
+        };
+        const liveStatus = document.createElement('div');
+        liveStatus.className = 'legend-item';
+        liveStatus.textContent = '● 连接中';
+        legendContainer.appendChild(liveStatus);
+
+        const source = new EventSource(__STREAM_URL__);
+        source.onopen = () => { liveStatus.style.color = '#26a69a'; liveStatus.textContent = '● 实时'; };
+        source.onerror = () => { liveStatus.style.color = '#ef5350'; liveStatus.textContent = '● 重连中'; };
+
+        source.addEventListener('snapshot', (e) => {
+            const d = JSON.parse(e.data);
+            candlestickData.length = 0;
+            candlestickData.push(...d.bars);
+            candlestickSeries.setData(candlestickData);
+            d.indicators.forEach((data, i) => {
+                if (!indicatorSeries[i]) return;
+                indicators[i].data = data;
+                indicatorSeries[i].setData(data);
+            });
+            markerMap.clear();
+            d.markers.forEach(m => markerMap.set(markerKey(m), m));
+            applyMarkers();
+        });
+
+        // replace: 最后一个点的时间变化 (合并K线吸收了新K线)，弹出旧点后 setData
+        source.addEventListener('bars', (e) => {
+            const d = JSON.parse(e.data);
+            if (d.replace) {
+                candlestickData.pop();
+                candlestickData.push(...d.bars);
+                candlestickSeries.setData(candlestickData);
+            } else {
+                d.bars.forEach(bar => {
+                    upsert(candlestickData, bar);
+                    candlestickSeries.update(bar);
+                });
+            }
+            d.indicators.forEach((points, i) => {
+                if (!indicatorSeries[i]) return;
+                const data = indicators[i].data;
+                if (d.replace) {
+                    data.pop();
+                    data.push(...points);
+                    indicatorSeries[i].setData(data);
+                } else {
+                    points.forEach(p => {
+                        upsert(data, p);
+                        indicatorSeries[i].update(p);
+                    });
+                }
+            });
+        });
+
+        source.addEventListener('markers', (e) => {
+            const d = JSON.parse(e.data);
+            d.removed.forEach(key => markerMap.delete(key));
+            d.added.forEach(m => markerMap.set(markerKey(m), m));
+            applyMarkers();
+        });
+
+        source.addEventListener('strokes', (e) => {
+            const d = JSON.parse(e.data);
+            if (d.latest) liveStatus.title = '最新: ' + d.latest;
+            liveStatus.textContent = '● 实时' + (d.latest ? '  ' + d.latest : '');
+        });
+"""
+
+
+def marker_density_mask(bar_idx: np.ndarray, max_per_bucket: Optional[int] = None,
+                        bucket_bars: int = MARKER_BUCKET_BARS) -> np.ndarray:
+    """
+    标记密度上限: 每 bucket_bars 根K线最多保留 max_per_bucket 个标记 (按时间先后保留)。
+    
+    Args:
+        bar_idx: 标记所在的K线位置 (升序)
+        max_per_bucket: 每桶最多保留的标记数，None 表示不限
+        bucket_bars: 分桶的K线根数 (桶边界为 bucket_bars 的整数倍，与起点无关)
+    
+    Returns:
+        np.ndarray: 保留的标记 (bool 数组)
+    """
+    bar_idx = np.asarray(bar_idx)
+    if max_per_bucket is None or not len(bar_idx):
+        return np.ones(len(bar_idx), dtype=bool)
+    # bar_idx 升序，桶内序号 = 位置 - 所在桶的第一个位置
+    bucket = bar_idx // bucket_bars
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    rank = np.arange(len(bucket)) - np.repeat(starts, np.diff(np.r_[starts, len(bucket)]))
+    return rank < max_per_bucket
+
+
+def setup_markers(times, sides, labels) -> list:
+    """
+    H/L 信号的标记数据 (add_fractal_markers 与实时图表共用)。
+
+    Args:
+        times: 信号K线的 Unix 时间戳 (秒)
+        sides: 信号方向 (SetupSide)
+        labels: 标签，如 'H1'、'L2'
+    """
+    markers = []
+    for t, side, label in zip(times, np.asarray(sides).tolist(), np.asarray(labels).tolist()):
+        is_buy = side == SetupSide.BUY
+        markers.append({
+            'time': t,
+            'position': 'belowBar' if is_buy else 'aboveBar',
+            'color': '#ff4081' if is_buy else '#e040fb',  # H 粉红色 / L 亮紫色
+            'shape': 'circle',
+            'text': label
+        })
+    return markers
+
+
+def symbol_chart(df: pd.DataFrame, events, ema_period: int = 20,
+                 max_per_bucket: Optional[int] = None,
+                 bucket_bars: int = MARKER_BUCKET_BARS) -> ChartBuilder:
+    """
+    品种图表的标准组合: K 线 + EMA + 笔 + H/L 信号标记
+    (run_pipeline 的交互式图表和按需图表服务共用，实时图表的页面内容与之一致)。
+    
+    Args:
+        df: 合并后的 K 线 (datetime, open, high, low, close)
+        events: 笔事件表 (fractals.stroke_events)，或分型标记列表
+        ema_period: EMA 周期
+        max_per_bucket: 可选，标记密度上限 (见 add_fractal_markers)，None 表示不限
+        bucket_bars: 密度分桶的K线根数
+    
+    Returns:
+        ChartBuilder: 已添加各图层，调用 build() / to_html() 输出
+    """
+    chart = ChartBuilder(df)
+    chart.add_candlestick()
+    chart.add_indicator(f'EMA{ema_period}', compute_ema(chart.df, ema_period))
+    chart.add_strokes(events)
+    chart.add_fractal_markers(events, max_per_bucket, bucket_bars)
+    return chart
 
 
 # ============================================================
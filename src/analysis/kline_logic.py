@@ -1,5 +1,9 @@
 from enum import Enum
 
+import numpy as np
+
+from .codes import KlineCode
+
 class BarRelationship(Enum):
     TREND_UP = "TREND_UP"
     TREND_DOWN = "TREND_DOWN"
@@ -20,3 +24,29 @@ def classify_k_line_combination(h1, l1, h2, l2):
     else:
         # 此时必然满足 h2 >= h1 且 l2 <= l1 (或者其中一个相等)
         return BarRelationship.OUTSIDE
+
+
+def classify_k_line_array(highs, lows) -> np.ndarray:
+    """
+    向量化版本的 classify_k_line_combination，对整段序列一次性分类。
+
+    Args:
+        highs: 最高价序列
+        lows: 最低价序列
+
+    Returns:
+        np.ndarray: KlineCode 编码 (int8)，首根为 INITIAL
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    codes = np.full(len(highs), KlineCode.INITIAL, dtype=np.int8)
+    if len(highs) < 2:
+        return codes
+    
+    h1, l1, h2, l2 = highs[:-1], lows[:-1], highs[1:], lows[1:]
+    codes[1:] = np.select(
+        [(h2 > h1) & (l2 > l1), (h2 < h1) & (l2 < l1), (h2 <= h1) & (l2 >= l1)],
+        [KlineCode.TREND_UP, KlineCode.TREND_DOWN, KlineCode.INSIDE],
+        KlineCode.OUTSIDE,
+    )
+    return codes
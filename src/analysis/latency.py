@@ -0,0 +1,136 @@
+"""
+analysis/latency.py
+笔端点确认滞后统计模块。
+
+基于 StrokeConfirmations 列式数组，对整个品种池的确认滞后分布做向量化汇总，
+无需再从 strokes CSV 的字符串标记中反推信号延迟。
+
+用法:
+    from src.analysis.latency import load_confirmations, confirmation_lag_report
+
+    confirmations = load_confirmations(Path("data/processed").glob("*/*_merged.csv"))
+    report = confirmation_lag_report(confirmations)
+"""
+
+from pathlib import Path
+from typing import Iterable, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .fractals import StrokeConfirmations, compute_strokes, _detect_columns
+
+
+def load_confirmations(paths: Iterable[Union[str, Path]]) -> dict[str, StrokeConfirmations]:
+    """
+    从合并后的 K 线 CSV 批量计算笔端点确认信息 (不写文件、不绘图)。
+
+    Args:
+        paths: *_merged.csv 文件路径列表
+
+    Returns:
+        dict: {symbol: StrokeConfirmations}，symbol 取自文件名 (去掉 _merged 后缀)
+    """
+    result = {}
+    for path in paths:
+        path = Path(path)
+        df = pd.read_csv(path, encoding='utf-8')
+        _, _, col_high, col_low, _ = _detect_columns(df)
+        symbol = path.stem.removesuffix('_merged')
+        result[symbol] = compute_strokes(df[col_high].to_numpy(), df[col_low].to_numpy()).confirmations
+    return result
+
+
+def _stack(confirmations: Mapping[str, StrokeConfirmations]) -> pd.DataFrame:
+    """将多个品种的确认数组首尾拼接为一张长表 (symbol 为分类列)"""
+    symbols = list(confirmations)
+    items = [confirmations[s] for s in symbols]
+    sizes = np.array([len(c) for c in items], dtype=np.int64)
+    codes = np.repeat(np.arange(len(symbols)), sizes)
+
+    def concat(values, dtype):
+        return np.concatenate(values).astype(dtype) if values else np.empty(0, dtype=dtype)
+
+    return pd.DataFrame({
+        'symbol': pd.Categorical.from_codes(codes, categories=symbols),
+        'fractal_type': concat([c.fractal_type for c in items], np.int8),
+        'lag': concat([c.lag for c in items], np.int32),
+        'replaced': concat([c.replaced_by_idx >= 0 for c in items], bool),
+    })
+
+
+def confirmation_lag_report(
+    confirmations: Mapping[str, StrokeConfirmations],
+    quantiles: tuple[float, ...] = (0.5, 0.9),
+) -> pd.DataFrame:
+    """
+    统计每个品种的确认滞后分布，并附加全品种汇总行 'ALL'。
+
+    Args:
+        confirmations: {symbol: StrokeConfirmations}
+        quantiles: 需要输出的分位数
+
+    Returns:
+        pd.DataFrame: 以 symbol 为索引，列包括 count, mean, min, p50, p90, max,
+                      top_mean, bottom_mean, replaced_ratio
+    """
+    long = _stack(confirmations)
+
+    def summarize(groups) -> pd.DataFrame:
+        lag = groups['lag']
+        table = pd.DataFrame({
+            'count': lag.count(),
+            'mean': lag.mean(),
+            'min': lag.min(),
+        })
+        for q in quantiles:
+            table[f'p{int(round(q * 100))}'] = lag.quantile(q)
+        table['max'] = lag.max()
+        table['replaced_ratio'] = groups['replaced'].mean()
+        return table
+
+    per_symbol = summarize(long.groupby('symbol', observed=False))
+    pooled = summarize(long.assign(symbol='ALL').groupby('symbol'))
+
+    by_type = long.pivot_table(
+        index='symbol', columns='fractal_type', values='lag',
+        aggfunc='mean', observed=False,
+    )
+    per_symbol['top_mean'] = by_type.get(1)
+    per_symbol['bottom_mean'] = by_type.get(-1)
+    pooled['top_mean'] = long.loc[long['fractal_type'] == 1, 'lag'].mean()
+    pooled['bottom_mean'] = long.loc[long['fractal_type'] == -1, 'lag'].mean()
+
+    report = pd.concat([per_symbol, pooled])
+    report.index.name = 'symbol'
+    return report
+
+
+def lag_distribution(
+    confirmations: Mapping[str, StrokeConfirmations],
+    max_lag: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    确认滞后的频数分布 (滞后值 x 品种)。
+
+    Args:
+        confirmations: {symbol: StrokeConfirmations}
+        max_lag: 超过该值的滞后计入最后一行，None 表示取实际最大值
+
+    Returns:
+        pd.DataFrame: 行为滞后值 (K线根数)，列为品种 + 'ALL'，值为端点数量
+    """
+    long = _stack(confirmations)
+    symbols = list(long['symbol'].cat.categories)
+    lag = long['lag'].to_numpy()
+    if max_lag is None:
+        max_lag = int(lag.max()) if len(lag) else 0
+    lag = np.clip(lag, 0, max_lag)
+
+    width = max_lag + 1
+    flat = long['symbol'].cat.codes.to_numpy().astype(np.int64) * width + lag
+    counts = np.bincount(flat, minlength=len(symbols) * width).reshape(len(symbols), width)
+
+    table = pd.DataFrame(counts.T, index=pd.RangeIndex(width, name='lag'), columns=symbols)
+    table['ALL'] = counts.sum(axis=0)
+    return table
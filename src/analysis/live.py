@@ -0,0 +1,461 @@
+"""
+analysis/live.py
+实时图表: 本地 HTTP 服务 (标准库 http.server) 提供交互式图表页面，并通过 SSE (Server-Sent Events)
+推送新K线和笔/标记变化，页面用 series.update() 和增量标记更新，不必整页重新生成。
+
+新K线到达时 (LiveFeed.update / append)，合并和笔识别由 IncrementalEngine 从检查点续算，
+与上一次推送的状态对比后只发送变化的部分:
+
+    bars      末尾合并K线的更新、替换或追加 (含 EMA)；更早的合并K线被修改时改发 snapshot
+    markers   H/L 标记的增删
+    strokes   笔端点事件变更集 (analysis/delta.py) 及最新端点/候选的说明
+
+用法:
+    from src.analysis.live import LiveFeed, LiveChartServer
+
+    feed = LiveFeed(data.df, title="国债期货 [TL.CFE]")
+    server = LiveChartServer(feed, port=8765)
+    server.start()                  # 后台线程，浏览器打开 server.url
+    feed.append(new_bars_df)        # 新K线到达时调用，页面实时更新
+"""
+
+import bisect
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .delta import events_delta
+from .fractals import stroke_events, _detect_columns
+from .incremental import IncrementalEngine
+from .interactive import MARKER_BUCKET_BARS, ChartBuilder, marker_density_mask, setup_markers
+from .signals import (
+    SetupSide, SetupSignals, breakout_mask, count_setups, setup_candidates, setup_state, strong_signal_mask,
+)
+from .streaming import EMAState
+
+
+EMA_PERIOD = 20
+
+# 每个订阅者最多积压的消息数，超过后丢弃积压并改发 snapshot
+SUBSCRIBER_BACKLOG = 256
+# SSE 保活注释的间隔 (秒)
+KEEPALIVE_S = 15.0
+
+
+class LiveFeed:
+    """
+    一个品种的实时数据源: 维护原始K线和上一次推送给页面的状态，生成增量消息并广播给订阅者。
+
+    每次更新只重建变化的尾部: 合并K线从检查点续算 (IncrementalEngine.low_water 之前的合并K线不变)，
+    与上一次的合并K线对比得到第一根变化的K线 k，K线数据点和 EMA (EMAState 从 k-1 的值续算)
+    只重建 [k, n)；H/L 标记从受影响的第一个候选分型起续算计数递推。
+    """
+
+    def __init__(self, df: pd.DataFrame, title: str = '', ema_period: int = EMA_PERIOD,
+                 max_per_bucket: Optional[int] = None, bucket_bars: int = MARKER_BUCKET_BARS):
+        """
+        Args:
+            df: 原始K线 (标准列名或旧版中文列名)
+            title: 页面标题
+            ema_period: 叠加的 EMA 周期
+            max_per_bucket: 可选，H/L 标记密度上限 (见 interactive.symbol_chart)，None 表示不限
+            bucket_bars: 密度分桶的K线根数
+        """
+        self.title = title
+        self.ema_period = ema_period
+        self.max_per_bucket = max_per_bucket
+        self.bucket_bars = bucket_bars
+        self._lock = threading.Lock()
+        self._subscribers: list[queue.Queue] = []
+        self._checkpoint = None
+        self._agree = 0             # 当前合并K线与检查点合并K线相同的前缀长度
+        self._df = df.reset_index(drop=True)
+        self._reset()
+        self._compute(self._df)
+
+    def _reset(self) -> None:
+        """清空页面状态"""
+        self._frame = pd.DataFrame(columns=['datetime', 'open', 'high', 'low', 'close'])
+        self._bars: list[dict] = []             # K线数据点
+        self._ema_values: list[float] = []      # 每根合并K线的 EMA
+        self._ema: list[dict] = []              # EMA 数据点
+        self._candidates = (np.empty(0, dtype=np.int64), np.empty(0, dtype=bool))
+        self._setups = _EMPTY_SETUPS
+        self._markers: list[dict] = []          # 标记数据 (按K线位置排序)
+        self._marker_idx: list[int] = []        # 每个标记所在的合并K线位置
+        self._events = None
+
+    # ---------------- 计算 ----------------
+
+    def _compute(self, df: pd.DataFrame) -> list[dict]:
+        """合并 + 笔识别 (从检查点续算)，从第一根变化的合并K线起更新页面状态，返回增量消息"""
+        engine = IncrementalEngine(self._checkpoint)
+        merge = engine.merge(df)
+        old_n = len(self._bars)
+        if merge.df.empty:
+            self._checkpoint, self._agree = None, 0
+            self._reset()
+            return [self._snapshot()] if old_n else []
+
+        frame = _chart_frame(merge.df)
+        highs = frame['high'].to_numpy(dtype=np.float64)
+        lows = frame['low'].to_numpy(dtype=np.float64)
+        result = engine.strokes(highs, lows)
+        events = stroke_events(result, frame['datetime'], highs, lows, merge.provenance)
+
+        # 检查点之前的合并K线与上一次相同，只需从 min(low_water, 上次与检查点一致的长度) 开始对比
+        same = min(engine.low_water, self._agree)
+        if engine.checkpoint is not None and engine.checkpoint is not self._checkpoint:
+            # 新检查点取自本次的合并K线
+            self._agree = len(engine.checkpoint.merge)
+        else:
+            self._agree = engine.low_water
+        self._checkpoint = engine.checkpoint
+        k = _first_changed_bar(self._frame, frame, same)
+        replace = k == old_n - 1 and k < len(frame) and frame['datetime'].iat[k] != self._frame['datetime'].iat[k]
+
+        self._rebuild_bars(frame, k)
+        marker_start, removed, added = self._rebuild_markers(frame, events, k)
+        old_events, self._frame, self._events = self._events, frame, events
+
+        if k < old_n - 1 or len(frame) < old_n:
+            # 更早的K线被修改 (合并回溯) 或删除，页面整体重设
+            return [self._snapshot()]
+        messages = []
+        if k < len(frame):
+            messages.append({'type': 'bars', 'replace': replace, 'bars': self._bars[k:],
+                             'indicators': [self._ema[k:]]})
+        if added or removed:
+            messages.append({'type': 'markers', 'added': added, 'removed': removed})
+        # 大多数新K线不改变笔端点，先整表比较，避免每次都计算变更集
+        if old_events is None or not events.equals(old_events):
+            delta = events_delta(old_events, events)
+            if len(delta):
+                messages.append({'type': 'strokes', 'changes': _delta_records(delta),
+                                 'latest': _latest_status(events)})
+        return messages
+
+    def _rebuild_bars(self, frame: pd.DataFrame, k: int) -> None:
+        """重建 [k, n) 的K线数据点和 EMA"""
+        tail = frame.iloc[k:]
+        times = _seconds(tail['datetime'])
+        columns = [tail[col].to_numpy(dtype=np.float64).tolist() for col in ('open', 'high', 'low', 'close')]
+
+        ema = EMAState(self.ema_period)
+        if k:
+            ema.value, ema.count = self._ema_values[k - 1], k
+        values = [ema.update(c) for c in columns[3]]
+
+        del self._bars[k:], self._ema_values[k:], self._ema[k:]
+        self._bars.extend(
+            {'time': t, 'open': o, 'high': h, 'low': l, 'close': c}
+            for t, o, h, l, c in zip(times, *columns)
+        )
+        self._ema_values.extend(values)
+        self._ema.extend({'time': t, 'value': v} for t, v in zip(times, values))
+
+    def _rebuild_markers(self, frame: pd.DataFrame, events: pd.DataFrame,
+                         k: int) -> tuple[int, list[str], list[dict]]:
+        """
+        从受影响的第一个候选分型起重算 H/L 信号和标记。
+
+        信号K线 i 的强势判断用到K线 i，突破确认用到K线 i+1，因此K线 k 变化时从 k-1 起重算；
+        候选分型 (Tc/Bc) 变化时从第一个变化的候选起重算。之前的信号不变，计数递推从其状态续算。
+        有密度上限时，标记从重算起点所在的桶的起点重新筛选。
+
+        Returns:
+            tuple: (重算起点, 删除的标记 key 列表, 新增或变化的标记列表)
+        """
+        n = len(frame)
+        cand_idx, cand_top = setup_candidates(events, n)
+        old_idx, old_top = self._candidates
+        m = min(len(cand_idx), len(old_idx))
+        diff = np.flatnonzero((cand_idx[:m] != old_idx[:m]) | (cand_top[:m] != old_top[:m]))
+        first = int(diff[0]) if len(diff) else m
+        s0 = max(0, k - 1)
+        changed = [idx[first] for idx in (cand_idx, old_idx) if first < len(idx)]
+        if changed:
+            s0 = min(s0, int(min(changed)))
+        self._candidates = cand_idx, cand_top
+
+        # 重算 s0 之后的候选
+        setups = self._setups
+        stop = int(np.searchsorted(setups.bar_idx, s0))
+        c0 = int(np.searchsorted(cand_idx, s0))
+        bar_idx, is_top = cand_idx[c0:], cand_top[c0:]
+        highs, lows, closes = (frame[col].to_numpy(dtype=np.float64) for col in ('high', 'low', 'close'))
+        strong = strong_signal_mask(highs, lows, closes, bar_idx, is_top)
+        triggered = strong | breakout_mask(highs, lows, closes, bar_idx, is_top)
+        keep, counts = count_setups(bar_idx, is_top, triggered, start=setup_state(setups, stop))
+        tail = SetupSignals(
+            bar_idx=bar_idx[keep].astype(np.int32),
+            side=np.where(is_top[keep], SetupSide.SELL, SetupSide.BUY).astype(np.int8),
+            count=counts,
+            strong=strong[keep],
+        )
+        self._setups = SetupSignals(*(np.concatenate([a[:stop], b]) for a, b in (
+            (setups.bar_idx, tail.bar_idx), (setups.side, tail.side),
+            (setups.count, tail.count), (setups.strong, tail.strong),
+        )))
+
+        # 标记: 从 s0 (有密度上限时为 s0 所在桶的起点) 起重新生成
+        if self.max_per_bucket is not None:
+            s0 = s0 // self.bucket_bars * self.bucket_bars
+        setups = self._setups
+        pos = int(np.searchsorted(setups.bar_idx, s0))
+        part = SetupSignals(*(a[pos:] for a in (setups.bar_idx, setups.side, setups.count, setups.strong)))
+        keep = marker_density_mask(part.bar_idx, self.max_per_bucket, self.bucket_bars)
+        bar_idx = part.bar_idx[keep]
+        times = _seconds(frame['datetime'].iloc[bar_idx]) if len(bar_idx) else []
+        markers = setup_markers(times, part.side[keep], part.labels[keep])
+        cut = bisect.bisect_left(self._marker_idx, s0)
+        old_markers = {_marker_key(mk): mk for mk in self._markers[cut:]}
+        new_markers = {_marker_key(mk): mk for mk in markers}
+        added = [mk for key, mk in new_markers.items() if old_markers.get(key) != mk]
+        removed = [key for key in old_markers if key not in new_markers]
+
+        del self._markers[cut:], self._marker_idx[cut:]
+        self._markers.extend(markers)
+        self._marker_idx.extend(bar_idx.tolist())
+        return s0, removed, added
+
+    def update(self, df: pd.DataFrame) -> list[dict]:
+        """
+        以新的原始K线 (完整序列，如重新读取的数据文件) 更新，并广播变化。
+
+        Returns:
+            list[dict]: 本次广播的消息 (没有变化时为空)
+        """
+        with self._lock:
+            self._df = df.reset_index(drop=True)
+            messages = self._compute(self._df)
+            for message in messages:
+                self._broadcast(message)
+        return messages
+
+    def append(self, bars: pd.DataFrame) -> list[dict]:
+        """追加新K线 (时间晚于已有K线)；与最后一根时间相同的K线视为对其的更新"""
+        with self._lock:
+            df = self._df
+        if len(df) and len(bars):
+            col_dt = _detect_columns(df)[0]
+            last = pd.to_datetime(df[col_dt]).iloc[-1]
+            same = (pd.to_datetime(bars[col_dt]) == last).to_numpy()
+            if same.any():
+                df = df.iloc[:-1]
+        return self.update(pd.concat([df, bars], ignore_index=True))
+
+    # ---------------- 订阅 ----------------
+
+    def _snapshot(self) -> dict:
+        """全量消息 (复制列表: 状态在之后的更新中原地修改，消息可能尚未发送)"""
+        return {'type': 'snapshot', 'bars': list(self._bars), 'indicators': [list(self._ema)],
+                'markers': list(self._markers)}
+
+    def snapshot(self) -> dict:
+        """全量消息"""
+        with self._lock:
+            return self._snapshot()
+
+    def page(self, stream_url: str = '/events') -> str:
+        """当前状态的图表页面 (订阅 stream_url)"""
+        with self._lock:
+            chart = ChartBuilder(self._frame)
+            chart.candlestick_data = list(self._bars)
+            chart.add_indicator(f'EMA{self.ema_period}', self._ema_values)
+            if self._events is not None:
+                chart.add_strokes(self._events)
+            chart.markers = list(self._markers)
+            return chart.to_html(self.title or None, stream_url=stream_url)
+
+    def subscribe(self) -> queue.Queue:
+        """新增订阅者，队列中第一条消息为 snapshot"""
+        q = queue.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        with self._lock:
+            q.put_nowait(self._snapshot())
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _broadcast(self, message: dict) -> None:
+        """发送给所有订阅者 (调用方持有锁)；积压过多的订阅者丢弃积压后改发 snapshot"""
+        snapshot = None
+        for q in self._subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # 只有这里写入队列 (持有锁)，取空后一定能放入
+                while True:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+                if snapshot is None:
+                    snapshot = self._snapshot()
+                q.put_nowait(snapshot)
+
+
+_EMPTY_SETUPS = SetupSignals(
+    bar_idx=np.empty(0, dtype=np.int32), side=np.empty(0, dtype=np.int8),
+    count=np.empty(0, dtype=np.int16), strong=np.empty(0, dtype=bool),
+)
+
+
+def _chart_frame(merged: pd.DataFrame) -> pd.DataFrame:
+    """合并K线转为标准列名 (datetime, open, high, low, close)"""
+    col_dt, col_open, col_high, col_low, col_close = _detect_columns(merged)
+    return pd.DataFrame({
+        'datetime': pd.to_datetime(merged[col_dt]),
+        'open': merged[col_open], 'high': merged[col_high],
+        'low': merged[col_low], 'close': merged[col_close],
+    })
+
+
+def _first_changed_bar(old: pd.DataFrame, new: pd.DataFrame, start: int) -> int:
+    """old 与 new 第一根不同的K线位置 (已知 [0, start) 相同，只对比之后的部分)"""
+    m = min(len(old), len(new))
+    if start >= m:
+        return m
+    for col in old.columns:
+        a, b = old[col].to_numpy()[start:m], new[col].to_numpy()[start:m]
+        diff = np.flatnonzero(a != b)
+        if len(diff):
+            m = start + int(diff[0])
+    return m
+
+
+def _seconds(datetimes: pd.Series) -> list:
+    """Unix 时间戳 (秒)，与 ChartBuilder._timestamps 一致"""
+    return ((datetimes - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).tolist()
+
+
+def _marker_key(marker: dict) -> str:
+    """标记的 key，与页面脚本删除标记时使用的一致"""
+    return f"{marker['time']}|{marker['text']}"
+
+
+def _delta_records(delta: pd.DataFrame) -> list[dict]:
+    """变更集转为 JSON 记录 (时间为 Unix 秒)"""
+    times = (pd.to_datetime(delta['datetime']) - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+    return [
+        {'change': c, 'kind': k, 'time': int(t), 'price': float(p), 'prev_kind': pk}
+        for c, k, t, p, pk in zip(delta['change'], delta['kind'], times, delta['price'], delta['prev_kind'])
+    ]
+
+
+def _latest_status(events: pd.DataFrame) -> str:
+    """最新笔端点和当前候选的说明，如 'T 3.42 / Bc 3.27'"""
+    parts = []
+    endpoints = events[events['kind'].isin(('T', 'B'))]
+    if len(endpoints):
+        last = endpoints.iloc[-1]
+        parts.append(f"{last['kind']} {last['price']:g}")
+    current = events[events['kind'].isin(('Tc', 'Bc')) & (events['bar_idx'] == events['fractal_idx'])]
+    if len(current):
+        last = current.iloc[-1]
+        parts.append(f"{last['kind']} {last['price']:g}")
+    return ' / '.join(parts)
+
+
+# ============================================================
+# HTTP 服务
+# ============================================================
+
+class _Handler(BaseHTTPRequestHandler):
+    """GET / 返回图表页面，GET /events 为 SSE 推送流"""
+
+    def do_GET(self):
+        feed: LiveFeed = self.server.feed
+        path = self.path.split('?', 1)[0]
+        if path in ('/', '/index.html'):
+            body = feed.page('/events').encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == '/events':
+            self._stream(feed)
+        else:
+            self.send_error(404)
+
+    def _stream(self, feed: LiveFeed):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Connection', 'keep-alive')
+        self.end_headers()
+        q = feed.subscribe()
+        try:
+            while not self.server.stopping.is_set():
+                try:
+                    message = q.get(timeout=KEEPALIVE_S)
+                except queue.Empty:
+                    self.wfile.write(b': keepalive\n\n')
+                else:
+                    data = json.dumps({k: v for k, v in message.items() if k != 'type'}, ensure_ascii=False)
+                    self.wfile.write(f"event: {message['type']}\ndata: {data}\n\n".encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            feed.unsubscribe(q)
+
+    def log_message(self, format, *args):
+        # 不逐个请求打印访问日志
+        pass
+
+
+class LiveChartServer:
+    """
+    本地实时图表服务。
+
+    Attributes:
+        feed: 数据源
+        url: 页面地址
+    """
+
+    def __init__(self, feed: LiveFeed, host: str = '127.0.0.1', port: int = 8765):
+        """
+        Args:
+            feed: 数据源
+            host: 监听地址 (默认只允许本机访问)
+            port: 端口，0 表示自动选择
+        """
+        self.feed = feed
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.feed = feed
+        self._httpd.stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> 'LiveChartServer':
+        """在后台线程中运行"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='live-chart', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止服务 (推送流在下一次保活或消息时结束)"""
+        self._httpd.stopping.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
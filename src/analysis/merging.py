@@ -5,11 +5,18 @@ K 线合并模块，处理包含关系的 K 线合并。
 支持标准 OHLC 格式（推荐）和旧版中文列名格式（向后兼容）。
 """
 
+import bisect
+from dataclasses import dataclass
+from typing import Optional
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
 from ..io.schema import COL_DATETIME, COL_OPEN, COL_HIGH, COL_LOW, COL_CLOSE
+from ..io.validation import validate_ohlc
+from ..instrument import stage
+from .codes import COL_KLINE_CODE, COL_BAR_FLAGS, KlineCode, BarFlag, decode_kline_status, has_flag
 
 # 设置中文显示
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial'] 
@@ -39,12 +46,23 @@ def get_initial_trend(bars, col_high: str, col_low: str):
     """
     向后扫描直到找到明确的趋势方向
     """
-    for i in range(1, len(bars)):
-        prev = bars[i-1]
-        curr = bars[i]
-        
-        h_prev, l_prev = prev[col_high], prev[col_low]
-        h_curr, l_curr = curr[col_high], curr[col_low]
+    highs = [bar[col_high] for bar in bars]
+    lows = [bar[col_low] for bar in bars]
+    return initial_trend(highs, lows)
+
+
+def initial_trend(highs, lows, default: int = 1) -> int:
+    """
+    get_initial_trend 的数组版本。
+
+    Args:
+        highs: 原始K线最高价序列
+        lows: 原始K线最低价序列
+        default: 找不到明确趋势时的返回值 (默认向上；传 0 可判断趋势是否已确定)
+    """
+    for i in range(1, len(highs)):
+        h_prev, l_prev = highs[i-1], lows[i-1]
+        h_curr, l_curr = highs[i], lows[i]
         
         # 排除包含关系
         is_inside = (h_curr <= h_prev) and (l_curr >= l_prev)
@@ -55,51 +73,214 @@ def get_initial_trend(bars, col_high: str, col_low: str):
                 return 1  # UP
             elif h_curr < h_prev and l_curr < l_prev:
                 return -1  # DOWN
-    return 1  # 默认向上，如果全都是包含关系（极不可能）
+    return default  # 默认向上，如果全都是包含关系（极不可能）
+
+
+# 合并K线的来源列 (原始K线的位置索引)
+COL_RAW_START = "raw_start"
+COL_RAW_END = "raw_end"
+COL_RAW_HIGH_IDX = "raw_high_idx"
+COL_RAW_LOW_IDX = "raw_low_idx"
+PROVENANCE_COLUMNS = [COL_RAW_START, COL_RAW_END, COL_RAW_HIGH_IDX, COL_RAW_LOW_IDX]
 
 
-def apply_kline_merging(input_path, output_path, save_plot_path=None):
+@dataclass
+class MergeProvenance:
     """
-    应用 K 线合并逻辑。
-    
-    Args:
-        input_path: 输入 CSV 文件路径（已添加 kline_status 的数据）
-        output_path: 输出 CSV 文件路径
-        save_plot_path: 可选，保存图表的路径
+    合并K线 -> 原始K线的来源索引 (均为 int32，原始K线按位置编号)。
+
+    合并只发生在相邻K线之间，因此每根合并K线对应一段连续的原始K线 [start, end]。
+
+    Attributes:
+        start_idx: 每根合并K线的第一根原始K线
+        end_idx: 每根合并K线的最后一根原始K线 (其时间即合并K线的时间)
+        high_src_idx: 决定合并K线最高价的原始K线
+        low_src_idx: 决定合并K线最低价的原始K线
+        raw_to_merged: 每根原始K线所属的合并K线 (反向索引)
     """
-    print(f"开始读取数据: {input_path}")
-    
-    # 尝试多种编码
-    try:
-        df = pd.read_csv(input_path, encoding='utf-8')
-    except UnicodeDecodeError:
-        df = pd.read_csv(input_path, encoding='gbk')
-    
-    # 检测列名格式
-    col_dt, col_open, col_high, col_low, col_close = _detect_columns(df)
-    print(f"检测到列名格式: high={col_high}, low={col_low}")
-    
-    raw_bars = df.to_dict('records')
-    if not raw_bars:
-        return
+    start_idx: np.ndarray
+    end_idx: np.ndarray
+    high_src_idx: np.ndarray
+    low_src_idx: np.ndarray
+    raw_to_merged: np.ndarray
 
-    merged_bars = []
-    
+    def __len__(self) -> int:
+        return len(self.start_idx)
+
+    @property
+    def n_raw(self) -> int:
+        return len(self.raw_to_merged)
+
+    @classmethod
+    def from_arrays(cls, start_idx, end_idx, high_src_idx, low_src_idx) -> 'MergeProvenance':
+        start_idx = np.asarray(start_idx, dtype=np.int32)
+        end_idx = np.asarray(end_idx, dtype=np.int32)
+        raw_to_merged = np.repeat(
+            np.arange(len(start_idx), dtype=np.int32), end_idx - start_idx + 1
+        )
+        return cls(
+            start_idx=start_idx,
+            end_idx=end_idx,
+            high_src_idx=np.asarray(high_src_idx, dtype=np.int32),
+            low_src_idx=np.asarray(low_src_idx, dtype=np.int32),
+            raw_to_merged=raw_to_merged,
+        )
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'MergeProvenance':
+        """从合并后的 DataFrame (含 PROVENANCE_COLUMNS，如读取的 *_merged.csv) 重建"""
+        return cls.from_arrays(*(df[col].to_numpy() for col in PROVENANCE_COLUMNS))
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            COL_RAW_START: self.start_idx,
+            COL_RAW_END: self.end_idx,
+            COL_RAW_HIGH_IDX: self.high_src_idx,
+            COL_RAW_LOW_IDX: self.low_src_idx,
+        })
+
+    def merged_index(self, raw_idx):
+        """原始K线 -> 所属合并K线 (支持标量或数组)"""
+        return self.raw_to_merged[raw_idx]
+
+    def raw_range(self, merged_idx) -> tuple:
+        """合并K线 -> (第一根, 最后一根) 原始K线 (支持标量或数组)"""
+        return self.start_idx[merged_idx], self.end_idx[merged_idx]
+
+    def extreme_source(self, merged_idx, fractal_type):
+        """
+        合并K线上分型极值所在的原始K线。
+
+        Args:
+            merged_idx: 合并K线位置 (标量或数组)
+            fractal_type: 'TOP' / 'BOTTOM' / 'T' / 'B'，或 FractalCode (1 / -1)，可为数组
+        """
+        if isinstance(fractal_type, str):
+            is_top = fractal_type.startswith('T')
+        else:
+            is_top = np.asarray(fractal_type) > 0
+        return np.where(is_top, self.high_src_idx[merged_idx], self.low_src_idx[merged_idx])
+
+
+@dataclass
+class MergeResult:
+    """
+    K 线合并结果。
+
+    Attributes:
+        df: 合并后的 K 线 DataFrame (含重新计算的 kline_code / bar_flags 和来源索引列)
+        merge_count: 合并次数
+        initial_trend: 初始趋势，1 = 上涨，-1 = 下跌
+        provenance: 合并K线与原始K线之间的双向索引
+    """
+    df: pd.DataFrame
+    merge_count: int
+    initial_trend: int
+    provenance: Optional[MergeProvenance] = None
+
+
+def _combine_sources(first, second, h_first, h_second, l_first, l_second, trend,
+                     new_high, new_low, new_open, new_close) -> list:
+    """
+    计算两根相邻K线合并后的来源索引 [start, end, high_src, low_src]。
+
+    极值来源跟随 max/min 的选择 (相等时取较早的一根)；若 OHLC 一致性修正
+    用开盘价/收盘价替换了极值，则来源为第一根/最后一根原始K线。
+    """
+    if trend == 1:
+        high_src = first[2] if h_first >= h_second else second[2]
+        low_src = first[3] if l_first >= l_second else second[3]
+        base_high, base_low = max(h_first, h_second), max(l_first, l_second)
+    else:
+        high_src = first[2] if h_first <= h_second else second[2]
+        low_src = first[3] if l_first <= l_second else second[3]
+        base_high, base_low = min(h_first, h_second), min(l_first, l_second)
+
+    if new_high != base_high:
+        high_src = first[0] if new_high == new_open else second[1]
+    if new_low != base_low:
+        low_src = first[0] if new_low == new_open else second[1]
+    return [first[0], second[1], high_src, low_src]
+
+
+@dataclass
+class MergeState:
+    """
+    合并器的中间状态：已处理的原始K线合并成的K线序列及当前趋势。
+
+    合并只依赖高低点、来源索引和原始K线的开盘/收盘价，状态中不保存其他列，
+    可序列化后从 raw_next 处继续处理新增的原始K线 (见 analysis/incremental.py)。
+
+    Attributes:
+        highs: 合并K线最高价
+        lows: 合并K线最低价
+        sources: 合并K线的来源索引 [start, end, high_src, low_src]
+        current_trend: 当前趋势，1 = 上涨，-1 = 下跌
+        merge_count: 合并次数
+        initial_trend: 初始趋势
+        raw_next: 下一根待处理的原始K线位置
+        trend_log: 趋势变化记录 [(raw_idx, trend), ...]，None 表示不记录
+                   (用于回查处理到某根原始K线时的趋势，见 trend_at)
+    """
+    highs: list
+    lows: list
+    sources: list
+    current_trend: int
+    merge_count: int
+    initial_trend: int
+    raw_next: int
+    trend_log: Optional[list] = None
+
+    def __len__(self) -> int:
+        return len(self.highs)
+
+    def trend_at(self, raw_idx: int) -> Optional[int]:
+        """处理完第 raw_idx 根原始K线时的趋势，早于记录起点时返回 None"""
+        if not self.trend_log or raw_idx < self.trend_log[0][0]:
+            return None
+        pos = bisect.bisect_right(self.trend_log, raw_idx, key=lambda x: x[0])
+        return self.trend_log[pos - 1][1]
+
+
+def initial_state(raw_highs, raw_lows, trend_log: bool = False) -> MergeState:
+    """
+    只含首根原始K线的合并器状态。
+
+    Args:
+        raw_highs / raw_lows: 全部原始K线的高低点 (用于预先确定初始趋势)
+        trend_log: 是否记录趋势变化
+    """
     # 预先确定初始趋势，解决开头就是包含关系导致的无法合并问题
-    current_trend = get_initial_trend(raw_bars, col_high, col_low)
-    print(f"初始趋势判定为: {'上涨' if current_trend==1 else '下跌'}")
-    
-    merged_bars.append(raw_bars[0].copy())  # 使用副本以免修改原始数据
-    
-    merge_count = 0
+    trend = initial_trend(raw_highs, raw_lows)
+    return MergeState(
+        highs=[raw_highs[0]], lows=[raw_lows[0]], sources=[[0, 0, 0, 0]],
+        current_trend=trend, merge_count=0, initial_trend=trend, raw_next=1,
+        trend_log=[(0, trend)] if trend_log else None,
+    )
+
+
+def merge_records(state: MergeState, raw_highs, raw_lows, raw_opens, raw_closes) -> int:
+    """
+    从 state.raw_next 开始合并原始K线，原地更新 state。
+
+    Args:
+        state: 合并器状态 (首根原始K线已在其中)
+        raw_highs / raw_lows / raw_opens / raw_closes: 全部原始K线的价格 (list，按位置索引)
+
+    Returns:
+        int: 本次被修改或移除的最早一根合并K线的位置 (没有修改已有K线时为原长度)
+    """
+    merged_highs, merged_lows, sources = state.highs, state.lows, state.sources
+    current_trend = state.current_trend
+    merge_count = state.merge_count
+    trend_log = state.trend_log
+    low_water = len(merged_highs)
     
-    i = 1
-    while i < len(raw_bars):
-        curr = raw_bars[i].copy()
-        prev = merged_bars[-1]  # 这里引用的是列表中的对象，修改它会直接生效
-        
-        h_curr, l_curr = curr[col_high], curr[col_low]
-        h_prev, l_prev = prev[col_high], prev[col_low]
+    i = state.raw_next
+    n_raw = len(raw_highs)
+    while i < n_raw:
+        h_curr, l_curr = raw_highs[i], raw_lows[i]
+        h_prev, l_prev = merged_highs[-1], merged_lows[-1]
         
         is_inside = (h_curr <= h_prev) and (l_curr >= l_prev)
         is_outside = (h_curr >= h_prev) and (l_curr <= l_prev)
@@ -115,218 +296,272 @@ def apply_kline_merging(input_path, output_path, save_plot_path=None):
                 new_high = min(h_prev, h_curr)
                 new_low = min(l_prev, l_curr)
             
-            # 更新 close 为当前K线的收盘价
-            new_close = curr[col_close]
-            new_open = prev[col_open]  # 保留合并前第一根的开盘价
+            # close 为当前K线的收盘价，open 保留合并前第一根的开盘价
+            new_close = raw_closes[i]
+            new_open = raw_opens[sources[-1][0]]
             
             # 【关键修复】确保 OHLC 一致性：
             # - low 必须 ≤ min(open, close)
             # - high 必须 ≥ max(open, close)
             new_low = min(new_low, new_open, new_close)
             new_high = max(new_high, new_open, new_close)
-                
-            # 原地更新 prev
-            prev[col_high] = new_high
-            prev[col_low] = new_low
-            prev[col_close] = new_close
-            prev[col_dt] = curr[col_dt] 
-            prev['kline_status'] = "MERGED" 
             
+            # 原地更新 prev
+            merged_highs[-1] = new_high
+            merged_lows[-1] = new_low
+            sources[-1] = _combine_sources(
+                sources[-1], [i, i, i, i], h_prev, h_curr, l_prev, l_curr, current_trend,
+                new_high, new_low, new_open, new_close,
+            )
             merge_count += 1
-            
-            # 【向左回溯】合并后OHLC可能变化，检查是否与更早的K线形成新的包含关系
-            while len(merged_bars) >= 2:
-                last = merged_bars[-1]
-                second_last = merged_bars[-2]
-                
-                h_last, l_last = last[col_high], last[col_low]
-                h_second, l_second = second_last[col_high], second_last[col_low]
-                
-                is_inside_back = (h_last <= h_second) and (l_last >= l_second)
-                is_outside_back = (h_last >= h_second) and (l_last <= l_second)
-                
-                if not (is_inside_back or is_outside_back):
-                    break  # 无包含关系，停止回溯
-                
-                # 确定回溯时的趋势
-                if len(merged_bars) >= 3:
-                    third_last = merged_bars[-3]
-                    h_third, l_third = third_last[col_high], third_last[col_low]
-                    if h_second > h_third and l_second > l_third:
-                        backtrack_trend = 1
-                    elif h_second < h_third and l_second < l_third:
-                        backtrack_trend = -1
-                    else:
-                        backtrack_trend = current_trend
-                else:
-                    backtrack_trend = current_trend
-                
-                if backtrack_trend == 1:
-                    new_high_back = max(h_second, h_last)
-                    new_low_back = max(l_second, l_last)
-                else:
-                    new_high_back = min(h_second, h_last)
-                    new_low_back = min(l_second, l_last)
-                
-                # OHLC一致性
-                new_open_back = second_last[col_open]
-                new_close_back = last[col_close]
-                new_low_back = min(new_low_back, new_open_back, new_close_back)
-                new_high_back = max(new_high_back, new_open_back, new_close_back)
-                
-                # 合并：更新second_last，移除last
-                second_last[col_high] = new_high_back
-                second_last[col_low] = new_low_back
-                second_last[col_close] = new_close_back
-                second_last[col_dt] = last[col_dt]
-                second_last['kline_status'] = "MERGED"
-                merged_bars.pop()
-                merge_count += 1
-            
-            # i 增加，下一轮循环将用新的 prev (即刚刚合并后的结果) 与 raw_bars[i+1] 对比
-            # 这就实现了向右的递归合并
-            i += 1
-        
+            low_water = min(low_water, len(merged_highs) - 1)
         else:
             # 无包含关系，更新趋势
             if h_curr > h_prev and l_curr > l_prev:
                 current_trend = 1
             elif h_curr < h_prev and l_curr < l_prev:
                 current_trend = -1
+            if trend_log is not None and trend_log[-1][1] != current_trend:
+                trend_log.append((i, current_trend))
+            
+            merged_highs.append(h_curr)
+            merged_lows.append(l_curr)
+            sources.append([i, i, i, i])
+        
+        # 【向左回溯】合并后 (或新加入K线后) 高低点可能变化，检查是否与更早的K线形成新的包含关系
+        while len(merged_highs) >= 2:
+            h_last, l_last = merged_highs[-1], merged_lows[-1]
+            h_second, l_second = merged_highs[-2], merged_lows[-2]
+            
+            is_inside_back = (h_last <= h_second) and (l_last >= l_second)
+            is_outside_back = (h_last >= h_second) and (l_last <= l_second)
             
-            merged_bars.append(curr)
+            if not (is_inside_back or is_outside_back):
+                break  # 无包含关系，停止回溯
             
-            # 【新增】向左回溯检查：新加入的K线可能与更早的K线形成包含关系
-            # 这种情况发生在合并后OHLC调整改变了high/low
-            while len(merged_bars) >= 2:
-                last = merged_bars[-1]
-                second_last = merged_bars[-2]
-                
-                h_last, l_last = last[col_high], last[col_low]
-                h_second, l_second = second_last[col_high], second_last[col_low]
-                
-                is_inside_back = (h_last <= h_second) and (l_last >= l_second)
-                is_outside_back = (h_last >= h_second) and (l_last <= l_second)
-                
-                if not (is_inside_back or is_outside_back):
-                    break  # 无包含关系，停止回溯
-                
-                # 需要合并最后两根
-                # 重新确定趋势（基于前一根的状态）
-                if len(merged_bars) >= 3:
-                    third_last = merged_bars[-3]
-                    h_third, l_third = third_last[col_high], third_last[col_low]
-                    if h_second > h_third and l_second > l_third:
-                        backtrack_trend = 1
-                    elif h_second < h_third and l_second < l_third:
-                        backtrack_trend = -1
-                    else:
-                        backtrack_trend = current_trend
+            # 确定回溯时的趋势（基于前一根的状态）
+            if len(merged_highs) >= 3:
+                h_third, l_third = merged_highs[-3], merged_lows[-3]
+                if h_second > h_third and l_second > l_third:
+                    backtrack_trend = 1
+                elif h_second < h_third and l_second < l_third:
+                    backtrack_trend = -1
                 else:
                     backtrack_trend = current_trend
-                
-                if backtrack_trend == 1:
-                    new_high = max(h_second, h_last)
-                    new_low = max(l_second, l_last)
-                else:
-                    new_high = min(h_second, h_last)
-                    new_low = min(l_second, l_last)
-                
-                # OHLC一致性检查
-                new_open = second_last[col_open]
-                new_close = last[col_close]
-                new_low = min(new_low, new_open, new_close)
-                new_high = max(new_high, new_open, new_close)
-                
-                # 更新second_last，移除last
-                second_last[col_high] = new_high
-                second_last[col_low] = new_low
-                second_last[col_close] = new_close
-                second_last[col_dt] = last[col_dt]
-                second_last['kline_status'] = "MERGED"
-                merged_bars.pop()
-                merge_count += 1
+            else:
+                backtrack_trend = current_trend
             
-            i += 1
+            if backtrack_trend == 1:
+                new_high_back = max(h_second, h_last)
+                new_low_back = max(l_second, l_last)
+            else:
+                new_high_back = min(h_second, h_last)
+                new_low_back = min(l_second, l_last)
+            
+            # OHLC一致性
+            new_open_back = raw_opens[sources[-2][0]]
+            new_close_back = raw_closes[sources[-1][1]]
+            new_low_back = min(new_low_back, new_open_back, new_close_back)
+            new_high_back = max(new_high_back, new_open_back, new_close_back)
+            
+            # 合并：更新 second_last，移除 last
+            merged_highs[-2] = new_high_back
+            merged_lows[-2] = new_low_back
+            merged_highs.pop()
+            merged_lows.pop()
+            last_src = sources.pop()
+            sources[-1] = _combine_sources(
+                sources[-1], last_src, h_second, h_last, l_second, l_last, backtrack_trend,
+                new_high_back, new_low_back, new_open_back, new_close_back,
+            )
+            merge_count += 1
+            low_water = min(low_water, len(merged_highs) - 1)
+        
+        # 下一轮用新的 prev (即刚刚合并后的结果) 与下一根原始K线对比，实现向右的递归合并
+        i += 1
+    
+    state.current_trend = current_trend
+    state.merge_count = merge_count
+    state.raw_next = i
+    return low_water
+
+
+def merged_frame(df: pd.DataFrame, state: MergeState, string_columns: bool = False) -> pd.DataFrame:
+    """
+    由合并器状态生成合并后的 K 线 DataFrame。
+
+    每根合并K线取其第一根原始K线的各列，时间与收盘价取最后一根原始K线，高低点取合并结果；
+    重新计算 kline_code / bar_flags 并附加来源索引列。
 
-    # --- 新增步骤：重新计算合并后的 K 线状态 ---
-    print("正在重新计算合并后的 K 线状态...")
-    merged_bars[0]['kline_status'] = 'INITIAL'
+    Args:
+        df: 原始 K 线 DataFrame (与 state 对应)
+        state: 已处理完全部原始K线的合并器状态
+        string_columns: 是否同时输出旧版字符串列 'kline_status'
+    """
+    col_dt, col_open, col_high, col_low, col_close = _detect_columns(df)
+    sources = np.array(state.sources, dtype=np.int32).reshape(-1, 4)
+    start_idx, end_idx = sources[:, 0], sources[:, 1]
     
-    for i in range(1, len(merged_bars)):
-        curr = merged_bars[i]
-        prev = merged_bars[i-1]
-        
-        h_curr, l_curr = curr[col_high], curr[col_low]
-        h_prev, l_prev = prev[col_high], prev[col_low]
-        
-        if h_curr > h_prev and l_curr > l_prev:
-            status = 'TREND_UP'
-        elif h_curr < h_prev and l_curr < l_prev:
-            status = 'TREND_DOWN'
-        else:
-            # 理论上合并后不应存在 INSIDE/OUTSIDE，除非极其罕见的完全重合或者是逻辑漏洞
-            # 这里统一标记为 MIXED 以示区别，或者通过上下影线判断
-            status = 'MIXED'
-        
-        # 保留合并标记
-        if "MERGED" in curr.get('kline_status', ''):
-            curr['kline_status'] = status + "_(M)"
-        else:
-            curr['kline_status'] = status
+    result_df = df.iloc[start_idx].reset_index(drop=True)
+    result_df = result_df.drop(columns='kline_status', errors='ignore')
+    highs = np.asarray(state.highs, dtype=np.float64)
+    lows = np.asarray(state.lows, dtype=np.float64)
+    result_df[col_high] = highs.astype(df[col_high].dtype, copy=False)
+    result_df[col_low] = lows.astype(df[col_low].dtype, copy=False)
+    result_df[col_close] = df[col_close].to_numpy()[end_idx]
+    result_df[col_dt] = df[col_dt].to_numpy()[end_idx]
+    
+    # --- 重新计算合并后的 K 线状态 ---
+    # 合并标记: 由多根原始K线合并而成的K线
+    is_merged = end_idx > start_idx
+    kline_codes = np.full(len(result_df), KlineCode.INITIAL, dtype=np.int8)
+    # 理论上合并后不应存在 INSIDE/OUTSIDE，除非极其罕见的完全重合或者是逻辑漏洞
+    # 这里统一标记为 MIXED 以示区别
+    kline_codes[1:] = np.select(
+        [(highs[1:] > highs[:-1]) & (lows[1:] > lows[:-1]),
+         (highs[1:] < highs[:-1]) & (lows[1:] < lows[:-1])],
+        [KlineCode.TREND_UP, KlineCode.TREND_DOWN],
+        KlineCode.MIXED,
+    )
+    bar_flags = np.where(is_merged, BarFlag.MERGED, 0).astype(np.uint8)
+    
+    # 保留合并标记 (字符串格式中首根K线不带 _(M) 后缀)
+    if string_columns:
+        result_df['kline_status'] = decode_kline_status(kline_codes, bar_flags)
+    result_df[COL_KLINE_CODE] = kline_codes
+    result_df[COL_BAR_FLAGS] = bar_flags
+    
+    provenance = MergeProvenance.from_arrays(*sources.T)
+    for col, values in provenance.to_frame().items():
+        result_df[col] = values
+    return result_df
+
+
+def _price_lists(df: pd.DataFrame) -> tuple[list, list, list, list]:
+    """原始K线的 (high, low, open, close) 列表 (合并循环按位置索引)"""
+    _, col_open, col_high, col_low, col_close = _detect_columns(df)
+    return tuple(df[col].to_numpy(dtype=np.float64).tolist() for col in (col_high, col_low, col_open, col_close))
+
+
+def merge_kline_bars(df: pd.DataFrame, string_columns: bool = False) -> MergeResult:
+    """
+    对 K 线应用包含关系合并 (纯计算，不读写文件、不打印)。
+
+    Args:
+        df: 原始 K 线 DataFrame (标准列名或旧版中文列名)
+        string_columns: 是否同时输出旧版字符串列 'kline_status'
+
+    Returns:
+        MergeResult: 合并结果
+    """
+    _detect_columns(df)
+    if df.empty:
+        return MergeResult(df=pd.DataFrame(columns=df.columns), merge_count=0, initial_trend=1)
+    
+    raw_highs, raw_lows, raw_opens, raw_closes = _price_lists(df)
+    state = initial_state(raw_highs, raw_lows)
+    merge_records(state, raw_highs, raw_lows, raw_opens, raw_closes)
+    return merge_result(df, state, string_columns)
+
+
+def merge_result(df: pd.DataFrame, state: MergeState, string_columns: bool = False) -> MergeResult:
+    """由处理完全部原始K线的合并器状态生成 MergeResult"""
+    result_df = merged_frame(df, state, string_columns)
+    return MergeResult(
+        df=result_df,
+        merge_count=state.merge_count,
+        initial_trend=state.initial_trend,
+        provenance=MergeProvenance.from_frame(result_df),
+    )
+
 
+def apply_kline_merging(input_path, output_path, save_plot_path=None, string_columns: bool = False,
+                        plot: bool = True, merge=None):
+    """
+    应用 K 线合并逻辑。
+    
+    Args:
+        input_path: 输入 CSV 文件路径（已添加 kline_status 的数据）
+        output_path: 输出 CSV 文件路径
+        save_plot_path: 可选，保存图表的路径
+        string_columns: 是否同时输出旧版字符串列 'kline_status'
+        plot: 是否在此处绘图；False 时由调用方另行渲染 (见 render.merged_chart_job)
+        merge: 合并函数 (df, string_columns) -> MergeResult，None 则使用 merge_kline_bars
+               (增量计算见 incremental.IncrementalEngine.merge)
+
+    Returns:
+        MergeResult: 合并结果，输入为空时返回 None
+    """
+    print(f"开始读取数据: {input_path}")
+    
+    # 尝试多种编码
+    with stage('read_csv'):
+        try:
+            df = pd.read_csv(input_path, encoding='utf-8')
+        except UnicodeDecodeError:
+            df = pd.read_csv(input_path, encoding='gbk')
+    
+    # 检测列名格式
+    col_dt, col_open, col_high, col_low, col_close = _detect_columns(df)
+    print(f"检测到列名格式: high={col_high}, low={col_low}")
+    
+    if df.empty:
+        return None
+    
+    with stage('compute'):
+        merged = (merge or merge_kline_bars)(df, string_columns=string_columns)
+    print(f"初始趋势判定为: {'上涨' if merged.initial_trend==1 else '下跌'}")
+    
     # 输出结果
-    result_df = pd.DataFrame(merged_bars)
-    result_df.to_csv(output_path, index=False, encoding='utf-8')
-    print(f"合并完成。次数: {merge_count}")
+    result_df = merged.df
+    with stage('write_csv'):
+        result_df.to_csv(output_path, index=False, encoding='utf-8')
+    print(f"合并完成。次数: {merged.merge_count}")
     
     # 验证合并结果
-    _validate_merged_data(result_df, col_high, col_low, col_open, col_close)
+    with stage('validate'):
+        _validate_merged_data(result_df, col_high, col_low, col_open, col_close)
     
-    plot_merged_kline(result_df, col_dt, col_open, col_high, col_low, col_close, save_plot_path)
+    if plot:
+        with stage('plot'):
+            plot_merged_kline(result_df, col_dt, col_open, col_high, col_low, col_close, save_plot_path)
+    
+    return merged
 
 
 def _validate_merged_data(df, col_high, col_low, col_open, col_close):
     """
-    验证合并后的K线数据：
+    验证合并后的K线数据 (向量化，见 io.validation.validate_ohlc)：
     1. OHLC一致性：low ≤ min(open, close) 且 high ≥ max(open, close)
     2. 无包含关系：相邻K线都是趋势关系
+
+    Returns:
+        ValidationReport: 违规K线的位置索引
     """
-    # 检查OHLC一致性
-    ohlc_violations = []
-    for i, row in df.iterrows():
-        o, h, l, c = row[col_open], row[col_high], row[col_low], row[col_close]
-        if l > min(o, c) or h < max(o, c):
-            ohlc_violations.append(i)
-    
-    if ohlc_violations:
-        print(f"⚠️ OHLC一致性违规: {len(ohlc_violations)} 个")
+    report = validate_ohlc(df, check_inclusion=True, columns=(col_open, col_high, col_low, col_close))
+    
+    if len(report.ohlc_violations):
+        print(f"⚠️ OHLC一致性违规: {len(report.ohlc_violations)} 个")
     else:
         print("✅ OHLC一致性验证通过")
     
-    # 检查相邻K线的包含关系
-    inclusion_count = 0
-    for i in range(1, len(df)):
-        prev = df.iloc[i-1]
-        curr = df.iloc[i]
-        
-        h1, l1 = prev[col_high], prev[col_low]
-        h2, l2 = curr[col_high], curr[col_low]
-        
-        is_inside = (h2 <= h1) and (l2 >= l1)
-        is_outside = (h2 >= h1) and (l2 <= l1)
-        
-        if is_inside or is_outside:
-            inclusion_count += 1
-    
-    if inclusion_count > 0:
-        print(f"⚠️ 发现 {inclusion_count} 对包含关系未处理")
+    if len(report.inclusion_violations):
+        print(f"⚠️ 发现 {len(report.inclusion_violations)} 对包含关系未处理")
     else:
         print("✅ 无包含关系，所有相邻K线都是趋势关系")
+    return report
 
 
-def plot_merged_kline(df, col_dt, col_open, col_high, col_low, col_close, save_path=None):
-    """绘制合并后的 K 线图"""
+def plot_merged_kline(df, col_dt, col_open, col_high, col_low, col_close, save_path=None,
+                      formats=('png',), ax=None):
+    """
+    绘制合并后的 K 线图
+
+    Args:
+        save_path: PNG 保存路径 (SVG 为同名 .svg)，None 则直接显示
+        formats: 保存的格式 ('png' / 'svg')
+        ax: 复用的空白 Axes (见 render.ChartRenderer)，None 则新建 Figure 并在保存后关闭
+    """
     print("\n开始绘制合并后的 K 线图...")
     df[col_dt] = pd.to_datetime(df[col_dt])
     
@@ -338,9 +573,18 @@ def plot_merged_kline(df, col_dt, col_open, col_high, col_low, col_close, save_p
     closes = plot_df[col_close]
     highs = plot_df[col_high]
     lows = plot_df[col_low]
-    status_list = plot_df['kline_status']
+    if COL_BAR_FLAGS in plot_df.columns:
+        merged_mask = has_flag(plot_df[COL_BAR_FLAGS].to_numpy(), BarFlag.MERGED) \
+            & (plot_df[COL_KLINE_CODE].to_numpy() != KlineCode.INITIAL)
+    else:
+        merged_mask = plot_df['kline_status'].astype(str).str.contains("(M)", regex=False).to_numpy()
     
-    fig, ax = plt.subplots(figsize=(14, 8))
+    owned = ax is None
+    if owned:
+        fig, ax = plt.subplots(figsize=(14, 8))
+    else:
+        fig = ax.figure
+        fig.set_size_inches(14, 8)
     
     width = 0.6
     width2 = 0.05
@@ -364,10 +608,8 @@ def plot_merged_kline(df, col_dt, col_open, col_high, col_low, col_close, save_p
     ax.set_xticks(range(0, len(plot_df), step))
     ax.set_xticklabels([d.strftime('%Y-%m-%d') for d in dates[::step]], rotation=45, fontsize=8)
     
-    for i in range(len(plot_df)):
-        status = str(status_list.iloc[i])
-        if "(M)" in status:
-             ax.text(i, highs.iloc[i] * 1.0005, "M", 
+    for i in np.flatnonzero(merged_mask):
+        ax.text(i, highs.iloc[i] * 1.0005, "M", 
                 ha='center', va='bottom',
                 rotation=0, fontsize=8, color='purple', fontweight='bold')
     
@@ -379,8 +621,14 @@ def plot_merged_kline(df, col_dt, col_open, col_high, col_low, col_close, save_p
 
 
     if save_path:
-        plt.savefig(save_path, dpi=150, bbox_inches='tight')
-        print(f"图表已保存至: {save_path}")
-        plt.close()
+        if 'png' in formats:
+            fig.savefig(save_path, dpi=150, bbox_inches='tight')
+            print(f"图表已保存至: {save_path}")
+        if 'svg' in formats:
+            svg_path = save_path.replace('.png', '.svg')
+            fig.savefig(svg_path, format='svg', bbox_inches='tight')
+            print(f"矢量图已保存至: {svg_path}")
+        if owned:
+            plt.close(fig)
     else:
         plt.show()
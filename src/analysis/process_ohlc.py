@@ -4,57 +4,53 @@ analysis/process_ohlc.py
 """
 
 import pandas as pd
-from .kline_logic import classify_k_line_combination
+from .kline_logic import classify_k_line_array
+from .codes import COL_KLINE_CODE, decode_kline_status
 from ..io.schema import OHLCData, COL_DATETIME, COL_HIGH, COL_LOW
 
 
-def add_kline_status(data: OHLCData) -> pd.DataFrame:
+def add_kline_status(data: OHLCData, string_columns: bool = False) -> pd.DataFrame:
     """
     为 OHLC 数据添加 K 线状态标签。
     
     Args:
         data: 标准化的 OHLCData 对象
+        string_columns: 是否同时输出旧版字符串列 'kline_status'
         
     Returns:
-        pd.DataFrame: 添加了 'kline_status' 列的 DataFrame
+        pd.DataFrame: 添加了 'kline_code' (int8, 见 codes.KlineCode) 列的 DataFrame
     """
     df = data.df.copy()
     
     print(f"处理数据: {data.symbol} ({len(df)} 根K线)")
     
-    # 状态列表
-    status_list = ["INITIAL"]  # 第一根没有对比
-    
-    for i in range(1, len(df)):
-        h1 = df.iloc[i-1][COL_HIGH]
-        l1 = df.iloc[i-1][COL_LOW]
-        h2 = df.iloc[i][COL_HIGH]
-        l2 = df.iloc[i][COL_LOW]
-        
-        status = classify_k_line_combination(h1, l1, h2, l2)
-        status_list.append(status.name)
-    
-    df['kline_status'] = status_list
+    # 第一根没有对比，编码为 INITIAL
+    df[COL_KLINE_CODE] = classify_k_line_array(df[COL_HIGH].to_numpy(), df[COL_LOW].to_numpy())
+    status_col = COL_KLINE_CODE
+    if string_columns:
+        df['kline_status'] = decode_kline_status(df[COL_KLINE_CODE].to_numpy())
+        status_col = 'kline_status'
     
     # 打印预览
     print("\n结果预览 (前5行):")
-    print(df[[COL_DATETIME, COL_HIGH, COL_LOW, 'kline_status']].head())
+    print(df[[COL_DATETIME, COL_HIGH, COL_LOW, status_col]].head())
     
     return df
 
 
-def process_and_save(data: OHLCData, output_path: str) -> pd.DataFrame:
+def process_and_save(data: OHLCData, output_path: str, string_columns: bool = False) -> pd.DataFrame:
     """
     处理 OHLC 数据并保存为 CSV。
     
     Args:
         data: 标准化的 OHLCData 对象
         output_path: 输出 CSV 文件路径
+        string_columns: 是否同时输出旧版字符串列 'kline_status'
         
     Returns:
         pd.DataFrame: 处理后的 DataFrame
     """
-    df = add_kline_status(data)
+    df = add_kline_status(data, string_columns=string_columns)
     
     # 保存结果 (使用 UTF-8 编码，更通用)
     df.to_csv(output_path, index=False, encoding='utf-8')
@@ -0,0 +1,443 @@
+"""
+analysis/render.py
+静态图表 (matplotlib PNG/SVG) 渲染，与计算流程分离。
+
+apply_kline_merging / process_strokes 传入 plot=False 时不在计算路径上绘图；调用方把内存中的
+结果打包为 RenderJob，交给 RenderPool 在独立进程中渲染，计算吞吐不再受 matplotlib 限制。
+
+plot_strokes 只画最后 100 根K线 (每根K线 4 个 bar 矩形、每个标记一个 annotate)；
+plot_strokes_full 用 LineCollection / PolyCollection 一次性绘制全部历史，K线多于横向像素时
+先按像素列聚合为高低点区间 (NumPy 分箱)，5 万根以上K线约 1 秒内完成。
+
+ChartRenderer 在每个进程中为每种图表保留一个 Figure，逐品种清空重画；字体每个进程只解析一次。
+
+用法:
+    from src.analysis.render import RenderPool, merged_chart_job, strokes_chart_job, plot_formats
+
+    formats = plot_formats('all')                     # ('png', 'svg')，合并K线图只输出 PNG
+    with RenderPool(max_workers=4) as pool:
+        merged = apply_kline_merging(processed_csv, merged_csv, plot=False)
+        pool.submit(merged_chart_job(merged.df, "output/TL_merged_kline.png", formats))
+        result = process_strokes(merged_csv, strokes_csv, plot=False)
+        pool.submit(strokes_chart_job(merged.df, result, "output/TL_strokes.png", formats))
+    print(pool.files, pool.errors)
+"""
+
+import contextlib
+import functools
+import io
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.collections import LineCollection, PolyCollection
+
+from ..instrument import stage
+from .fractals import StrokeResult, plot_markers, plot_strokes
+from .merging import plot_merged_kline, _detect_columns
+
+
+# --plots 选项与对应的输出格式
+PLOT_MODES: dict[str, tuple[str, ...]] = {
+    'none': (),
+    'png': ('png',),
+    'svg': ('svg',),
+    'all': ('png', 'svg'),
+}
+
+
+def plot_formats(mode: str) -> tuple[str, ...]:
+    """
+    --plots 选项对应的输出格式。
+
+    Raises:
+        ValueError: 未知的选项
+    """
+    if mode not in PLOT_MODES:
+        raise ValueError(f"未知的绘图选项: {mode}，可用: {list(PLOT_MODES)}")
+    return PLOT_MODES[mode]
+
+
+def merged_plot_formats(formats: Sequence[str]) -> tuple[str, ...]:
+    """
+    合并K线图实际输出的格式: 同时要求 PNG 和 SVG 时 (--plots all) 只输出 PNG，与原先的输出文件一致；
+    只要求 SVG 时仍输出 SVG。笔端点标记图不受影响。
+    """
+    return ('png',) if 'png' in formats else tuple(formats)
+
+
+@dataclass
+class RenderJob:
+    """
+    一张静态图表的渲染任务 (可序列化，传给工作进程)。
+
+    Attributes:
+        kind: 'merged' (合并K线图) / 'strokes' (笔端点标记图，最后 100 根) /
+              'strokes_full' (笔端点标记图，全部历史)
+        df: 合并后的K线
+        save_path: PNG 保存路径，SVG 为同名 .svg
+        formats: 输出格式 ('png' / 'svg')
+        strokes: 笔端点 [(idx, 'TOP'/'BOTTOM'), ...] (仅 strokes)
+        markers: plot_markers() 生成的标记列表 (仅 strokes)
+    """
+    kind: str
+    df: pd.DataFrame
+    save_path: str
+    formats: tuple[str, ...]
+    strokes: list = field(default_factory=list)
+    markers: list = field(default_factory=list)
+
+    def output_files(self) -> list[str]:
+        """本任务将生成的文件"""
+        paths = {'png': self.save_path, 'svg': self.save_path.replace('.png', '.svg')}
+        return [paths[fmt] for fmt in self.formats]
+
+
+def merged_chart_job(df: pd.DataFrame, save_path, formats: Sequence[str]) -> RenderJob:
+    """合并K线图的渲染任务 (df 为 MergeResult.df，输出格式见 merged_plot_formats)"""
+    return RenderJob('merged', df, str(save_path), merged_plot_formats(formats))
+
+
+def strokes_chart_job(df: pd.DataFrame, result: StrokeResult, save_path,
+                      formats: Sequence[str], full_history: bool = False) -> RenderJob:
+    """
+    笔端点标记图的渲染任务。
+
+    Args:
+        df: 合并后的K线
+        result: compute_strokes / process_strokes 的结果
+        full_history: True 使用 plot_strokes_full 绘制全部历史，False 只画最后 100 根
+    """
+    return RenderJob('strokes_full' if full_history else 'strokes', df, str(save_path), tuple(formats),
+                     strokes=list(result.strokes), markers=plot_markers(result, len(df)))
+
+
+# 标记样式: 类型 -> (价格取 high/low, 散点形状, 颜色)；按绘制顺序排列，确认的 T/B 画在最上层
+_MARKER_STYLES = {
+    'Tx': ('high', 'v', 'gray'),
+    'Bx': ('low', '^', 'gray'),
+    'Tc': ('high', 'v', 'orange'),
+    'Bc': ('low', '^', 'orange'),
+    'T': ('high', 'v', 'black'),
+    'B': ('low', '^', 'blue'),
+}
+
+
+def _candle_collections(x, opens, highs, lows, closes, width=0.6):
+    """
+    K线的影线 (LineCollection) 和实体 (PolyCollection)，每种各一个 artist。
+
+    Returns:
+        (LineCollection, PolyCollection)
+    """
+    up = closes >= opens
+    colors = np.where(up, 'red', 'green')
+    wicks = LineCollection(np.stack([np.column_stack([x, lows]), np.column_stack([x, highs])], axis=1),
+                           colors=colors, linewidths=0.6)
+    half = width / 2
+    bottom = np.minimum(opens, closes)
+    top = np.maximum(opens, closes)
+    # 每个实体 4 个顶点: 左下、左上、右上、右下
+    verts = np.stack([
+        np.column_stack([x - half, bottom]), np.column_stack([x - half, top]),
+        np.column_stack([x + half, top]), np.column_stack([x + half, bottom]),
+    ], axis=1)
+    bodies = PolyCollection(verts, facecolors=colors, edgecolors=colors, linewidths=0.3)
+    return wicks, bodies
+
+
+def _column_envelope(opens, highs, lows, closes, columns: int):
+    """
+    K线多于像素列时按列聚合: 每列取最高价最大值、最低价最小值，颜色取该列首尾涨跌。
+
+    Returns:
+        (x 中心, highs, lows, up 布尔数组)，长度为 columns
+    """
+    n = len(highs)
+    edges = np.linspace(0, n, columns + 1).astype(np.int64)
+    edges = np.unique(edges)
+    starts = edges[:-1]
+    col_high = np.maximum.reduceat(highs, starts)
+    col_low = np.minimum.reduceat(lows, starts)
+    last = edges[1:] - 1
+    up = closes[last] >= opens[starts]
+    centers = (starts + last) / 2
+    return centers, col_high, col_low, up
+
+
+def plot_strokes_full(df, strokes, all_markers, col_dt, col_open, col_high, col_low, col_close,
+                      save_path=None, formats=('png', 'svg'), label_limit: int = 200,
+                      max_width: float = 40.0, dpi: int = 200, ax=None):
+    """
+    绘制全部历史的笔端点标记图 (集合绘制，适合长序列)。
+
+    与 plot_strokes 的标记含义相同: T/B 为确认的笔端点，Tx/Bx 为被替换的分型，Tc/Bc 为候选分型，
+    B->T 上涨笔用紫色连线。每类标记一次 scatter；价格标签只在 T/B 不超过 label_limit 个时绘制。
+
+    Args:
+        df: 合并后的K线
+        strokes: 笔端点 [(idx, 'TOP'/'BOTTOM'), ...]
+        all_markers: plot_markers() 生成的标记列表
+        save_path: PNG 保存路径 (SVG 为同名 .svg)，None 则直接显示
+        formats: 保存的格式 ('png' / 'svg')
+        label_limit: 绘制价格标签的 T/B 数量上限
+        max_width: 图宽上限 (英寸)
+        dpi: PNG 分辨率
+        ax: 复用的空白 Axes (见 ChartRenderer)，None 则新建 Figure 并在保存后关闭
+    """
+    n = len(df)
+    opens = df[col_open].to_numpy(dtype=np.float64)
+    highs = df[col_high].to_numpy(dtype=np.float64)
+    lows = df[col_low].to_numpy(dtype=np.float64)
+    closes = df[col_close].to_numpy(dtype=np.float64)
+    dates = pd.to_datetime(df[col_dt])
+    x = np.arange(n, dtype=np.float64)
+
+    fig_width = min(max(14, n * 0.12), max_width)
+    owned = ax is None
+    if owned:
+        fig, ax = plt.subplots(figsize=(fig_width, 8))
+    else:
+        fig = ax.figure
+        fig.set_size_inches(fig_width, 8)
+    # 大量图元在 SVG 中栅格化，避免生成几十 MB 的矢量文件
+    rasterize = n > 2_000
+
+    columns = int(fig_width * dpi * 0.8)
+    if n > columns:
+        centers, col_high, col_low, up = _column_envelope(opens, highs, lows, closes, columns)
+        envelope = LineCollection(
+            np.stack([np.column_stack([centers, col_low]), np.column_stack([centers, col_high])], axis=1),
+            colors=np.where(up, 'red', 'green'), linewidths=0.8,
+        )
+        envelope.set_rasterized(rasterize)
+        ax.add_collection(envelope)
+    else:
+        wicks, bodies = _candle_collections(x, opens, highs, lows, closes)
+        for artist in (wicks, bodies):
+            artist.set_rasterized(rasterize)
+            ax.add_collection(artist)
+
+    # 标记: 每类一次 scatter
+    if all_markers:
+        idx = np.fromiter((m[0] for m in all_markers), dtype=np.int64, count=len(all_markers))
+        kinds = np.array([m[1] for m in all_markers])
+        valid = (idx >= 0) & (idx < n)
+        idx, kinds = idx[valid], kinds[valid]
+        for kind, (side, shape, color) in _MARKER_STYLES.items():
+            sel = idx[kinds == kind]
+            if len(sel) == 0:
+                continue
+            prices = highs[sel] if side == 'high' else lows[sel]
+            ax.scatter(sel, prices, marker=shape, s=12, color=color, zorder=3,
+                       rasterized=rasterize, label=kind)
+
+        confirmed = np.isin(kinds, ['T', 'B'])
+        if confirmed.sum() <= label_limit:
+            for i, kind in zip(idx[confirmed].tolist(), kinds[confirmed].tolist()):
+                price = highs[i] if kind == 'T' else lows[i]
+                ax.text(i + 0.3, price * (1.001 if kind == 'T' else 0.998), f'{kind} {price:.2f}',
+                        ha='left', fontsize=7, fontweight='bold',
+                        color='black' if kind == 'T' else 'blue')
+
+    # B->T 上涨笔连线 (一个 LineCollection)
+    ordered = sorted(strokes, key=lambda s: s[0])
+    segments = [
+        ((i1, lows[i1]), (i2, highs[i2]))
+        for (i1, t1), (i2, t2) in zip(ordered, ordered[1:])
+        if t1 == 'BOTTOM' and t2 == 'TOP'
+    ]
+    if segments:
+        ax.add_collection(LineCollection(segments, colors='purple', linewidths=1.2, alpha=0.8, zorder=2))
+
+    ticks = np.unique(np.linspace(0, n - 1, min(n, 20)).astype(np.int64)) if n else np.array([], dtype=np.int64)
+    ax.set_xticks(ticks)
+    ax.set_xticklabels(dates.iloc[ticks].dt.strftime('%Y-%m-%d'), rotation=45, fontsize=8)
+    ax.set_xlim(-1, n)
+    if n:
+        y_min, y_max = lows.min(), highs.max()
+        y_margin = (y_max - y_min) * 0.05
+        ax.set_ylim(y_min - y_margin, y_max + y_margin)
+
+    ax.set_title(f'Stroke Identification - Full History ({n} bars)', fontsize=14)
+    ax.set_ylabel('Price')
+
+    if save_path:
+        if 'png' in formats:
+            fig.savefig(save_path, dpi=dpi, bbox_inches='tight')
+            print(f"图表已保存至: {save_path}")
+        if 'svg' in formats:
+            svg_path = save_path.replace('.png', '.svg')
+            fig.savefig(svg_path, format='svg', bbox_inches='tight', dpi=dpi)
+            print(f"矢量图已保存至: {svg_path}")
+        if owned:
+            plt.close(fig)
+    else:
+        plt.show()
+
+
+# 中文字体候选 (按优先级)，与 merging.py / fractals.py 中的 rcParams 设置一致
+CJK_FONTS = ['SimHei', 'Microsoft YaHei', 'Arial']
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_fonts() -> tuple[str, ...]:
+    """
+    每个进程只解析一次字体: 从候选中保留已安装的字体，其余回退到 matplotlib 默认字体。
+
+    未安装的候选字体每次查找都会重新扫描并打印警告，批量渲染时开销明显。
+
+    Returns:
+        tuple[str, ...]: 设置到 rcParams['font.sans-serif'] 的字体列表
+    """
+    from matplotlib import font_manager
+    installed = {f.name for f in font_manager.fontManager.ttflist}
+    fonts = [name for name in CJK_FONTS if name in installed]
+    fallback = [name for name in plt.rcParamsDefault['font.sans-serif'] if name in installed]
+    resolved = tuple(fonts + [name for name in fallback if name not in fonts])
+    plt.rcParams['font.sans-serif'] = list(resolved)
+    plt.rcParams['axes.unicode_minus'] = False
+    return resolved
+
+
+class ChartRenderer:
+    """
+    批量渲染静态图表时复用 Figure。
+
+    每种图表 (RenderJob.kind) 保留一个 Figure/Axes，渲染下一个品种前清空 Axes 上的图元后重画，
+    不再为每个品种创建和销毁 Figure；字体在构造时解析一次 (resolve_fonts)。
+    """
+
+    def __init__(self):
+        resolve_fonts()
+        self._axes = {}
+
+    def axes(self, kind: str):
+        """该类图表的空白 Axes (首次调用时创建 Figure)"""
+        ax = self._axes.get(kind)
+        if ax is None:
+            _, ax = plt.subplots()
+            self._axes[kind] = ax
+        else:
+            ax.clear()
+        return ax
+
+    def render(self, job: RenderJob) -> list[str]:
+        """
+        渲染一个任务。
+
+        Returns:
+            list[str]: 生成的文件
+        """
+        if not job.formats:
+            return []
+        columns = _detect_columns(job.df)
+        # 绘图函数会修改 datetime 列，使用副本避免影响调用方的数据
+        df = job.df.copy()
+        ax = self.axes(job.kind)
+        with contextlib.redirect_stdout(io.StringIO()):
+            if job.kind == 'merged':
+                plot_merged_kline(df, *columns, save_path=job.save_path, formats=job.formats, ax=ax)
+            elif job.kind == 'strokes':
+                plot_strokes(df, job.strokes, job.markers, *columns,
+                             save_path=job.save_path, formats=job.formats, ax=ax)
+            elif job.kind == 'strokes_full':
+                plot_strokes_full(df, job.strokes, job.markers, *columns,
+                                  save_path=job.save_path, formats=job.formats, ax=ax)
+            else:
+                raise ValueError(f"未知的图表类型: {job.kind}")
+        return job.output_files()
+
+    def close(self) -> None:
+        """关闭保留的 Figure"""
+        for ax in self._axes.values():
+            plt.close(ax.figure)
+        self._axes = {}
+
+
+# 每个进程 (主进程或渲染工作进程) 一个 ChartRenderer
+_renderer: Optional[ChartRenderer] = None
+
+
+def render(job: RenderJob) -> list[str]:
+    """
+    在当前进程的 ChartRenderer 中渲染一个任务 (工作进程或同步渲染时调用)。
+
+    Returns:
+        list[str]: 生成的文件
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = ChartRenderer()
+    return _renderer.render(job)
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+class RenderPool:
+    """
+    静态图表渲染池。
+
+    max_workers 为 0 时在当前进程中同步渲染 (计入当前计量记录的 render 阶段)；
+    否则在 ProcessPoolExecutor 中异步渲染。单个任务失败不影响其他任务，错误记录在 errors 中。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: 渲染进程数，None 表示 min(4, CPU 核数)，0 表示在当前进程同步渲染
+        """
+        if max_workers is None:
+            max_workers = min(4, os.cpu_count() or 1)
+        self.max_workers = max_workers
+        self._executor = None
+        self._pending: list[tuple[RenderJob, Future]] = []
+        self.files: list[str] = []
+        self.errors: list[tuple[str, str]] = []
+
+    def submit(self, job: RenderJob) -> None:
+        """提交渲染任务 (formats 为空时忽略)"""
+        if not job.formats:
+            return
+        if self.max_workers <= 0:
+            try:
+                with stage('render'):
+                    self.files += render(job)
+            except Exception as e:
+                self.errors.append((job.save_path, f"{type(e).__name__}: {e}"))
+            return
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker)
+        self._pending.append((job, self._executor.submit(render, job)))
+
+    def wait(self) -> list[str]:
+        """等待已提交的任务全部完成，返回本次完成的文件"""
+        done = []
+        for job, future in self._pending:
+            try:
+                done += future.result()
+            except Exception as e:
+                self.errors.append((job.save_path, f"{type(e).__name__}: {e}"))
+        self._pending = []
+        self.files += done
+        return done
+
+    def close(self) -> None:
+        """等待所有任务完成并关闭工作进程"""
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,175 @@
+"""
+analysis/screener.py
+品种池筛选: 一次计算所有品种的最新笔状态，汇总为一张表。
+
+每个品种一行 (K线位置均为合并K线):
+    - 最后一个笔端点 (T/B): 类型、时间、价格、距今K线数
+    - 当前候选分型 (Tc/Bc): 类型、时间、价格、距今K线数 (以右肩K线计)
+    - 最新 H/L 信号: 标签 (如 H2)、时间、距今K线数 (与回测的 H/L 信号相同，见 signals.causal_events)
+
+用法:
+    from src.analysis.screener import screen_universe, filter_recent
+
+    table = screen_universe(Path("data/raw").glob("*.xlsx"), max_workers=8)
+    filter_recent(table, bars=0)      # 最新一根K线出现新候选 / 新端点 / 新信号的品种
+"""
+
+import contextlib
+import io
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from ..io import OHLCData, load_ohlc
+from .fractals import StrokeRules, compute_strokes, stroke_events, _detect_columns
+from .merging import merge_kline_bars
+from .signals import causal_events, compute_setups
+
+
+SCREEN_COLUMNS = [
+    'symbol', 'name', 'bars', 'merged_bars', 'last_datetime', 'last_close',
+    'endpoint', 'endpoint_datetime', 'endpoint_price', 'bars_since_endpoint',
+    'candidate', 'candidate_datetime', 'candidate_price', 'bars_since_candidate',
+    'setup', 'setup_datetime', 'bars_since_setup',
+    'file', 'error',
+]
+
+# 距今K线数列 (filter_recent 使用)
+AGE_COLUMNS = ('bars_since_endpoint', 'bars_since_candidate', 'bars_since_setup')
+
+
+def screen_symbol(data: OHLCData, rules: Optional[StrokeRules] = None) -> dict:
+    """
+    计算单个品种的最新笔状态。
+
+    Args:
+        data: 原始K线数据
+        rules: 笔过滤规则，None 表示默认规则
+
+    Returns:
+        dict: SCREEN_COLUMNS 中的字段，没有对应状态的字段为空字符串 / NaN / -1
+    """
+    row = dict.fromkeys(SCREEN_COLUMNS, '')
+    row.update(symbol=data.symbol, name=data.name, bars=len(data.df))
+    df = merge_kline_bars(data.df).df
+    n = len(df)
+    row['merged_bars'] = n
+    if n == 0:
+        return row
+
+    col_dt, _, col_high, col_low, col_close = _detect_columns(df)
+    datetimes = pd.to_datetime(df[col_dt])
+    highs = df[col_high].to_numpy(dtype=np.float64)
+    lows = df[col_low].to_numpy(dtype=np.float64)
+    closes = df[col_close].to_numpy(dtype=np.float64)
+    row['last_datetime'] = datetimes.iloc[-1]
+    row['last_close'] = closes[-1]
+
+    def price(idx, f_type):
+        return highs[idx] if f_type == 'TOP' else lows[idx]
+
+    result = compute_strokes(highs, lows, rules)
+    row.update(endpoint_price=np.nan, bars_since_endpoint=-1,
+               candidate_price=np.nan, bars_since_candidate=-1, bars_since_setup=-1)
+    if result.strokes:
+        idx, f_type = result.strokes[-1]
+        row.update(endpoint=f_type[0], endpoint_datetime=datetimes.iloc[idx],
+                   endpoint_price=price(idx, f_type), bars_since_endpoint=n - 1 - idx)
+    if result.current_candidate is not None:
+        idx, f_type = result.current_candidate
+        shown = min(idx + 1, n - 1)
+        row.update(candidate=f_type[0] + 'c', candidate_datetime=datetimes.iloc[shown],
+                   candidate_price=price(idx, f_type), bars_since_candidate=n - 1 - shown)
+
+    events = stroke_events(result, datetimes, highs, lows)
+    bars = pd.DataFrame({'high': highs, 'low': lows, 'close': closes})
+    # 与回测一致: 当前候选在分型K线上的显示行不作为信号K线
+    setups = compute_setups(bars, causal_events(events))
+    if len(setups):
+        idx = int(setups.bar_idx[-1])
+        row.update(setup=setups.labels[-1], setup_datetime=datetimes.iloc[idx], bars_since_setup=n - 1 - idx)
+    return row
+
+
+def _screen_file(path: str, rules: Optional[StrokeRules], verbose: bool) -> dict:
+    """工作进程: 加载并筛选单个文件，失败时记录错误而不中断整个品种池"""
+    try:
+        with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+            data = load_ohlc(path)
+        row = screen_symbol(data, rules)
+    except Exception as e:
+        row = dict.fromkeys(SCREEN_COLUMNS, '')
+        row.update(symbol=Path(path).stem, error=f"{type(e).__name__}: {e}")
+    row['file'] = Path(path).name
+    return row
+
+
+def screen_universe(
+    paths: Iterable[Union[str, Path]],
+    rules: Optional[StrokeRules] = None,
+    max_workers: Optional[int] = None,
+    verbose: bool = False,
+) -> pd.DataFrame:
+    """
+    对整个品种池计算最新笔状态 (不写中间文件、不绘图)。
+
+    Args:
+        paths: 原始数据文件路径 (xlsx/csv)
+        rules: 笔过滤规则，None 表示默认规则
+        max_workers: 并行进程数 (按品种分配)，None 或 1 表示串行
+        verbose: 是否保留加载器的输出
+
+    Returns:
+        pd.DataFrame: 列为 SCREEN_COLUMNS，按 symbol 排序
+    """
+    paths = [str(p) for p in paths]
+    if max_workers is None or max_workers <= 1:
+        rows = [_screen_file(p, rules, verbose) for p in paths]
+    else:
+        chunksize = max(1, len(paths) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            rows = list(executor.map(_screen_file, paths, itertools.repeat(rules),
+                                     itertools.repeat(verbose), chunksize=chunksize))
+
+    table = pd.DataFrame(rows, columns=SCREEN_COLUMNS)
+    for col in ('bars', 'merged_bars', *AGE_COLUMNS):
+        table[col] = pd.to_numeric(table[col], errors='coerce').fillna(-1).astype(np.int64)
+    for col in ('last_close', 'endpoint_price', 'candidate_price'):
+        table[col] = pd.to_numeric(table[col], errors='coerce')
+    for col in ('last_datetime', 'endpoint_datetime', 'candidate_datetime', 'setup_datetime'):
+        table[col] = pd.to_datetime(table[col].replace('', None))
+    return table.sort_values('symbol', kind='stable').reset_index(drop=True)
+
+
+def filter_recent(table: pd.DataFrame, bars: int = 0,
+                  kinds: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    筛选最近 bars 根K线内出现新端点、新候选或新 H/L 信号的品种，按最近事件排序。
+
+    Args:
+        table: screen_universe() 的结果
+        bars: 距今K线数上限 (0 = 仅最新一根K线)
+        kinds: 只看指定事件类型，如 ['Tc', 'Bc'] / ['T', 'B'] / ['H', 'L']，None 表示全部
+
+    Returns:
+        pd.DataFrame: 附带 bars_since_event 列 (所选事件中最近一个的距今K线数)
+    """
+    ages = []
+    for col, kind_col in zip(AGE_COLUMNS, ('endpoint', 'candidate', 'setup')):
+        age = table[col].where(table[col] >= 0)
+        if kinds is not None:
+            kind = table[kind_col].astype(str)
+            matched = kind.isin(kinds)
+            if kind_col == 'setup':
+                # H/L 信号按字母匹配 (H1, H2 ... 均属 H)
+                matched |= kind.str[:1].isin(kinds)
+            age = age.where(matched)
+        ages.append(age)
+    recent = pd.concat(ages, axis=1).min(axis=1)
+    out = table.assign(bars_since_event=recent)
+    out = out[out['bars_since_event'] <= bars].astype({'bars_since_event': np.int64})
+    return out.sort_values(['bars_since_event', 'symbol'], kind='stable').reset_index(drop=True)
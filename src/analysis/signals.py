@@ -0,0 +1,228 @@
+"""
+analysis/signals.py
+H/L 入场信号 (H1, H2 ... / L1, L2 ...) 的计算模块。
+
+信号来自候选分型标记 (Tc/Bc，位于右肩信号K线)：
+    - Bc → H 信号 (买入): 信号K线强势 (收盘在顶部 1/3)，或下一根K线 high 与 close 均高于信号K线
+    - Tc → L 信号 (卖出): 信号K线强势 (收盘在底部 1/3)，或下一根K线 low 与 close 均低于信号K线
+    - 间距过滤: 同向信号与上一个同向信号至少间隔 2 根K线
+    - 互斥重置: 触发 H 信号时 L 计数归零，反之亦然
+
+强势判断与突破确认在候选数组上向量化计算，只有计数递推保留为循环。
+
+用法:
+    from src.analysis.signals import compute_setups
+
+    setups = compute_setups(merged_df, events)   # events: stroke_events() 的输出
+    setups = compute_setups(merged_df, causal_events(events))   # 回测/筛选: 不含当前候选在分型K线上的显示行
+    setups.to_frame()                            # bar_idx, side, count, strong, label
+"""
+
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+# 强势信号K线: 收盘位置 (close - low) / (high - low) 的阈值
+STRONG_TOP_POS = 0.33
+STRONG_BOTTOM_POS = 0.66
+
+# 同向信号的最小间隔 (K线根数)
+MIN_SETUP_GAP = 2
+
+
+class SetupSide(IntEnum):
+    """信号方向，与分型方向相反 (底分型产生买入信号)"""
+    BUY = 1     # H 信号 (来自 Bc)
+    SELL = -1   # L 信号 (来自 Tc)
+
+
+@dataclass
+class SetupSignals:
+    """
+    H/L 信号 (列式数组)，按 bar_idx 升序，所有数组等长。
+
+    Attributes:
+        bar_idx: 信号K线位置 (int32)
+        side: 信号方向，1 = H (买入)，-1 = L (卖出) (int8)
+        count: 同向计数，H1 为 1、H2 为 2 ... (int16)
+        strong: 是否由强势信号K线触发 (否则为下一根K线突破确认) (bool)
+    """
+    bar_idx: np.ndarray
+    side: np.ndarray
+    count: np.ndarray
+    strong: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.bar_idx)
+
+    @property
+    def labels(self) -> np.ndarray:
+        """标签数组，如 'H1', 'L2'"""
+        prefix = np.where(self.side == SetupSide.BUY, 'H', 'L').astype(object)
+        return prefix + self.count.astype(str).astype(object)
+
+    def to_frame(self) -> pd.DataFrame:
+        """转换为 DataFrame，附带 label 列"""
+        return pd.DataFrame({
+            'bar_idx': self.bar_idx,
+            'side': self.side,
+            'count': self.count,
+            'strong': self.strong,
+            'label': self.labels,
+        })
+
+
+def setup_candidates(markers: Union[pd.DataFrame, list], n: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    从标记中取出候选分型 (Tc/Bc)，去重并按位置排序。
+
+    Args:
+        markers: 笔事件表 (stroke_events 的输出)，或标记元组列表 [(bar_idx, kind, ...), ...]
+        n: K线数量，超出 [0, n) 的标记被忽略
+
+    Returns:
+        tuple: (bar_idx int64 数组, is_top bool 数组)
+    """
+    if isinstance(markers, pd.DataFrame):
+        bar_idx = markers['bar_idx'].to_numpy(dtype=np.int64)
+        kinds = markers['kind'].to_numpy(dtype=object)
+    elif len(markers):
+        bar_idx = np.array([m[0] for m in markers], dtype=np.int64)
+        kinds = np.array([m[1] for m in markers], dtype=object)
+    else:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+
+    kinds = kinds.astype(str)
+    keep = (np.char.find(kinds, 'c') >= 0) & (bar_idx >= 0) & (bar_idx < n)
+    is_top = np.char.startswith(kinds[keep], 'T')
+    # 同一位置同一类型只保留一个: 按 (bar_idx, 类型) 去重，结果按 bar_idx 排序
+    pairs = np.unique(np.stack([bar_idx[keep], is_top.astype(np.int64)], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1].astype(bool)
+
+
+def causal_events(events: pd.DataFrame) -> pd.DataFrame:
+    """
+    去掉当前候选在分型K线上的显示行 (bar_idx == fractal_idx)，只保留入场时已经成立的标记。
+
+    stroke_events 为当前候选另在分型K线上记录一行 (与图表一致)，但该分型要到右肩K线收盘才成立，
+    不能作为信号K线。回测与品种池筛选先经过此函数，二者的最新 H/L 信号才一致。
+
+    Args:
+        events: 笔事件表 (stroke_events 的输出)
+    """
+    return events[events['bar_idx'] > events['fractal_idx']]
+
+
+def strong_signal_mask(highs, lows, closes, bar_idx, is_top) -> np.ndarray:
+    """
+    信号K线是否强势: 顶分型收盘在底部 1/3，底分型收盘在顶部 1/3 (零振幅K线不算强势)。
+    """
+    h = np.asarray(highs, dtype=np.float64)[bar_idx]
+    l = np.asarray(lows, dtype=np.float64)[bar_idx]
+    c = np.asarray(closes, dtype=np.float64)[bar_idx]
+    rng = h - l
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pos = (c - l) / rng
+    return (rng > 0) & np.where(is_top, pos < STRONG_TOP_POS, pos > STRONG_BOTTOM_POS)
+
+
+def breakout_mask(highs, lows, closes, bar_idx, is_top) -> np.ndarray:
+    """
+    下一根K线是否突破确认: 顶分型要求 next low < low 且 next close < close，
+    底分型要求 next high > high 且 next close > close。最后一根K线没有下一根，不确认。
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    closes = np.asarray(closes, dtype=np.float64)
+    nxt = bar_idx + 1
+    has_next = nxt < len(highs)
+    nxt = np.minimum(nxt, len(highs) - 1)
+    down = (lows[nxt] < lows[bar_idx]) & (closes[nxt] < closes[bar_idx])
+    up = (highs[nxt] > highs[bar_idx]) & (closes[nxt] > closes[bar_idx])
+    return has_next & np.where(is_top, down, up)
+
+
+def count_setups(bar_idx, is_top, triggered, start: Optional[tuple] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    对已触发的候选做计数递推 (间距过滤 + 互斥重置)。
+
+    Args:
+        start: 可选，递推的初始状态 (h_count, l_count, last_h_idx, last_l_idx)，
+               用于在已有信号之后续算；None 表示从头开始，见 setup_state()
+
+    Returns:
+        tuple: (保留的候选下标 int64 数组, 对应计数 int16 数组)
+    """
+    keep, counts = [], []
+    h_count, l_count, last_h_idx, last_l_idx = start or (0, 0, -999, -999)
+    for i in np.flatnonzero(triggered).tolist():
+        idx = int(bar_idx[i])
+        if is_top[i]:
+            if idx - last_l_idx < MIN_SETUP_GAP:
+                continue
+            l_count += 1
+            last_l_idx = idx
+            h_count = 0
+            counts.append(l_count)
+        else:
+            if idx - last_h_idx < MIN_SETUP_GAP:
+                continue
+            h_count += 1
+            last_h_idx = idx
+            l_count = 0
+            counts.append(h_count)
+        keep.append(i)
+    return np.array(keep, dtype=np.int64), np.array(counts, dtype=np.int16)
+
+
+def setup_state(setups: SetupSignals, stop: int) -> tuple:
+    """
+    前 stop 个信号之后的计数递推状态，传给 count_setups(start=...) 以续算之后的候选。
+
+    Returns:
+        tuple: (h_count, l_count, last_h_idx, last_l_idx)
+    """
+    side = setups.side[:stop]
+    buys = np.flatnonzero(side == SetupSide.BUY)
+    sells = np.flatnonzero(side == SetupSide.SELL)
+    last_h_idx = int(setups.bar_idx[buys[-1]]) if len(buys) else -999
+    last_l_idx = int(setups.bar_idx[sells[-1]]) if len(sells) else -999
+    if not stop:
+        return 0, 0, last_h_idx, last_l_idx
+    # 最后一个信号把另一方向的计数归零
+    count = int(setups.count[stop - 1])
+    if side[-1] == SetupSide.BUY:
+        return count, 0, last_h_idx, last_l_idx
+    return 0, count, last_h_idx, last_l_idx
+
+
+def compute_setups(df: pd.DataFrame, markers: Union[pd.DataFrame, list]) -> SetupSignals:
+    """
+    计算 H/L 信号。
+
+    Args:
+        df: K线数据 (需包含 high / low / close 列，位置与标记的 bar_idx 对应)
+        markers: 笔事件表 (stroke_events 的输出)，或标记元组列表
+
+    Returns:
+        SetupSignals
+    """
+    highs = df['high'].to_numpy(dtype=np.float64)
+    lows = df['low'].to_numpy(dtype=np.float64)
+    closes = df['close'].to_numpy(dtype=np.float64)
+    bar_idx, is_top = setup_candidates(markers, len(df))
+
+    strong = strong_signal_mask(highs, lows, closes, bar_idx, is_top)
+    triggered = strong | breakout_mask(highs, lows, closes, bar_idx, is_top)
+    keep, counts = count_setups(bar_idx, is_top, triggered)
+
+    return SetupSignals(
+        bar_idx=bar_idx[keep].astype(np.int32),
+        side=np.where(is_top[keep], SetupSide.SELL, SetupSide.BUY).astype(np.int8),
+        count=counts,
+        strong=strong[keep],
+    )
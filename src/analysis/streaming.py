@@ -0,0 +1,218 @@
+"""
+analysis/streaming.py
+增量 (流式) 计算器：每根新K线 O(1) 更新，结果与批量函数一致。
+
+    EMAState          ↔ indicators.compute_ema              (pandas ewm(span, adjust=False))
+    SMAState          ↔ indicators.compute_sma              (rolling mean)
+    BollingerState    ↔ indicators.compute_bollinger_bands  (rolling mean ± k * rolling std, ddof=1)
+    BarClassifier     ↔ kline_logic.classify_k_line_array   (KlineCode)
+    LiveIndicators    组合以上计算器，逐根K线输出一行结果
+
+实时图表 (analysis/live.py 的 LiveFeed) 用 EMAState 计算 EMA: 合并K线的末尾可能被回溯修改，
+LiveFeed 保存每根合并K线的 EMA 值，从第一根变化的K线前一根的值续算 (EMAState 的 value / count 即完整状态)。
+LiveIndicators 面向只追加、不修改历史的逐K线行情 (如行情回调中逐根计算并写出一行)，
+组合状态无法回退到更早的K线，因此不用于 LiveFeed。
+
+SMA / 布林带使用定长环形缓冲区和滑动和、平方和；为避免浮点误差随时间累积，
+每经过 RESYNC_INTERVAL 次更新用缓冲区重新求和一次 (均摊 O(1))。
+输入价格不应包含 NaN。
+
+用法:
+    from src.analysis.streaming import LiveIndicators
+
+    live = LiveIndicators(ema_periods=(20,), bollinger=(20, 2.0))
+    for bar in feed:
+        row = live.update(bar.high, bar.low, bar.close)
+        # row: {'kline_code': 1, 'ema20': ..., 'bb_upper': ..., 'bb_middle': ..., 'bb_lower': ...}
+"""
+
+import math
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .codes import KlineCode
+
+
+# 滑动和重新求和的间隔 (更新次数)
+RESYNC_INTERVAL = 4096
+
+
+class EMAState:
+    """
+    指数移动平均的增量状态，等价于 Series.ewm(span=period, adjust=False).mean()。
+
+    首个值为第一根K线的价格，之后 ema = alpha * x + (1 - alpha) * ema，alpha = 2 / (period + 1)。
+    """
+
+    def __init__(self, period: int):
+        if period < 1:
+            raise ValueError(f"period 必须 ≥ 1，当前: {period}")
+        self.period = period
+        self.alpha = 2.0 / (period + 1.0)
+        self.value = math.nan
+        self.count = 0
+
+    def update(self, x: float) -> float:
+        """加入一个新值，返回当前 EMA"""
+        if self.count == 0:
+            self.value = float(x)
+        else:
+            self.value = self.alpha * x + (1.0 - self.alpha) * self.value
+        self.count += 1
+        return self.value
+
+
+class RollingWindow:
+    """
+    定长环形缓冲区，维护窗口内的和与平方和。
+
+    为降低大数相减的误差，和与平方和按首个值平移后累计 (方差与平移无关)。
+    """
+
+    def __init__(self, period: int):
+        if period < 1:
+            raise ValueError(f"period 必须 ≥ 1，当前: {period}")
+        self.period = period
+        self.buffer = np.zeros(period, dtype=np.float64)
+        self.count = 0          # 累计加入的值数量
+        self._pos = 0           # 下一个写入位置
+        self._shift = 0.0
+        self._sum = 0.0         # 窗口内 (x - shift) 之和
+        self._sumsq = 0.0       # 窗口内 (x - shift)^2 之和
+        self._since_resync = 0
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.period
+
+    def push(self, x: float) -> None:
+        """加入一个新值 (窗口已满时挤出最早的值)"""
+        if self.count == 0:
+            self._shift = float(x)
+        d = float(x) - self._shift
+        if self.full:
+            old = self.buffer[self._pos]
+            self._sum -= old
+            self._sumsq -= old * old
+        self.buffer[self._pos] = d
+        self._sum += d
+        self._sumsq += d * d
+        self._pos = (self._pos + 1) % self.period
+        self.count += 1
+
+        self._since_resync += 1
+        if self._since_resync >= RESYNC_INTERVAL:
+            self._resync()
+
+    def _resync(self):
+        values = self.buffer if self.full else self.buffer[:self.count]
+        self._sum = float(values.sum())
+        self._sumsq = float(np.dot(values, values))
+        self._since_resync = 0
+
+    def mean(self) -> float:
+        """窗口均值，窗口未满返回 NaN"""
+        if not self.full:
+            return math.nan
+        return self._shift + self._sum / self.period
+
+    def std(self) -> float:
+        """窗口样本标准差 (ddof=1)，窗口未满或 period=1 返回 NaN"""
+        if not self.full or self.period < 2:
+            return math.nan
+        n = self.period
+        var = (self._sumsq - self._sum * self._sum / n) / (n - 1)
+        return math.sqrt(var) if var > 0.0 else 0.0
+
+
+class SMAState:
+    """简单移动平均的增量状态，等价于 Series.rolling(window=period).mean()"""
+
+    def __init__(self, period: int):
+        self.window = RollingWindow(period)
+
+    def update(self, x: float) -> float:
+        """加入一个新值，返回当前 SMA (前 period-1 根为 NaN)"""
+        self.window.push(x)
+        return self.window.mean()
+
+
+class BollingerState:
+    """布林带的增量状态，等价于 compute_bollinger_bands (中轨 SMA ± std_dev * 样本标准差)"""
+
+    def __init__(self, period: int = 20, std_dev: float = 2.0):
+        self.window = RollingWindow(period)
+        self.std_dev = std_dev
+
+    def update(self, x: float) -> tuple[float, float, float]:
+        """加入一个新值，返回 (upper, middle, lower)，前 period-1 根为 NaN"""
+        self.window.push(x)
+        middle = self.window.mean()
+        width = self.window.std() * self.std_dev
+        return middle + width, middle, middle - width
+
+
+class BarClassifier:
+    """相邻K线关系的增量分类，等价于 classify_k_line_array (首根为 INITIAL)"""
+
+    def __init__(self):
+        self.prev_high: Optional[float] = None
+        self.prev_low: Optional[float] = None
+
+    def update(self, high: float, low: float) -> int:
+        """加入一根K线，返回 KlineCode 编码"""
+        h1, l1 = self.prev_high, self.prev_low
+        self.prev_high, self.prev_low = high, low
+        if h1 is None:
+            return int(KlineCode.INITIAL)
+        if high > h1 and low > l1:
+            return int(KlineCode.TREND_UP)
+        if high < h1 and low < l1:
+            return int(KlineCode.TREND_DOWN)
+        if high <= h1 and low >= l1:
+            return int(KlineCode.INSIDE)
+        return int(KlineCode.OUTSIDE)
+
+
+class LiveIndicators:
+    """
+    实时行情的逐K线计算: K线关系分类 + EMA / SMA / 布林带。
+
+    输出列名与流水线一致: kline_code, ema{period}, sma{period}, bb_upper / bb_middle / bb_lower。
+    """
+
+    def __init__(self, ema_periods: Sequence[int] = (20,), sma_periods: Sequence[int] = (),
+                 bollinger: Optional[tuple[int, float]] = None, column: str = 'close'):
+        """
+        Args:
+            ema_periods: EMA 周期
+            sma_periods: SMA 周期
+            bollinger: (周期, 标准差倍数)，None 表示不计算布林带
+            column: 指标使用的价格 ('open' / 'high' / 'low' / 'close')
+        """
+        self.column = column
+        self.classifier = BarClassifier()
+        self.emas = {f"ema{p}": EMAState(p) for p in ema_periods}
+        self.smas = {f"sma{p}": SMAState(p) for p in sma_periods}
+        self.bollinger = BollingerState(*bollinger) if bollinger else None
+
+    def update(self, high: float, low: float, close: float, open: Optional[float] = None) -> dict:
+        """
+        加入一根K线，返回该K线的计算结果。
+
+        Returns:
+            dict: {'kline_code': int, 'ema20': float, ...}
+        """
+        prices = {'open': open, 'high': high, 'low': low, 'close': close}
+        x = prices[self.column]
+        if x is None:
+            raise ValueError(f"指标列 '{self.column}' 缺少价格")
+        row = {'kline_code': self.classifier.update(high, low)}
+        for name, state in self.emas.items():
+            row[name] = state.update(x)
+        for name, state in self.smas.items():
+            row[name] = state.update(x)
+        if self.bollinger is not None:
+            row['bb_upper'], row['bb_middle'], row['bb_lower'] = self.bollinger.update(x)
+        return row
@@ -0,0 +1,228 @@
+"""
+analysis/sweep.py
+笔过滤参数扫描模块。
+
+K 线合并与原始分型识别与过滤规则无关，只需计算一次；
+随后对多组 StrokeRules (MIN_DIST 及其他规则开关) 重复执行笔过滤，可选多进程并行。
+
+用法:
+    from src.io import load_ohlc
+    from src.analysis.sweep import prepare_bars, rules_grid, sweep_strokes, sweep_summary
+
+    prepared = prepare_bars(load_ohlc("data/raw/TL.CFE.xlsx"))
+    results = sweep_strokes(prepared, rules_grid(min_dist=[3, 4, 5]))
+    print(sweep_summary(results))
+
+    # 整个品种池: 每个品种在一个进程内完成合并 + 全部参数
+    universe = sweep_universe(Path("data/raw").glob("*.xlsx"), rules_grid(min_dist=[3, 4]), max_workers=8)
+"""
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from ..io import OHLCData, load_ohlc
+from .fractals import MIN_DIST, StrokeResult, StrokeRules, filter_strokes, find_raw_fractals, _detect_columns
+from .merging import merge_kline_bars
+
+
+@dataclass
+class PreparedBars:
+    """
+    参数扫描的共享输入：合并后的高低点序列和原始分型。
+
+    Attributes:
+        symbol: 资产代码
+        highs: 合并K线最高价 (float64)
+        lows: 合并K线最低价 (float64)
+        raw_fractals: 原始分型 ('', 'TOP', 'BOTTOM')
+        merge_count: 合并次数 (输入已是合并数据时为 0)
+    """
+    symbol: str
+    highs: np.ndarray
+    lows: np.ndarray
+    raw_fractals: list
+    merge_count: int = 0
+
+
+def prepare_bars(
+    source: Union[OHLCData, pd.DataFrame],
+    merged: bool = False,
+    symbol: str = "",
+) -> PreparedBars:
+    """
+    合并 K 线并识别原始分型 (每个品种只需调用一次)。
+
+    Args:
+        source: OHLCData 或 DataFrame
+        merged: source 是否已经是合并后的 K 线 (如 *_merged.csv)，是则跳过合并
+        symbol: 资产代码，source 为 OHLCData 时默认取其 symbol
+
+    Returns:
+        PreparedBars: 可重复用于多组规则的共享输入
+    """
+    if isinstance(source, OHLCData):
+        symbol = symbol or source.symbol
+        df = source.df
+    else:
+        df = source
+
+    merge_count = 0
+    if not merged:
+        merge_result = merge_kline_bars(df)
+        df = merge_result.df
+        merge_count = merge_result.merge_count
+
+    _, _, col_high, col_low, _ = _detect_columns(df)
+    highs = df[col_high].to_numpy(dtype=np.float64)
+    lows = df[col_low].to_numpy(dtype=np.float64)
+    return PreparedBars(
+        symbol=symbol,
+        highs=highs,
+        lows=lows,
+        raw_fractals=find_raw_fractals(highs, lows),
+        merge_count=merge_count,
+    )
+
+
+def rules_grid(
+    min_dist: Iterable[int] = (MIN_DIST,),
+    validate_extreme: Iterable[bool] = (True,),
+    check_replace_dist: Iterable[bool] = (True,),
+) -> list[StrokeRules]:
+    """
+    生成规则参数网格 (笛卡尔积)。
+
+    Example:
+        >>> rules_grid(min_dist=[3, 4], validate_extreme=[True, False])  # 4 组规则
+    """
+    return [
+        StrokeRules(min_dist=d, validate_extreme=v, check_replace_dist=c)
+        for d, v, c in itertools.product(min_dist, validate_extreme, check_replace_dist)
+    ]
+
+
+# 工作进程内共享的输入 (通过 initializer 每个进程只传输一次)
+_worker_prepared: Optional[PreparedBars] = None
+
+
+def _init_worker(prepared: PreparedBars) -> None:
+    global _worker_prepared
+    _worker_prepared = prepared
+
+
+def _filter_in_worker(rules: StrokeRules) -> StrokeResult:
+    p = _worker_prepared
+    return filter_strokes(p.highs, p.lows, p.raw_fractals, rules)
+
+
+def sweep_strokes(
+    prepared: PreparedBars,
+    grid: Iterable[StrokeRules],
+    max_workers: Optional[int] = None,
+) -> dict[StrokeRules, StrokeResult]:
+    """
+    对同一品种运行多组笔过滤规则。
+
+    Args:
+        prepared: prepare_bars() 的结果
+        grid: 规则列表，见 rules_grid()
+        max_workers: 并行进程数，None 或 1 表示在当前进程串行执行
+
+    Returns:
+        dict: {StrokeRules: StrokeResult}，顺序与 grid 一致
+    """
+    grid = list(grid)
+    if max_workers is None or max_workers <= 1 or len(grid) <= 1:
+        return {
+            rules: filter_strokes(prepared.highs, prepared.lows, prepared.raw_fractals, rules)
+            for rules in grid
+        }
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(prepared,)) as executor:
+        return dict(zip(grid, executor.map(_filter_in_worker, grid)))
+
+
+def _sweep_file(path: str, grid: list[StrokeRules]) -> dict[StrokeRules, StrokeResult]:
+    """工作进程: 加载单个文件，合并一次，运行全部规则"""
+    return sweep_strokes(prepare_bars(load_ohlc(path)), grid)
+
+
+def sweep_universe(
+    paths: Iterable[Union[str, Path]],
+    grid: Iterable[StrokeRules],
+    max_workers: Optional[int] = None,
+) -> dict[str, dict[StrokeRules, StrokeResult]]:
+    """
+    对整个品种池做参数扫描，每个品种的合并与原始分型只计算一次。
+
+    结果按文件名索引 (同一资产代码可能有多个数据文件，如 TL.CFE.xlsx 与 TL_CFE.xlsx)。
+
+    Args:
+        paths: 原始数据文件路径 (xlsx/csv)
+        grid: 规则列表
+        max_workers: 并行进程数 (按品种分配)，None 或 1 表示串行
+
+    Returns:
+        dict: {文件名: {StrokeRules: StrokeResult}}
+
+    Raises:
+        ValueError: 不同目录下有同名文件
+    """
+    paths = [str(p) for p in paths]
+    names = [Path(p).name for p in paths]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"文件名重复: {', '.join(duplicates)}")
+    grid = list(grid)
+    if max_workers is None or max_workers <= 1:
+        return {name: _sweep_file(p, grid) for name, p in zip(names, paths)}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(names, executor.map(_sweep_file, paths, itertools.repeat(grid))))
+
+
+def sweep_summary(
+    results: Union[Mapping[StrokeRules, StrokeResult], Mapping[str, Mapping[StrokeRules, StrokeResult]]],
+) -> pd.DataFrame:
+    """
+    汇总参数扫描结果为对比表。
+
+    Args:
+        results: sweep_strokes() 或 sweep_universe() 的返回值
+
+    Returns:
+        pd.DataFrame: 每行一组 (文件,) 规则 (sweep_universe 的结果带 file 列)，列包括 strokes, replaced, confirmed,
+                      mean_stroke_bars, mean_lag
+    """
+    first = next(iter(results.values()), None)
+    if isinstance(first, StrokeResult):
+        results = {'': results}
+
+    rows = []
+    for name, by_rules in results.items():
+        for rules, result in by_rules.items():
+            stroke_idx = result.stroke_idx
+            lag = result.confirmations.lag
+            rows.append({
+                'file': name,
+                'min_dist': rules.min_dist,
+                'validate_extreme': rules.validate_extreme,
+                'check_replace_dist': rules.check_replace_dist,
+                'strokes': len(stroke_idx),
+                'replaced': len(result.replaced),
+                'confirmed': len(lag),
+                'mean_stroke_bars': float(np.diff(stroke_idx).mean()) if len(stroke_idx) >= 2 else np.nan,
+                'mean_lag': float(lag.mean()) if len(lag) else np.nan,
+            })
+
+    table = pd.DataFrame(rows)
+    if len(results) == 1 and '' in results:
+        table = table.drop(columns='file')
+    return table
@@ -0,0 +1,390 @@
+"""
+instrument.py
+流水线分阶段计量：墙钟时间、CPU 时间、峰值 RSS 和业务计数。
+
+每个品种一条 PipelineMetrics 记录 (各阶段耗时 + 计数)，以 JSON lines 追加写入文件；
+批量运行结束后汇总为一张表。
+
+阶段钩子 stage() 写在流水线和 apply_kline_merging / process_strokes 等函数内部，
+没有激活的记录时为空操作。嵌套阶段用 '.' 连接名称 (如 merge.plot)。
+
+可选的性能剖析 (ProfileConfig，默认关闭): 对指定阶段启用 cProfile 和/或 tracemalloc，
+每个品种每个阶段输出 .prof / .alloc 文件和 top N 摘要 (.txt)。规格字符串格式:
+
+    cprofile                        整个品种的处理过程
+    tracemalloc:merge               只剖析 merge 阶段
+    cprofile,tracemalloc:merge,strokes.plot
+
+可通过环境变量 TL_PROFILE 或 run_pipeline.py / fetch_data.py 的 --profile 参数指定。
+
+用法:
+    from src.instrument import PipelineMetrics, stage, count
+
+    metrics = PipelineMetrics(input_file="data/raw/TL.CFE.xlsx")
+    with metrics.record():
+        with stage('load'):
+            data = load_ohlc(...)
+        count(rows_in=len(data.df))
+
+    write_jsonl([metrics], "output/pipeline_metrics.jsonl")
+    print(summary_table([metrics]).to_string())
+
+    # 剖析 merge 阶段 (cProfile + tracemalloc)
+    metrics = PipelineMetrics(input_file=..., profile=ProfileConfig.parse("cprofile,tracemalloc:merge"))
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+
+# 汇总表中的计数列 (按此顺序)
+COUNTER_COLUMNS = ['rows_in', 'merged_bars', 'merge_count', 'raw_fractals', 'strokes', 'replaced']
+
+# 性能剖析
+PROFILE_ENV = 'TL_PROFILE'
+PROFILERS = ('cprofile', 'tracemalloc')
+# 不指定阶段时剖析整个记录，文件名中的阶段名
+WHOLE_RECORD = 'all'
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    当前进程的峰值常驻内存 (MB)，进程级、单调不减。
+
+    Linux/macOS 使用 resource.getrusage；Windows 需要安装 psutil，否则返回 None。
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为 KB
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    except (ImportError, AttributeError):
+        return None
+
+
+@dataclass
+class StageTiming:
+    """单个阶段的计量结果"""
+    name: str                       # 阶段名称，嵌套阶段为 'merge.plot' 形式
+    wall_s: float                   # 墙钟时间 (秒)
+    cpu_s: float                    # 本进程 CPU 时间 (秒)
+    peak_rss_mb: Optional[float]    # 阶段结束时的进程峰值 RSS (MB)
+
+    def to_dict(self) -> dict:
+        return {
+            'wall_s': round(self.wall_s, 6),
+            'cpu_s': round(self.cpu_s, 6),
+            'peak_rss_mb': None if self.peak_rss_mb is None else round(self.peak_rss_mb, 1),
+        }
+
+
+@dataclass
+class ProfileConfig:
+    """
+    性能剖析配置。
+
+    Attributes:
+        tools: 使用的剖析器 ('cprofile' / 'tracemalloc')
+        stages: 剖析的阶段名称 (完整名称，如 'merge' 或 'merge.plot')，空表示整个记录
+        output_dir: 输出目录，None 表示使用记录的 output_dir (品种输出目录)
+        top: 摘要中列出的函数 / 分配位置数量
+        frames: tracemalloc 保存的调用栈深度
+    """
+    tools: tuple[str, ...]
+    stages: tuple[str, ...] = ()
+    output_dir: Optional[Path] = None
+    top: int = 20
+    frames: int = 5
+
+    @classmethod
+    def parse(cls, spec: Optional[str], **kwargs) -> Optional['ProfileConfig']:
+        """
+        解析规格字符串 'tool[,tool]:[stage[,stage]]'，空字符串或 None 返回 None (不剖析)。
+
+        Raises:
+            ValueError: 未知的剖析器
+        """
+        if not spec or not spec.strip():
+            return None
+        tools_part, _, stages_part = spec.strip().partition(':')
+        tools = tuple(t.strip().lower() for t in tools_part.split(',') if t.strip())
+        unknown = [t for t in tools if t not in PROFILERS]
+        if unknown or not tools:
+            raise ValueError(f"未知的剖析器: {unknown or spec}，可用: {list(PROFILERS)}")
+        stages = tuple(s.strip() for s in stages_part.split(',') if s.strip())
+        return cls(tools=tools, stages=stages, **kwargs)
+
+    @classmethod
+    def from_env(cls, **kwargs) -> Optional['ProfileConfig']:
+        """从环境变量 TL_PROFILE 读取配置，未设置返回 None"""
+        return cls.parse(os.environ.get(PROFILE_ENV), **kwargs)
+
+    def matches(self, stage_name: str) -> bool:
+        return stage_name in self.stages
+
+
+class _StageProfiler:
+    """一次阶段剖析：启动 cProfile / tracemalloc，结束后写文件并返回摘要"""
+
+    def __init__(self, config: ProfileConfig):
+        self.config = config
+        self.profile = cProfile.Profile() if 'cprofile' in config.tools else None
+        self.trace = 'tracemalloc' in config.tools and not tracemalloc.is_tracing()
+
+    def start(self):
+        if self.trace:
+            tracemalloc.start(self.config.frames)
+        if self.profile is not None:
+            self.profile.enable()
+
+    def stop(self, output_dir: Path, prefix: str) -> list[Path]:
+        """停止剖析，写入 {prefix}.prof / {prefix}.alloc 及对应的 .txt 摘要，返回文件列表"""
+        if self.profile is not None:
+            self.profile.disable()
+        snapshot = None
+        if self.trace:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        files = []
+        top = self.config.top
+        if self.profile is not None:
+            path = output_dir / f"{prefix}.prof"
+            self.profile.dump_stats(str(path))
+            text = io.StringIO()
+            pstats.Stats(self.profile, stream=text).sort_stats('cumulative').print_stats(top)
+            files += [path, _write_text(path.with_suffix('.prof.txt'), text.getvalue())]
+        if snapshot is not None:
+            path = output_dir / f"{prefix}.alloc"
+            snapshot.dump(str(path))
+            lines = [f"tracemalloc 峰值: {peak / 1024 ** 2:.2f} MB", f"分配最多的 {top} 个位置:"]
+            lines += [str(stat) for stat in snapshot.statistics('lineno')[:top]]
+            files += [path, _write_text(path.with_suffix('.alloc.txt'), "\n".join(lines) + "\n")]
+        return files
+
+
+def _write_text(path: Path, text: str) -> Path:
+    path.write_text(text, encoding='utf-8')
+    return path
+
+
+@dataclass
+class PipelineMetrics:
+    """
+    一个品种的流水线计量记录。
+
+    Attributes:
+        input_file: 输入数据文件
+        symbol: 资产代码 (加载数据后通过 annotate 填写)
+        stages: 按结束顺序排列的各阶段计量
+        counters: 业务计数 (rows_in, merge_count, raw_fractals, strokes, replaced 等)
+        status: 'ok' / 'failed'
+        error: 失败时的异常信息
+        wall_s / cpu_s: 整个记录的墙钟时间 / CPU 时间
+        profile: 性能剖析配置，None 表示不剖析
+        output_dir: 剖析文件的输出目录 (品种输出目录，通过 annotate 填写)
+        profile_files: 已写入的剖析文件
+    """
+    input_file: str = ''
+    symbol: str = ''
+    name: str = ''
+    stages: list[StageTiming] = field(default_factory=list)
+    counters: dict = field(default_factory=dict)
+    status: str = 'ok'
+    error: Optional[str] = None
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    started_at: str = ''
+    profile: Optional[ProfileConfig] = None
+    output_dir: Optional[Path] = None
+    profile_files: list[Path] = field(default_factory=list)
+    _stack: list[str] = field(default_factory=list, repr=False)
+    _profiling: bool = field(default=False, repr=False)
+
+    @contextmanager
+    def record(self):
+        """
+        激活本记录并计量整个处理过程。
+
+        期间 stage() / count() / annotate() 都作用于本记录；异常会记为 failed 后继续抛出。
+        """
+        global _active
+        previous, _active = _active, self
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        profiler = self._start_profiler() if self.profile is not None and not self.profile.stages else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield self
+        except BaseException as e:
+            self.status = 'failed'
+            self.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.wall_s = time.perf_counter() - wall
+            self.cpu_s = time.process_time() - cpu
+            if profiler is not None:
+                self._stop_profiler(profiler, WHOLE_RECORD)
+            _active = previous
+
+    @contextmanager
+    def stage(self, name: str):
+        """计量一个阶段 (可嵌套)"""
+        self._stack.append(name)
+        full_name = '.'.join(self._stack)
+        profiler = None
+        if self.profile is not None and self.profile.matches(full_name):
+            profiler = self._start_profiler()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.stages.append(StageTiming(
+                full_name, time.perf_counter() - wall, time.process_time() - cpu, peak_rss_mb()
+            ))
+            if profiler is not None:
+                self._stop_profiler(profiler, full_name)
+            self._stack.pop()
+
+    def _start_profiler(self) -> Optional[_StageProfiler]:
+        # 同一时刻只能有一个 cProfile 生效，嵌套的阶段由外层剖析覆盖
+        if self._profiling:
+            return None
+        self._profiling = True
+        profiler = _StageProfiler(self.profile)
+        profiler.start()
+        return profiler
+
+    def _stop_profiler(self, profiler: Optional[_StageProfiler], stage_name: str) -> None:
+        if profiler is None:
+            return
+        self._profiling = False
+        output_dir = self.profile.output_dir or self.output_dir or Path('.')
+        label = (self.symbol or Path(self.input_file).stem or 'pipeline').replace('.', '_')
+        files = profiler.stop(Path(output_dir), f"{label}_{stage_name}")
+        self.profile_files += files
+        print(f"  🔬 剖析结果 [{stage_name}]: {', '.join(f.name for f in files)}")
+
+    def stage_seconds(self, name: str) -> Optional[float]:
+        """指定阶段的墙钟时间 (同名阶段多次执行时累加)，未执行返回 None"""
+        times = [s.wall_s for s in self.stages if s.name == name]
+        return sum(times) if times else None
+
+    @property
+    def peak_rss_mb(self) -> Optional[float]:
+        values = [s.peak_rss_mb for s in self.stages if s.peak_rss_mb is not None]
+        return max(values) if values else None
+
+    def to_dict(self) -> dict:
+        """转换为一条 JSON 记录"""
+        return {
+            'input_file': self.input_file,
+            'symbol': self.symbol,
+            'name': self.name,
+            'started_at': self.started_at,
+            'status': self.status,
+            'error': self.error,
+            'wall_s': round(self.wall_s, 6),
+            'cpu_s': round(self.cpu_s, 6),
+            'peak_rss_mb': None if self.peak_rss_mb is None else round(self.peak_rss_mb, 1),
+            'counters': dict(self.counters),
+            'stages': {s.name: s.to_dict() for s in self.stages},
+            **({'profile_files': [str(f) for f in self.profile_files]} if self.profile_files else {}),
+        }
+
+    def format_stages(self) -> str:
+        """顶层阶段耗时的单行摘要，如 'load 0.52s | merge 1.10s | ...'"""
+        parts = [f"{s.name} {s.wall_s:.2f}s" for s in self.stages if '.' not in s.name]
+        return " | ".join(parts)
+
+
+# 当前激活的记录 (流水线按品种串行处理，同一时刻最多一条)
+_active: Optional[PipelineMetrics] = None
+
+
+def stage(name: str):
+    """在当前激活的记录中计量一个阶段；没有激活的记录时为空操作"""
+    metrics = _active
+    return nullcontext() if metrics is None else metrics.stage(name)
+
+
+def count(**counters) -> None:
+    """在当前激活的记录中设置业务计数"""
+    if _active is not None:
+        _active.counters.update(counters)
+
+
+def annotate(symbol: Optional[str] = None, name: Optional[str] = None,
+             output_dir: Optional[Union[str, Path]] = None) -> None:
+    """为当前激活的记录填写资产代码、名称和输出目录 (剖析文件写在该目录下)"""
+    if _active is not None:
+        if symbol is not None:
+            _active.symbol = symbol
+        if name is not None:
+            _active.name = name
+        if output_dir is not None:
+            _active.output_dir = Path(output_dir)
+
+
+def write_jsonl(records: Iterable[PipelineMetrics], path: Union[str, Path]) -> None:
+    """将记录以 JSON lines 追加写入文件 (每个品种一行)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record.to_dict(), ensure_ascii=False) + '\n')
+
+
+def summary_table(records: Iterable[PipelineMetrics]) -> pd.DataFrame:
+    """
+    批量运行的汇总表。
+
+    Returns:
+        pd.DataFrame: 每个品种一行，列为状态、计数、各顶层阶段耗时 (秒)、总耗时、CPU 时间和峰值 RSS
+    """
+    records = list(records)
+    stage_names = []
+    for record in records:
+        for s in record.stages:
+            if '.' not in s.name and s.name not in stage_names:
+                stage_names.append(s.name)
+
+    rows = []
+    for record in records:
+        row = {'symbol': record.symbol or Path(record.input_file).stem, 'status': record.status}
+        for col in COUNTER_COLUMNS:
+            row[col] = record.counters.get(col)
+        for name in stage_names:
+            row[f"{name}_s"] = record.stage_seconds(name)
+        row['wall_s'] = record.wall_s
+        row['cpu_s'] = record.cpu_s
+        row['peak_rss_mb'] = record.peak_rss_mb
+        rows.append(row)
+
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    for col in COUNTER_COLUMNS:
+        table[col] = table[col].astype('Int64')
+    return table.round(3)
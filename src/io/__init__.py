@@ -9,10 +9,14 @@ from .schema import (
     REQUIRED_COLUMNS
 )
 from .loader import load_ohlc, list_adapters, register_adapter
+from .synthetic import generate_ohlc
+from .validation import ValidationReport, validate_ohlc
 
 __all__ = [
     "OHLCData",
     "COL_DATETIME", "COL_OPEN", "COL_HIGH", "COL_LOW", "COL_CLOSE", "COL_VOLUME",
     "REQUIRED_COLUMNS",
     "load_ohlc", "list_adapters", "register_adapter",
+    "generate_ohlc",
+    "ValidationReport", "validate_ohlc",
 ]
@@ -20,6 +20,7 @@ from typing import Optional, Union
 import pandas as pd
 
 from .base import DataAdapter
+from ...instrument import stage
 from ..schema import (
     OHLCData,
     COL_DATETIME, COL_OPEN, COL_HIGH, COL_LOW, COL_CLOSE, COL_VOLUME
@@ -248,7 +249,8 @@ class WindAPIAdapter(DataAdapter):
             Path: 保存的文件路径
         """
         # 获取数据
-        data = self.fetch(symbol, **kwargs)
+        with stage('fetch'):
+            data = self.fetch(symbol, **kwargs)
         
         # 构建输出路径
         output_dir = Path(output_dir)
@@ -259,7 +261,8 @@ class WindAPIAdapter(DataAdapter):
         output_path = output_dir / filename
         
         # 保存为 Excel
-        data.df.to_excel(output_path, index=False)
+        with stage('save'):
+            data.df.to_excel(output_path, index=False)
         print(f"  已保存: {output_path}")
         
         return output_path
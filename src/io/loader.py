@@ -10,8 +10,12 @@ io/loader.py
     
     # 指定适配器
     data = load_ohlc("data/raw/TL.CFE.xlsx", adapter="wind_cfe")
+    
+    # 严格模式 (OHLC 不一致或价格缺失时抛出 ValueError)
+    data = load_ohlc("data/raw/TL.CFE.xlsx", strict=True)
 """
 
+from dataclasses import replace
 from pathlib import Path
 from typing import Union, Optional
 
@@ -29,7 +33,8 @@ ADAPTERS: dict[str, DataAdapter] = {
 
 def load_ohlc(
     path: Union[str, Path],
-    adapter: Optional[str] = None
+    adapter: Optional[str] = None,
+    strict: bool = False
 ) -> OHLCData:
     """
     加载 OHLC 数据的统一入口。
@@ -38,12 +43,13 @@ def load_ohlc(
         path: 数据文件路径
         adapter: 适配器名称。如果为 None，则自动检测合适的适配器。
                 可选值: 'wind_cfe'
+        strict: 严格模式，加载后按 OHLCData(strict=True) 校验，存在违规K线则抛出 ValueError
     
     Returns:
         OHLCData: 标准化的 OHLC 数据
         
     Raises:
-        ValueError: 无法找到合适的适配器
+        ValueError: 无法找到合适的适配器，或严格模式下数据校验失败
         FileNotFoundError: 文件不存在
     """
     path = Path(path)
@@ -59,19 +65,24 @@ def load_ohlc(
             )
         selected_adapter = ADAPTERS[adapter]
         print(f"使用指定适配器: {selected_adapter.name}")
-        return selected_adapter.load(path)
+        return _apply_strict(selected_adapter.load(path), strict)
     
     # 自动检测适配器
     for name, adp in ADAPTERS.items():
         if adp.can_handle(path):
             print(f"自动选择适配器: {adp.name}")
-            return adp.load(path)
+            return _apply_strict(adp.load(path), strict)
     
     raise ValueError(
         f"无法找到处理 '{path}' 的适配器，文件扩展名: {path.suffix}"
     )
 
 
+def _apply_strict(data: OHLCData, strict: bool) -> OHLCData:
+    """严格模式下以 strict=True 重新构造 OHLCData (在 __post_init__ 中校验)"""
+    return replace(data, strict=True) if strict and not data.strict else data
+
+
 def list_adapters() -> list[str]:
     """列出所有可用的适配器名称"""
     return list(ADAPTERS.keys())
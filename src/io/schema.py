@@ -38,11 +38,13 @@ class OHLCData:
         symbol: 资产代码 (如 'TL.CFE')
         name: 资产名称 (如 'CFFEX30年期国债期货')
         source: 数据来源 (如 'Wind', 'Binance')
+        strict: 严格模式，构造时校验 OHLC 一致性和价格缺失，存在违规则抛出 ValueError
     """
     df: pd.DataFrame
     symbol: str = ""
     name: str = ""
     source: str = ""
+    strict: bool = False
     
     def __post_init__(self):
         """验证 DataFrame 是否包含所有必需列"""
@@ -53,6 +55,21 @@ class OHLCData:
         # 确保 datetime 列是索引或可排序
         if not pd.api.types.is_datetime64_any_dtype(self.df[COL_DATETIME]):
             raise ValueError(f"'{COL_DATETIME}' 列必须是 datetime 类型")
+        
+        if self.strict:
+            report = self.validate()
+            if not report.ok:
+                raise ValueError(f"{self.symbol or 'OHLC'} 数据校验失败 (strict): {report.summary()}")
+    
+    def validate(self):
+        """
+        校验 OHLC 一致性和价格缺失 (原始K线天然存在包含关系，不检查)。
+
+        Returns:
+            ValidationReport: 违规K线的位置索引
+        """
+        from .validation import validate_ohlc
+        return validate_ohlc(self.df)
     
     def __len__(self) -> int:
         return len(self.df)
@@ -0,0 +1,240 @@
+"""
+io/synthetic.py
+合成 OHLC 数据生成器 (可复现，不依赖 Wind)。
+
+在随机游走行情中按比例插入极端形态，用于性能基准和等价性测试：
+    - inside_run:        连续内包K线 (每根都被前一根包含)，形成长合并链
+    - outside_run:       连续外包K线 (每根都包含前一根)
+    - backtrack_cascade: 阶梯K线后接一根收盘价击穿阶梯的大K线，
+                         OHLC 一致性修正后触发合并的深度向左回溯
+    - alternating:       高低点逐根交替，顶底分型密集出现
+    - equal_extremes:    最高价/最低价与前一根完全相同 (含完全重合的K线)
+
+用法:
+    from src.io.synthetic import generate_ohlc
+
+    data = generate_ohlc(1_000_000, seed=42)                      # 随机游走 + 30% 极端形态
+    data = generate_ohlc(10_000, seed=1, patterns=['backtrack_cascade'], pattern_ratio=1.0)
+"""
+
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .schema import OHLCData, COL_DATETIME, COL_OPEN, COL_HIGH, COL_LOW, COL_CLOSE, COL_VOLUME
+
+
+# 形态生成函数签名: (rng, 长度, 起始对数价格, 单根K线波动) -> (open, high, low, close) 对数价格
+SegmentFunc = Callable[[np.random.Generator, int, float, float], tuple]
+
+
+def _random_walk(rng, m, level, scale):
+    """普通随机游走K线"""
+    close = level + np.cumsum(rng.normal(0.0, scale, m))
+    open_ = np.concatenate([[level], close[:-1]]) + rng.normal(0.0, scale * 0.2, m)
+    wick = np.abs(rng.normal(0.0, scale * 0.8, (2, m)))
+    high = np.maximum(open_, close) + wick[0]
+    low = np.minimum(open_, close) - wick[1]
+    return open_, high, low, close
+
+
+def _random_walk_segments(rng, lengths, scale):
+    """
+    批量生成多段随机游走 (每段从 0 开始)，等价于对每段调用 _random_walk。
+
+    Returns:
+        np.ndarray: shape (4, sum(lengths))，行依次为 open, high, low, close
+    """
+    total = int(lengths.sum())
+    steps = rng.normal(0.0, scale, total)
+    # 分段累加: 全局累加后减去每段起点之前的累计值
+    cumulative = np.cumsum(steps)
+    seg_starts = np.cumsum(lengths) - lengths
+    offset = np.repeat(cumulative[seg_starts] - steps[seg_starts], lengths)
+    close = cumulative - offset
+    prev_close = np.concatenate([[0.0], close[:-1]])
+    prev_close[seg_starts] = 0.0
+    open_ = prev_close + rng.normal(0.0, scale * 0.2, total)
+    wick = np.abs(rng.normal(0.0, scale * 0.8, (2, total)))
+    high = np.maximum(open_, close) + wick[0]
+    low = np.minimum(open_, close) - wick[1]
+    return np.stack([open_, high, low, close])
+
+
+def _inside_run(rng, m, level, scale):
+    """第一根为宽幅K线，其后每根都被前一根包含 (约 1/4 的边界与前一根相等)"""
+    width = scale * (m + 2)
+    shrink = rng.uniform(0.0, width / (2 * m), (2, m)) * (rng.random((2, m)) > 0.25)
+    shrink[:, 0] = 0.0
+    high = level + width / 2 - np.cumsum(shrink[0])
+    low = level - width / 2 + np.cumsum(shrink[1])
+    open_, close = _inner_prices(rng, high, low)
+    return open_, high, low, close
+
+
+def _outside_run(rng, m, level, scale):
+    """每根都包含前一根 (约 1/4 的边界与前一根相等)"""
+    grow = rng.uniform(0.0, scale, (2, m)) * (rng.random((2, m)) > 0.25)
+    high = level + scale / 2 + np.cumsum(grow[0])
+    low = level - scale / 2 - np.cumsum(grow[1])
+    open_, close = _inner_prices(rng, high, low)
+    return open_, high, low, close
+
+
+def _backtrack_cascade(rng, m, level, scale):
+    """
+    m-1 根单边阶梯K线，最后一根为外包K线且收盘价击穿阶梯起点。
+
+    合并时外包K线按趋势取高高/低高 (上升阶梯)，但 OHLC 一致性修正会把低点拉到
+    收盘价，合并后的K线随即包含前一根阶梯，引发逐级向左回溯。方向随机。
+    """
+    direction = 1.0 if rng.random() < 0.5 else -1.0
+    k = max(m - 1, 1)
+    step = np.abs(rng.normal(scale, scale * 0.3, k)) + scale * 0.1
+    mid = level + direction * np.cumsum(step)
+    half = scale * 0.6
+    high = np.append(mid + half, 0.0)
+    low = np.append(mid - half, 0.0)
+    open_ = mid + rng.uniform(-half, half, k) * 0.5
+    close = mid + direction * half * 0.5
+    # 最后一根: 开在阶梯末端外侧，收盘价击穿阶梯起点
+    last_open = mid[-1] + direction * (half + scale)
+    last_close = mid[0] - direction * (half + scale * rng.uniform(1.0, 3.0))
+    open_ = np.append(open_, last_open)
+    close = np.append(close, last_close)
+    high[-1] = max(last_open, last_close)
+    low[-1] = min(last_open, last_close)
+    return open_[-m:], high[-m:], low[-m:], close[-m:]
+
+
+def _alternating(rng, m, level, scale):
+    """奇偶K线上下错开，每根都是顶分型或底分型"""
+    shift = np.where(np.arange(m) % 2 == 0, 1.0, -1.0) * np.abs(rng.normal(scale, scale * 0.2, m))
+    half = np.abs(rng.normal(scale * 0.5, scale * 0.1, m))
+    mid = level + shift
+    high = mid + half
+    low = mid - half
+    open_, close = _inner_prices(rng, high, low)
+    return open_, high, low, close
+
+
+def _equal_extremes(rng, m, level, scale):
+    """最高价或最低价与前一根相同，约 1/5 的K线与前一根完全重合"""
+    open_, high, low, close = _random_walk(rng, m, level, scale)
+    choice = rng.integers(0, 5, m)
+    choice[0] = 3
+    # 连续复制前一根等价于向前填充最近一根未复制K线的值
+    positions = np.arange(m)
+    high = high[np.maximum.accumulate(np.where((choice == 0) | (choice == 2), 0, positions))]
+    low = low[np.maximum.accumulate(np.where((choice == 1) | (choice == 2), 0, positions))]
+    low = np.minimum(low, high - scale * 0.1)
+    open_ = np.clip(open_, low, high)
+    close = np.clip(close, low, high)
+    return open_, high, low, close
+
+
+def _inner_prices(rng, high, low):
+    """在 [low, high] 内随机生成开盘价和收盘价"""
+    span = high - low
+    open_ = low + span * rng.random(len(high))
+    close = low + span * rng.random(len(high))
+    return open_, close
+
+
+PATTERNS: dict[str, SegmentFunc] = {
+    'inside_run': _inside_run,
+    'outside_run': _outside_run,
+    'backtrack_cascade': _backtrack_cascade,
+    'alternating': _alternating,
+    'equal_extremes': _equal_extremes,
+}
+
+
+def generate_ohlc(
+    n: int,
+    seed: int = 0,
+    patterns: Optional[Sequence[str]] = None,
+    pattern_ratio: float = 0.3,
+    run_length: tuple[int, int] = (5, 40),
+    start_price: float = 100.0,
+    volatility: float = 0.005,
+    tick: float = 0.01,
+    start: str = "2000-01-03",
+    freq: str = "min",
+    symbol: str = "SYN",
+) -> OHLCData:
+    """
+    生成 n 根合成K线。
+
+    价格在对数空间生成 (形态之间向起始价格均值回归，避免长序列漂移到负值或极端值)，
+    再按 tick 取整；对数变换和取整都保持大小关系，形态中的包含/相等关系不变。
+
+    Args:
+        n: K线数量
+        seed: 随机种子，相同参数和种子生成完全相同的数据
+        patterns: 使用的极端形态 (PATTERNS 的键)，None 表示全部
+        pattern_ratio: 极端形态片段所占比例 (0 为纯随机游走，1 为全部是极端形态)
+        run_length: 每个片段的长度范围 [min, max]
+        start_price: 起始价格
+        volatility: 单根K线的对数波动率
+        tick: 最小价格变动单位
+        start: 起始时间
+        freq: K线周期 (pandas 频率字符串)；默认分钟级，千万根日线会超出 datetime64 范围
+        symbol: 资产代码
+
+    Returns:
+        OHLCData: 合成数据 (source='synthetic')
+    """
+    names = list(PATTERNS) if patterns is None else list(patterns)
+    unknown = [p for p in names if p not in PATTERNS]
+    if unknown:
+        raise ValueError(f"未知形态: {unknown}，可用: {list(PATTERNS)}")
+
+    rng = np.random.default_rng(seed)
+    lo, hi = run_length
+    # 片段长度和类型一次性抽取 (片段数按最短长度取上界，再截断到刚好覆盖 n 根)
+    lengths = rng.integers(lo, hi + 1, n // max(lo, 1) + 1)
+    n_segments = int(np.searchsorted(np.cumsum(lengths), n)) + 1
+    lengths = lengths[:n_segments]
+    is_pattern = (rng.random(n_segments) < pattern_ratio) & bool(names)
+    kinds = rng.integers(0, max(len(names), 1), n_segments)
+    starts = np.cumsum(lengths) - lengths
+    total = int(lengths.sum())
+
+    # 各片段先以 0 为起点生成 (对数价格的相对值)
+    rel = np.empty((4, total))
+    bar_segment = np.repeat(np.arange(n_segments), lengths)
+    walk_bars = ~is_pattern[bar_segment]
+    rel[:, walk_bars] = _random_walk_segments(rng, lengths[~is_pattern], volatility)
+    funcs = [PATTERNS[name] for name in names]
+    for seg in np.flatnonzero(is_pattern).tolist():
+        pos, m = starts[seg], lengths[seg]
+        rel[:, pos:pos + m] = np.stack(funcs[kinds[seg]](rng, m, 0.0, volatility))
+
+    # 片段起点 = 上一片段收盘价，并向起始价格均值回归
+    last_close = rel[3, starts + lengths - 1].tolist()
+    decay = (1.0 - 0.002 * lengths).tolist()
+    levels = np.empty(n_segments)
+    level = 0.0
+    for seg in range(n_segments):
+        levels[seg] = level
+        level = (level + last_close[seg]) * decay[seg]
+
+    ohlc = (rel + np.repeat(levels, lengths))[:, :n]
+    # 取整到 tick 后再按 tick 的小数位数取整，消除浮点误差 (如 99.35000000000001)
+    decimals = max(0, int(np.ceil(-np.log10(tick))))
+    prices = np.round(np.round(start_price * np.exp(ohlc) / tick) * tick, decimals)
+    open_, high, low, close = prices
+    high = np.maximum(high, np.maximum(open_, close))
+    low = np.minimum(low, np.minimum(open_, close))
+
+    df = pd.DataFrame({
+        COL_DATETIME: pd.date_range(start, periods=n, freq=freq),
+        COL_OPEN: open_,
+        COL_HIGH: high,
+        COL_LOW: low,
+        COL_CLOSE: close,
+        COL_VOLUME: rng.integers(1_000, 100_000, n).astype(np.float64),
+    })
+    return OHLCData(df=df, symbol=symbol, name=symbol, source="synthetic")
@@ -0,0 +1,126 @@
+"""
+io/validation.py
+向量化的 K 线数据校验，返回违规K线的位置索引。
+
+    - OHLC 一致性: low ≤ min(open, close) 且 high ≥ max(open, close)
+    - 包含关系: 相邻K线一根包含另一根 (合并后的K线不应存在)
+    - 缺失值: 价格列中的 NaN
+
+用法:
+    from src.io.validation import validate_ohlc
+
+    report = validate_ohlc(merged_df, check_inclusion=True)
+    report.ohlc_violations        # array([...]) 违规K线的位置
+    report.inclusion_violations   # array([...]) 与前一根存在包含关系的K线位置
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .schema import COL_OPEN, COL_HIGH, COL_LOW, COL_CLOSE
+
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def ohlc_violations(opens, highs, lows, closes) -> np.ndarray:
+    """
+    OHLC 一致性违规的位置索引: low > min(open, close) 或 high < max(open, close)。
+
+    (high < low 必然满足其中之一)
+    """
+    opens, highs, lows, closes = (np.asarray(a, dtype=np.float64) for a in (opens, highs, lows, closes))
+    body_low = np.minimum(opens, closes)
+    body_high = np.maximum(opens, closes)
+    return np.flatnonzero((lows > body_low) | (highs < body_high))
+
+
+def inclusion_violations(highs, lows) -> np.ndarray:
+    """
+    与前一根存在包含关系的K线位置索引 (i ≥ 1)，即第 i 根被第 i-1 根包含或包含第 i-1 根。
+
+    高低点都相等的K线同时满足两个方向，也计为包含。
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    if len(highs) < 2:
+        return _EMPTY
+    h1, h2 = highs[:-1], highs[1:]
+    l1, l2 = lows[:-1], lows[1:]
+    inside = (h2 <= h1) & (l2 >= l1)
+    outside = (h2 >= h1) & (l2 <= l1)
+    return np.flatnonzero(inside | outside) + 1
+
+
+def missing_values(*columns) -> np.ndarray:
+    """任一列为 NaN 的位置索引"""
+    if not columns:
+        return _EMPTY
+    mask = np.zeros(len(columns[0]), dtype=bool)
+    for values in columns:
+        mask |= np.isnan(np.asarray(values, dtype=np.float64))
+    return np.flatnonzero(mask)
+
+
+@dataclass
+class ValidationReport:
+    """
+    校验结果 (各项均为违规K线的位置索引，np.int64)。
+
+    Attributes:
+        n: K线数量
+        ohlc_violations: OHLC 一致性违规
+        inclusion_violations: 与前一根存在包含关系 (未检查时为空)
+        missing: 价格缺失
+    """
+    n: int
+    ohlc_violations: np.ndarray = field(default_factory=lambda: _EMPTY)
+    inclusion_violations: np.ndarray = field(default_factory=lambda: _EMPTY)
+    missing: np.ndarray = field(default_factory=lambda: _EMPTY)
+
+    @property
+    def ok(self) -> bool:
+        return not (len(self.ohlc_violations) or len(self.inclusion_violations) or len(self.missing))
+
+    def summary(self, limit: int = 10) -> str:
+        """单行摘要，每项最多列出前 limit 个位置"""
+        def fmt(name, idx):
+            head = ", ".join(str(i) for i in idx[:limit].tolist())
+            more = f" ... 共 {len(idx)} 个" if len(idx) > limit else ""
+            return f"{name}: [{head}{more}]"
+
+        parts = [fmt(name, idx) for name, idx in (
+            ("OHLC一致性", self.ohlc_violations),
+            ("包含关系", self.inclusion_violations),
+            ("缺失值", self.missing),
+        ) if len(idx)]
+        return "; ".join(parts) if parts else "校验通过"
+
+
+def validate_ohlc(df: pd.DataFrame, check_inclusion: bool = False,
+                  columns: Optional[tuple[str, str, str, str]] = None) -> ValidationReport:
+    """
+    校验一个K线 DataFrame。
+
+    Args:
+        df: K线数据
+        check_inclusion: 是否检查相邻K线的包含关系 (原始K线天然存在包含，只对合并后的K线有意义)
+        columns: (open, high, low, close) 列名，None 表示标准列名
+
+    Returns:
+        ValidationReport
+    """
+    col_open, col_high, col_low, col_close = columns or (COL_OPEN, COL_HIGH, COL_LOW, COL_CLOSE)
+    opens = df[col_open].to_numpy(dtype=np.float64)
+    highs = df[col_high].to_numpy(dtype=np.float64)
+    lows = df[col_low].to_numpy(dtype=np.float64)
+    closes = df[col_close].to_numpy(dtype=np.float64)
+    return ValidationReport(
+        n=len(df),
+        ohlc_violations=ohlc_violations(opens, highs, lows, closes),
+        inclusion_violations=inclusion_violations(highs, lows) if check_inclusion else _EMPTY,
+        missing=missing_values(opens, highs, lows, closes),
+    )
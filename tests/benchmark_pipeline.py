@@ -0,0 +1,271 @@
+"""
+流水线各阶段性能基准测试。
+
+使用合成数据 (src/io/synthetic.py: 随机游走 + 极端包含/分型形态) 对每个阶段分别计时并记录内存峰值，结果输出为 JSON；
+可与保存的基准结果对比，发现热点路径的性能回退。
+
+阶段:
+    load_csv / load_xlsx   load_ohlc 读取 CSV / Excel
+    add_kline_status       K 线状态标记
+    apply_kline_merging    K 线合并 (含 CSV 读写和绘图)
+    process_strokes        分型识别与笔过滤 (含 CSV 读写和绘图)
+    identify_hubs          中枢识别
+    chart_prepare          ChartBuilder 添加 K 线/指标/笔/分型标记
+    chart_build            ChartBuilder.build 生成 HTML
+
+用法:
+    python tests/benchmark_pipeline.py                              # 默认规模 1k,100k,1M,10M
+    python tests/benchmark_pipeline.py --sizes 1000 100000 --output tests/test_output/benchmark_baseline.json
+    python tests/benchmark_pipeline.py --sizes 1000 100000 --baseline tests/test_output/benchmark_baseline.json
+
+    与基准对比时，任一阶段耗时超过基准的 --threshold 倍即视为回退，退出码为 1。
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.io import load_ohlc, generate_ohlc
+from src.analysis import add_kline_status, ChartBuilder, compute_ema
+from src.analysis.merging import apply_kline_merging
+from src.analysis.fractals import process_strokes, identify_hubs, stroke_events
+
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000, 10_000_000]
+# Excel 单表最多 1,048,576 行；写入/读取大 xlsx 也非常慢，默认只测到 10 万根
+EXCEL_MAX_ROWS = 1_048_575
+DEFAULT_XLSX_MAX = 100_000
+
+STAGES = [
+    'load_csv', 'load_xlsx', 'add_kline_status', 'apply_kline_merging',
+    'process_strokes', 'identify_hubs', 'chart_prepare', 'chart_build',
+]
+
+
+def _measure(func, memory: bool) -> tuple:
+    """
+    执行一次 func，返回 (结果, 耗时秒, 内存峰值 MB)。
+
+    计时与内存分开测量：tracemalloc 会显著拖慢执行，内存峰值在第二次执行时统计。
+    """
+    gc.collect()
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+    plt.close('all')
+
+    peak_mb = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+        plt.close('all')
+    return result, seconds, peak_mb
+
+
+def run_size(n: int, workdir: Path, stages: list[str], memory: bool,
+             xlsx_max: int, seed: int, pattern_ratio: float) -> list[dict]:
+    """对一个数据规模依次运行所有阶段"""
+    records = []
+
+    def record(stage, seconds=None, peak_mb=None, skipped=None):
+        row = {'stage': stage, 'bars': n}
+        if skipped:
+            row['skipped'] = skipped
+        else:
+            row['seconds'] = round(seconds, 6)
+            if peak_mb is not None:
+                row['peak_mb'] = round(peak_mb, 3)
+        records.append(row)
+        status = skipped or f"{seconds:10.4f}s" + (f"  peak {peak_mb:10.2f} MB" if peak_mb is not None else "")
+        print(f"  {stage:<22} {status}")
+
+    data = generate_ohlc(n, seed=seed, pattern_ratio=pattern_ratio, symbol=f"SYN{n}")
+    csv_path = workdir / f"SYN{n}.csv"
+    data.to_csv(str(csv_path))
+
+    if 'load_csv' in stages:
+        data, seconds, peak = _measure(lambda: load_ohlc(csv_path), memory)
+        record('load_csv', seconds, peak)
+
+    if 'load_xlsx' in stages:
+        if n > min(xlsx_max, EXCEL_MAX_ROWS):
+            record('load_xlsx', skipped=f"超过 xlsx 上限 {min(xlsx_max, EXCEL_MAX_ROWS)} 行")
+        else:
+            xlsx_path = workdir / f"SYN{n}.xlsx"
+            data.df.to_excel(xlsx_path, index=False)
+            _, seconds, peak = _measure(lambda: load_ohlc(xlsx_path), memory)
+            record('load_xlsx', seconds, peak)
+
+    processed_df, seconds, peak = _measure(lambda: add_kline_status(data), memory)
+    if 'add_kline_status' in stages:
+        record('add_kline_status', seconds, peak)
+
+    processed_csv = workdir / f"SYN{n}_processed.csv"
+    merged_csv = workdir / f"SYN{n}_merged.csv"
+    strokes_csv = workdir / f"SYN{n}_strokes.csv"
+    processed_df.to_csv(processed_csv, index=False)
+
+    _, seconds, peak = _measure(
+        lambda: apply_kline_merging(str(processed_csv), str(merged_csv),
+                                    save_plot_path=str(workdir / "merged.png")),
+        memory and 'apply_kline_merging' in stages,
+    )
+    if 'apply_kline_merging' in stages:
+        record('apply_kline_merging', seconds, peak)
+
+    stroke_result, seconds, peak = _measure(
+        lambda: process_strokes(str(merged_csv), str(strokes_csv),
+                                save_plot_path=str(workdir / "strokes.png")),
+        memory and 'process_strokes' in stages,
+    )
+    if 'process_strokes' in stages:
+        record('process_strokes', seconds, peak)
+
+    merged_df = pd.read_csv(merged_csv, parse_dates=['datetime'])
+    highs = merged_df['high'].to_numpy()
+    lows = merged_df['low'].to_numpy()
+
+    if 'identify_hubs' in stages:
+        strokes = stroke_result.strokes if stroke_result is not None else []
+        _, seconds, peak = _measure(lambda: identify_hubs(strokes, highs, lows), memory)
+        record('identify_hubs', seconds, peak)
+
+    if 'chart_prepare' in stages or 'chart_build' in stages:
+        events = stroke_events(stroke_result, merged_df['datetime'], highs, lows) if stroke_result else []
+
+        def prepare():
+            chart = ChartBuilder(merged_df)
+            chart.add_candlestick()
+            chart.add_indicator('EMA20', compute_ema(merged_df, 20), '#FFA500')
+            chart.add_strokes(events)
+            chart.add_fractal_markers(events)
+            return chart
+
+        chart, seconds, peak = _measure(prepare, memory and 'chart_prepare' in stages)
+        if 'chart_prepare' in stages:
+            record('chart_prepare', seconds, peak)
+        if 'chart_build' in stages:
+            html_path = workdir / f"SYN{n}.html"
+            _, seconds, peak = _measure(lambda: chart.build(str(html_path), title=f"SYN{n}"), memory)
+            record('chart_build', seconds, peak)
+
+    return records
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float,
+            min_seconds: float = 0.01) -> list[dict]:
+    """
+    与基准结果对比。
+
+    耗时低于 min_seconds 的阶段受计时噪声影响大，不判定为回退。
+
+    Returns:
+        list: 每个 (stage, bars) 一项，包含 seconds / baseline_seconds / ratio / regression
+    """
+    base = {(r['stage'], r['bars']): r for r in baseline if 'seconds' in r}
+    rows = []
+    for r in results:
+        b = base.get((r['stage'], r['bars']))
+        if b is None or 'seconds' not in r:
+            continue
+        ratio = r['seconds'] / b['seconds'] if b['seconds'] > 0 else float('inf')
+        row = {
+            'stage': r['stage'], 'bars': r['bars'],
+            'seconds': r['seconds'], 'baseline_seconds': b['seconds'],
+            'ratio': round(ratio, 3),
+            'regression': ratio > threshold and r['seconds'] >= min_seconds,
+        }
+        if 'peak_mb' in r and 'peak_mb' in b and b['peak_mb'] > 0:
+            row['peak_ratio'] = round(r['peak_mb'] / b['peak_mb'], 3)
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流水线各阶段性能基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="K 线数量")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="只运行指定阶段")
+    parser.add_argument("--output", type=Path, help="结果 JSON 保存路径 (可作为之后的基准)")
+    parser.add_argument("--baseline", type=Path, help="基准结果 JSON，用于对比")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="耗时超过基准的倍数视为回退 (默认 1.2)")
+    parser.add_argument("--min-seconds", type=float, default=0.01,
+                        help="耗时低于该值的阶段不判定回退 (默认 0.01)")
+    parser.add_argument("--no-memory", action="store_true", help="不统计内存峰值 (只计时，速度约快一倍)")
+    parser.add_argument("--xlsx-max", type=int, default=DEFAULT_XLSX_MAX,
+                        help=f"load_xlsx 的最大规模 (默认 {DEFAULT_XLSX_MAX})")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据随机种子")
+    parser.add_argument("--pattern-ratio", type=float, default=0.3,
+                        help="合成数据中极端形态片段的比例 (默认 0.3，0 为纯随机游走)")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="tl_bench_") as tmp:
+        for n in args.sizes:
+            print(f"\n[{n:,} bars]")
+            results += run_size(n, Path(tmp), args.stages, not args.no_memory, args.xlsx_max,
+                                args.seed, args.pattern_ratio)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'pattern_ratio': args.pattern_ratio,
+        },
+        'results': results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        comparison = compare(results, baseline['results'], args.threshold, args.min_seconds)
+        report['comparison'] = comparison
+        print(f"\n与基准对比 ({args.baseline}, 阈值 {args.threshold}x):")
+        for row in comparison:
+            flag = "⚠️ 回退" if row['regression'] else "✅"
+            print(f"  {row['stage']:<22} {row['bars']:>10,}  {row['baseline_seconds']:10.4f}s -> "
+                  f"{row['seconds']:10.4f}s  ({row['ratio']:.2f}x) {flag}")
+        if any(row['regression'] for row in comparison):
+            exit_code = 1
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text, encoding='utf-8')
+        print(f"\n结果已保存至: {args.output}")
+    else:
+        print(text)
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+回测信号的未来数据检查 (截断对比)。
+
+对每个输入序列，先在全部合并K线上计算回测信号 (prepare_signals)，再对每个信号的入场K线 e
+只用合并K线 [0, e] 重新计算一次: 入场时能看到的只有这些K线，因此同一信号 (入场位置、方向)
+必须已经出现在截断后的结果中，否则说明信号用到了入场之后的K线。
+
+截断在合并K线上进行 (回测的入场、出场都以合并K线计)，每个入场位置只重新计算一次。
+
+用法:
+    python tests/check_backtest_lookahead.py                       # data/raw 全部文件
+    python tests/check_backtest_lookahead.py --no-raw --sizes 2000 --seeds 0 1 2
+    python tests/check_backtest_lookahead.py --kind strokes
+
+    存在用到未来数据的信号时退出码为 1。
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.io import load_ohlc, generate_ohlc
+from src.analysis.backtest import SIGNAL_KINDS, prepare_signals
+from src.analysis.merging import merge_kline_bars
+
+
+def raw_inputs(raw_dir: Path = ROOT / "data" / "raw") -> Iterator[tuple[str, pd.DataFrame]]:
+    """raw_dir 下的全部数据文件"""
+    for path in sorted(raw_dir.glob("*")):
+        if path.suffix.lower() not in ('.xlsx', '.xls', '.csv'):
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = load_ohlc(path)
+        yield path.name, data.df
+
+
+def synthetic_inputs(sizes: Iterable[int], seeds: Iterable[int]) -> Iterator[tuple[str, pd.DataFrame]]:
+    """合成数据 (混合形态)"""
+    for n in sizes:
+        for seed in seeds:
+            yield f"synthetic n={n} seed={seed}", generate_ohlc(n, seed=seed).df
+
+
+def check_series(df: pd.DataFrame, kinds: Iterable[str] = SIGNAL_KINDS) -> dict[str, list[tuple[int, int]]]:
+    """
+    检查一个序列的全部信号。
+
+    Args:
+        df: 原始 OHLC 数据
+        kinds: 检查的信号类型
+
+    Returns:
+        dict: {信号类型: [(entry_idx, side), ...]}，列出截断后不存在的信号 (空列表表示通过)
+    """
+    merged = merge_kline_bars(df).df
+    full = prepare_signals(merged, merged=True)
+    truncated = {}      # entry_idx -> 截断到该K线的信号，{kind: {(entry_idx, side)}}
+    failures = {}
+    for kind in kinds:
+        entry_idx, side = full.entries[kind]
+        bad = []
+        for e, s in zip(entry_idx.tolist(), side.tolist()):
+            if e not in truncated:
+                part = prepare_signals(merged.iloc[:e + 1], merged=True)
+                truncated[e] = {
+                    k: set(zip(idx.tolist(), sd.tolist())) for k, (idx, sd) in part.entries.items()
+                }
+            if (e, s) not in truncated[e][kind]:
+                bad.append((e, s))
+        failures[kind] = bad
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回测信号的未来数据检查 (截断到入场K线重新计算)")
+    parser.add_argument("--kind", nargs="+", choices=SIGNAL_KINDS, default=list(SIGNAL_KINDS),
+                        help="检查的信号类型 (默认全部)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2_000], help="合成数据规模")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1], help="合成数据随机种子")
+    parser.add_argument("--no-raw", action="store_true", help="不使用 data/raw 下的文件")
+    parser.add_argument("--raw-dir", type=Path, default=ROOT / "data" / "raw", help="原始数据目录")
+    args = parser.parse_args()
+
+    inputs = [] if args.no_raw else list(raw_inputs(args.raw_dir))
+    inputs += list(synthetic_inputs(args.sizes, args.seeds))
+
+    failed = 0
+    for name, df in inputs:
+        failures = check_series(df, args.kind)
+        bad = sum(len(v) for v in failures.values())
+        failed += bad > 0
+        status = "✅" if not bad else "❌"
+        print(f"  {status} {name:<40} " + "  ".join(f"{k}: {len(v)}" for k, v in failures.items()))
+        for kind, items in failures.items():
+            for e, s in items[:5]:
+                print(f"      [{kind}] 入场K线 {e} 方向 {s:+d}: 截断到入场K线后不存在")
+    print(f"  共 {len(inputs)} 个序列，存在未来数据的 {failed} 个")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+品种池筛选与回测的 H/L 信号一致性检查。
+
+screen_symbol 报告的最新 H/L 信号 (信号K线位置、方向) 必须与回测输入
+prepare_signals(...).entries['setups'] 的最后一个信号一致: 方向相同，入场位置等于
+由该信号K线推出的入场位置 (强势信号在信号K线入场，突破确认在下一根K线入场)；
+信号K线须为候选分型的右肩K线 (当前候选在分型K线上的显示行不是信号K线)。
+
+用法:
+    python tests/check_screener_setups.py                       # data/raw 全部文件 + 合成数据
+    python tests/check_screener_setups.py --no-raw --sizes 2000 5000 --seeds 0 1 2
+
+    存在不一致时退出码为 1。
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.io import OHLCData, load_ohlc, generate_ohlc
+from src.analysis.backtest import prepare_signals
+from src.analysis.fractals import compute_strokes, stroke_events
+from src.analysis.screener import screen_symbol
+from src.analysis.signals import strong_signal_mask
+
+
+def raw_inputs(raw_dir: Path = ROOT / "data" / "raw") -> Iterator[tuple[str, OHLCData]]:
+    """raw_dir 下的全部数据文件"""
+    for path in sorted(raw_dir.glob("*")):
+        if path.suffix.lower() not in ('.xlsx', '.xls', '.csv'):
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = load_ohlc(path)
+        yield path.name, data
+
+
+def synthetic_inputs(sizes: Iterable[int], seeds: Iterable[int]) -> Iterator[tuple[str, OHLCData]]:
+    """合成数据 (混合形态)"""
+    for n in sizes:
+        for seed in seeds:
+            yield f"synthetic n={n} seed={seed}", generate_ohlc(n, seed=seed)
+
+
+def check_series(data: OHLCData) -> Optional[str]:
+    """
+    对比一个品种的最新 H/L 信号。
+
+    Returns:
+        str: 不一致的说明，一致时为 None
+    """
+    row = screen_symbol(data)
+    signals = prepare_signals(data)
+    entry_idx, side = signals.entries['setups']
+    if not row['setup']:
+        return None if not len(entry_idx) else f"筛选无信号，回测最后信号入场K线 {entry_idx[-1]}"
+    if not len(entry_idx):
+        return f"筛选为 {row['setup']}，回测无信号"
+    bar = row['merged_bars'] - 1 - row['bars_since_setup']
+    expected_side = 1 if row['setup'].startswith('H') else -1
+    strong = strong_signal_mask(signals.highs, signals.lows, signals.closes,
+                                np.array([bar]), np.array([expected_side == -1]))[0]
+    # 只用到 bar_idx / fractal_idx / kind，时间列以K线位置代替
+    events = stroke_events(compute_strokes(signals.highs, signals.lows), np.arange(len(signals.highs)),
+                           signals.highs, signals.lows)
+    shoulder = (events['bar_idx'] == bar) & (events['fractal_idx'] < bar) & events['kind'].str.endswith('c')
+    if not shoulder.any():
+        return f"筛选为 {row['setup']}，信号K线 {bar} 不是候选分型的右肩K线"
+    if side[-1] != expected_side or entry_idx[-1] != bar + (not strong):
+        return (f"筛选为 {row['setup']} (信号K线 {bar})，"
+                f"回测最后信号入场K线 {entry_idx[-1]} 方向 {int(side[-1]):+d}")
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="品种池筛选与回测的 H/L 信号一致性检查")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2_000, 5_000], help="合成数据规模")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2], help="合成数据随机种子")
+    parser.add_argument("--no-raw", action="store_true", help="不使用 data/raw 下的文件")
+    parser.add_argument("--raw-dir", type=Path, default=ROOT / "data" / "raw", help="原始数据目录")
+    args = parser.parse_args()
+
+    inputs = [] if args.no_raw else list(raw_inputs(args.raw_dir))
+    inputs += list(synthetic_inputs(args.sizes, args.seeds))
+
+    failed = 0
+    for name, data in inputs:
+        problem = check_series(data)
+        failed += problem is not None
+        print(f"  {'❌' if problem else '✅'} {name:<40} {problem or ''}")
+    print(f"  共 {len(inputs)} 个序列，不一致 {failed} 个")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
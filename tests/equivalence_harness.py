@@ -0,0 +1,326 @@
+"""
+等价性测试：参考实现 vs 新的 K 线合并 / 笔识别引擎。
+
+参考实现为 apply_kline_merging / process_strokes 所调用的计算核心
+(merge_kline_bars / compute_strokes，不读写文件、不绘图)。新引擎 (向量化、流式等)
+通过 register_engine() 注册后，与参考实现在同一批输入上逐项对比：
+
+    merged      合并K线 (datetime, OHLC；双方都提供来源索引时也对比 raw_start/raw_end 等)
+    raw         原始分型 (TOP/BOTTOM)
+    markers     笔端点标记 (T/B/Tx/Bx/Tc/Bc 及候选显示位置)
+
+笔识别阶段统一以参考实现的合并结果为输入，两个阶段的差异互不干扰。
+每项报告第一根不一致的K线。
+
+输入: data/raw 下的全部文件 + 合成数据 (src/io/synthetic.py，随机游走和各类极端形态)。
+
+用法:
+    python tests/equivalence_harness.py                        # 所有已注册引擎
+    python tests/equivalence_harness.py --engine reference --sizes 1000 100000 --seeds 0 1 2
+    python tests/equivalence_harness.py --no-raw --sizes 1000000
+
+    在代码中:
+        from tests.equivalence_harness import register_engine, run_harness
+        register_engine('fast', merge=my_merge, strokes=my_strokes)
+        reports = run_harness('fast')
+
+    存在差异时退出码为 1。
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.io import load_ohlc, generate_ohlc
+from src.io.synthetic import PATTERNS
+from src.analysis.codes import (
+    COL_RAW_FRACTAL_CODE, COL_VALID_FRACTAL_CODE, COL_BAR_FLAGS, BarFlag, decode_valid_fractal,
+)
+from src.analysis.fractals import (
+    StrokeResult, StrokeRules, StrokeState, compute_strokes, encode_stroke_columns,
+    advance_strokes, find_raw_fractals, stroke_result,
+)
+from src.analysis.merging import merge_kline_bars, PROVENANCE_COLUMNS
+from src.analysis.incremental import IncrementalEngine, save_checkpoint, load_checkpoint
+
+
+MERGED_COLUMNS = ['datetime', 'open', 'high', 'low', 'close']
+# 笔标记对比的位: 确认/替换/候选状态 + 候选显示位置 (MERGED 属于合并阶段)
+MARKER_FLAGS = ~BarFlag.MERGED & 0xFF
+
+
+@dataclass
+class Engine:
+    """
+    待对比的引擎。未实现的阶段为 None，该阶段跳过对比。
+
+    Attributes:
+        name: 引擎名称
+        merge: (原始 OHLC DataFrame) -> 合并后的 DataFrame
+        strokes: (合并K线 highs, lows) -> StrokeResult
+    """
+    name: str
+    merge: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+    strokes: Optional[Callable[[np.ndarray, np.ndarray], StrokeResult]] = None
+
+
+def _reference_merge(df: pd.DataFrame) -> pd.DataFrame:
+    return merge_kline_bars(df).df
+
+
+REFERENCE = Engine('reference', merge=_reference_merge, strokes=compute_strokes)
+
+# 增量引擎: 先处理前 2/3 的数据建立检查点 (经 npz 存取)，再从检查点继续处理全部数据
+INCREMENTAL_SPLIT = 2 / 3
+
+
+def _incremental_merge(df: pd.DataFrame) -> pd.DataFrame:
+    cut = int(len(df) * INCREMENTAL_SPLIT)
+    checkpoint = None
+    if cut >= 1:
+        engine = IncrementalEngine()
+        merged = engine.merge(df.iloc[:cut].reset_index(drop=True))
+        engine.strokes(merged.df['high'], merged.df['low'])
+        if engine.checkpoint is not None:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / 'checkpoint.npz'
+                save_checkpoint(engine.checkpoint, path)
+                checkpoint = load_checkpoint(path)
+    return IncrementalEngine(checkpoint).merge(df).df
+
+
+def _incremental_strokes(highs, lows) -> StrokeResult:
+    # 笔过滤分两段处理: 处理到 2/3 处保存状态副本，再从副本继续
+    highs = np.asarray(highs, dtype=np.float64).tolist()
+    lows = np.asarray(lows, dtype=np.float64).tolist()
+    raw_fractals = find_raw_fractals(highs, lows)
+    rules = StrokeRules()
+    state = advance_strokes(StrokeState(), highs, lows, raw_fractals, rules,
+                            stop=int(len(highs) * INCREMENTAL_SPLIT))
+    state = advance_strokes(state.copy(), highs, lows, raw_fractals, rules)
+    return stroke_result(state, highs, lows, raw_fractals, rules)
+
+
+# 已注册的引擎 (reference 与自身对比，用于检查测试工具本身)
+ENGINES: dict[str, Engine] = {
+    'reference': REFERENCE,
+    'incremental': Engine('incremental', merge=_incremental_merge, strokes=_incremental_strokes),
+}
+
+
+def register_engine(name: str, merge=None, strokes=None) -> Engine:
+    """注册新引擎，返回 Engine"""
+    engine = Engine(name, merge=merge, strokes=strokes)
+    ENGINES[name] = engine
+    return engine
+
+
+@dataclass
+class Divergence:
+    """一项对比的第一处不一致"""
+    stage: str          # 'merged' / 'raw' / 'markers'
+    bar: int            # 第一根不一致的K线 (合并K线序号)
+    detail: str
+
+
+@dataclass
+class SeriesReport:
+    """单个输入序列的对比结果"""
+    name: str
+    n_raw: int
+    n_merged: int
+    divergences: list[Divergence] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.divergences
+
+
+def first_divergence(a, b) -> Optional[int]:
+    """
+    两个序列第一处不同的位置，完全相同返回 None。
+
+    长度不同时，若较短序列是较长序列的前缀，返回较短序列的长度。
+    """
+    a = np.asarray(a)
+    b = np.asarray(b)
+    m = min(len(a), len(b))
+    diff = np.flatnonzero(a[:m] != b[:m])
+    if len(diff):
+        return int(diff[0])
+    return None if len(a) == len(b) else m
+
+
+def compare_merged(ref: pd.DataFrame, cand: pd.DataFrame) -> Optional[Divergence]:
+    """对比合并K线 (OHLC、时间，以及双方都有的来源索引列)"""
+    columns = MERGED_COLUMNS + [c for c in PROVENANCE_COLUMNS if c in ref.columns and c in cand.columns]
+    first, culprits = None, []
+    for col in columns:
+        if col not in cand.columns:
+            return Divergence('merged', 0, f"缺少列 {col}")
+        a, b = ref[col].to_numpy(), cand[col].to_numpy()
+        if col == 'datetime':
+            a, b = pd.to_datetime(a).to_numpy(), pd.to_datetime(b).to_numpy()
+        pos = first_divergence(a, b)
+        if pos is None:
+            continue
+        if first is None or pos < first:
+            first, culprits = pos, [col]
+        elif pos == first:
+            culprits.append(col)
+
+    if first is None:
+        return None
+    if first >= min(len(ref), len(cand)):
+        return Divergence('merged', first, f"合并K线数量不同: 参考 {len(ref)}, 引擎 {len(cand)}")
+    values = ", ".join(f"{c}: {ref[c].iloc[first]} vs {cand[c].iloc[first]}" for c in culprits)
+    return Divergence('merged', first, values)
+
+
+def compare_strokes(ref: StrokeResult, cand: StrokeResult, n: int) -> list[Divergence]:
+    """对比原始分型和笔端点标记 (逐K线编码后比较)"""
+    a = encode_stroke_columns(ref, n)
+    b = encode_stroke_columns(cand, n)
+    result = []
+
+    pos = first_divergence(a[COL_RAW_FRACTAL_CODE], b[COL_RAW_FRACTAL_CODE])
+    if pos is not None:
+        result.append(Divergence(
+            'raw', pos,
+            f"参考 {int(a[COL_RAW_FRACTAL_CODE][pos])}, 引擎 {int(b[COL_RAW_FRACTAL_CODE][pos])}",
+        ))
+
+    flags_a = a[COL_BAR_FLAGS] & MARKER_FLAGS
+    flags_b = b[COL_BAR_FLAGS] & MARKER_FLAGS
+    code_pos = first_divergence(a[COL_VALID_FRACTAL_CODE], b[COL_VALID_FRACTAL_CODE])
+    flag_pos = first_divergence(flags_a, flags_b)
+    positions = [p for p in (code_pos, flag_pos) if p is not None]
+    if positions:
+        pos = min(positions)
+
+        def describe(codes, flags):
+            marker = decode_valid_fractal(codes[pos:pos + 1], flags[pos:pos + 1])[0] or '-'
+            return f"{marker} (flags={BarFlag(int(flags[pos])).name or 0})"
+
+        result.append(Divergence(
+            'markers', pos,
+            f"参考 {describe(a[COL_VALID_FRACTAL_CODE], flags_a)}, "
+            f"引擎 {describe(b[COL_VALID_FRACTAL_CODE], flags_b)}",
+        ))
+    return result
+
+
+def compare_series(name: str, df: pd.DataFrame, engine: Engine,
+                   reference: Engine = REFERENCE) -> SeriesReport:
+    """在一个输入序列上对比引擎与参考实现"""
+    ref_merged = reference.merge(df)
+    report = SeriesReport(name=name, n_raw=len(df), n_merged=len(ref_merged))
+
+    if engine.merge is not None:
+        divergence = compare_merged(ref_merged, engine.merge(df))
+        if divergence is not None:
+            report.divergences.append(divergence)
+
+    if engine.strokes is not None and len(ref_merged) >= 3:
+        highs = ref_merged['high'].to_numpy(dtype=np.float64)
+        lows = ref_merged['low'].to_numpy(dtype=np.float64)
+        report.divergences += compare_strokes(
+            reference.strokes(highs, lows), engine.strokes(highs, lows), len(ref_merged)
+        )
+    return report
+
+
+def raw_inputs(raw_dir: Path = ROOT / "data" / "raw") -> Iterator[tuple[str, pd.DataFrame]]:
+    """data/raw 下的全部数据文件"""
+    for path in sorted(raw_dir.glob("*")):
+        if path.suffix.lower() not in ('.xlsx', '.xls', '.csv'):
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = load_ohlc(path)
+        yield path.name, data.df
+
+
+def synthetic_inputs(sizes: Iterable[int], seeds: Iterable[int]) -> Iterator[tuple[str, pd.DataFrame]]:
+    """合成数据: 每个 (规模, 种子) 生成混合形态序列，以及每种极端形态单独的序列"""
+    for n in sizes:
+        for seed in seeds:
+            yield f"synthetic n={n} seed={seed}", generate_ohlc(n, seed=seed).df
+            for pattern in PATTERNS:
+                data = generate_ohlc(n, seed=seed, patterns=[pattern], pattern_ratio=1.0)
+                yield f"{pattern} n={n} seed={seed}", data.df
+
+
+def default_inputs() -> Iterator[tuple[str, pd.DataFrame]]:
+    """默认输入: data/raw 全部文件 + 小规模合成数据"""
+    yield from raw_inputs()
+    yield from synthetic_inputs([2_000, 50_000], [0, 1])
+
+
+def run_harness(engine_name: str, inputs: Optional[Iterable[tuple[str, pd.DataFrame]]] = None,
+                verbose: bool = True) -> list[SeriesReport]:
+    """
+    在所有输入上运行对比。
+
+    Args:
+        engine_name: 已注册的引擎名称
+        inputs: (名称, 原始 OHLC DataFrame) 序列，None 表示 default_inputs()
+        verbose: 是否逐个打印结果
+
+    Returns:
+        list[SeriesReport]: 每个输入序列一项
+    """
+    engine = ENGINES[engine_name]
+    reports = []
+    for name, df in (default_inputs() if inputs is None else inputs):
+        report = compare_series(name, df, engine)
+        reports.append(report)
+        if verbose:
+            status = "✅" if report.ok else "❌"
+            print(f"  {status} {name:<40} raw={report.n_raw:<9} merged={report.n_merged}")
+            for d in report.divergences:
+                print(f"      [{d.stage}] 第一处不一致: K线 {d.bar}  {d.detail}")
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="参考实现与新引擎的等价性测试")
+    parser.add_argument("--engine", nargs="+", choices=list(ENGINES), default=list(ENGINES),
+                        help="待测试的引擎 (默认全部已注册引擎)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2_000, 50_000], help="合成数据规模")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1], help="合成数据随机种子")
+    parser.add_argument("--no-raw", action="store_true", help="不使用 data/raw 下的文件")
+    parser.add_argument("--raw-dir", type=Path, default=ROOT / "data" / "raw", help="原始数据目录")
+    args = parser.parse_args()
+
+    failed = 0
+    for engine_name in args.engine:
+        print(f"\n[{engine_name}] vs [reference]")
+        inputs = synthetic_inputs(args.sizes, args.seeds)
+        if not args.no_raw:
+            inputs = _chain(raw_inputs(args.raw_dir), inputs)
+        reports = run_harness(engine_name, inputs)
+        bad = [r for r in reports if not r.ok]
+        failed += len(bad)
+        print(f"  共 {len(reports)} 个序列，不一致 {len(bad)} 个")
+
+    sys.exit(1 if failed else 0)
+
+
+def _chain(*iterables):
+    for it in iterables:
+        yield from it
+
+
+if __name__ == "__main__":
+    main()
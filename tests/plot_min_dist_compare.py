@@ -7,8 +7,12 @@ import matplotlib.patches as mpatches
 import matplotlib
 matplotlib.use('Agg')
 import os
+import sys
 
 os.chdir(os.path.dirname(__file__) or '.')
+sys.path.insert(0, '..')
+
+from src.analysis.sweep import prepare_bars, rules_grid, sweep_strokes
 
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial']
 plt.rcParams['axes.unicode_minus'] = False
@@ -19,96 +23,19 @@ def detect_columns(df):
     raise ValueError(f"无法识别列名格式，当前列: {df.columns.tolist()}")
 
 
-def process_strokes_with_min_dist(df, min_dist):
-    col_high = 'high'
-    col_low = 'low'
-    
-    highs = df[col_high].tolist()
-    lows = df[col_low].tolist()
-    n = len(df)
-    
-    raw_fractals = [''] * n
-    
-    for i in range(1, n - 1):
-        if highs[i] > highs[i-1] and highs[i] > highs[i+1]:
-            raw_fractals[i] = 'TOP'
-        elif lows[i] < lows[i-1] and lows[i] < lows[i+1]:
-            raw_fractals[i] = 'BOTTOM'
-    
-    fractal_points = [(i, raw_fractals[i]) for i in range(n) if raw_fractals[i]]
-    
-    strokes = []
-    pending = None
-    last_stroke_end = None
-    replaced_candidates = []
-    
-    for idx, f_type in fractal_points:
-        if pending is None:
-            if last_stroke_end is None:
-                pending = (idx, f_type)
-                continue
-            dist = idx - last_stroke_end[0]
-            if f_type == last_stroke_end[1]:
-                if f_type == 'TOP' and highs[idx] > highs[last_stroke_end[0]]:
-                    old = strokes.pop()
-                    replaced_candidates.append(old)
-                    strokes.append((idx, f_type))
-                    last_stroke_end = (idx, f_type)
-                elif f_type == 'BOTTOM' and lows[idx] < lows[last_stroke_end[0]]:
-                    old = strokes.pop()
-                    replaced_candidates.append(old)
-                    strokes.append((idx, f_type))
-                    last_stroke_end = (idx, f_type)
-                continue
-            if dist < min_dist:
-                continue
-            pending = (idx, f_type)
-            continue
-        
-        pending_idx, pending_type = pending
-        
-        if f_type == pending_type:
-            if f_type == 'TOP' and highs[idx] > highs[pending_idx]:
-                replaced_candidates.append(pending)
-                pending = (idx, f_type)
-            elif f_type == 'BOTTOM' and lows[idx] < lows[pending_idx]:
-                replaced_candidates.append(pending)
-                pending = (idx, f_type)
-        else:
-            if last_stroke_end is not None:
-                dist = pending_idx - last_stroke_end[0]
-                if dist < min_dist:
-                    replaced_candidates.append(pending)
-                    if f_type == last_stroke_end[1]:
-                        if f_type == 'TOP' and highs[idx] > highs[last_stroke_end[0]]:
-                            old = strokes.pop()
-                            replaced_candidates.append(old)
-                            strokes.append((idx, f_type))
-                            last_stroke_end = (idx, f_type)
-                        elif f_type == 'BOTTOM' and lows[idx] < lows[last_stroke_end[0]]:
-                            old = strokes.pop()
-                            replaced_candidates.append(old)
-                            strokes.append((idx, f_type))
-                            last_stroke_end = (idx, f_type)
-                        pending = None
-                    else:
-                        pending = (idx, f_type)
-                    continue
-            strokes.append(pending)
-            last_stroke_end = pending
-            pending = (idx, f_type)
-    
-    if pending is not None:
-        if last_stroke_end is not None:
-            dist = pending[0] - last_stroke_end[0]
-            if dist >= min_dist:
-                strokes.append(pending)
-            else:
-                replaced_candidates.append(pending)
-        else:
-            strokes.append(pending)
-    
-    return {'strokes': strokes, 'replaced': replaced_candidates, 'highs': highs, 'lows': lows}
+def process_strokes_with_min_dist(df, min_dists=(3, 4)):
+    """合并K线与原始分型只算一次，对每个 MIN_DIST 运行笔过滤"""
+    prepared = prepare_bars(df, merged=True)
+    results = sweep_strokes(prepared, rules_grid(min_dist=min_dists))
+    return {
+        rules.min_dist: {
+            'strokes': result.strokes,
+            'replaced': result.replaced,
+            'highs': prepared.highs.tolist(),
+            'lows': prepared.lows.tolist(),
+        }
+        for rules, result in results.items()
+    }
 
 
 def draw_klines(ax, df, col_high, col_low, col_open, col_close):
@@ -352,13 +279,11 @@ if __name__ == "__main__":
     df = pd.read_csv(input_path, encoding='utf-8')
     print(f"K线数量: {len(df)}")
     
-    print("\n处理 MIN_DIST=3...")
-    result_dist3 = process_strokes_with_min_dist(df, min_dist=3)
-    print(f"  有效笔: {len(result_dist3['strokes'])}")
-    
-    print("\n处理 MIN_DIST=4...")
-    result_dist4 = process_strokes_with_min_dist(df, min_dist=4)
-    print(f"  有效笔: {len(result_dist4['strokes'])}")
+    print("\n处理 MIN_DIST=3, 4...")
+    results = process_strokes_with_min_dist(df, min_dists=(3, 4))
+    result_dist3, result_dist4 = results[3], results[4]
+    print(f"  MIN_DIST=3 有效笔: {len(result_dist3['strokes'])}")
+    print(f"  MIN_DIST=4 有效笔: {len(result_dist4['strokes'])}")
     
     print("\n生成对比图...")
     plot_comparison(df, result_dist3, result_dist4, output_path1)
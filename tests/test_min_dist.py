@@ -3,130 +3,22 @@
 """
 import pandas as pd
 import os
+import sys
 
 os.chdir(os.path.dirname(__file__) or '.')
+sys.path.insert(0, '..')
 
-def detect_columns(df):
-    if 'high' in df.columns:
-        return 'datetime', 'open', 'high', 'low', 'close'
-    
-    COL_HIGH = '最高价(元)'
-    COL_LOW = '最低价(元)'
-    
-    if COL_HIGH in df.columns:
-        return '日期', '开盘价(元)', COL_HIGH, COL_LOW, '收盘价(元)'
-    
-    if '最高价' in df.columns:
-        return '日期', '开盘价', '最高价', '最低价', '收盘价'
-    
-    raise ValueError(f"无法识别列名格式，当前列: {df.columns.tolist()}")
-
+from src.analysis.fractals import StrokeRules, compute_strokes, _detect_columns
 
 def process_strokes_with_min_dist(df, min_dist):
-    col_dt, col_open, col_high, col_low, col_close = detect_columns(df)
-    
-    highs = df[col_high].tolist()
-    lows = df[col_low].tolist()
-    n = len(df)
-    
-    raw_fractals = [''] * n
-    
-    for i in range(1, n - 1):
-        h_prev, h_curr, h_next = highs[i-1], highs[i], highs[i+1]
-        l_prev, l_curr, l_next = lows[i-1], lows[i], lows[i+1]
-        
-        if h_curr > h_prev and h_curr > h_next:
-            raw_fractals[i] = 'TOP'
-        elif l_curr < l_prev and l_curr < l_next:
-            raw_fractals[i] = 'BOTTOM'
-    
-    raw_count = sum(1 for x in raw_fractals if x)
-    
-    fractal_points = [(i, raw_fractals[i]) for i in range(n) if raw_fractals[i]]
-    
-    strokes = []
-    pending = None
-    last_stroke_end = None
-    replaced_candidates = []
-    
-    for idx, f_type in fractal_points:
-        if pending is None:
-            if last_stroke_end is None:
-                pending = (idx, f_type)
-                continue
-            
-            dist = idx - last_stroke_end[0]
-            
-            if f_type == last_stroke_end[1]:
-                if f_type == 'TOP' and highs[idx] > highs[last_stroke_end[0]]:
-                    old = strokes.pop()
-                    replaced_candidates.append(old)
-                    strokes.append((idx, f_type))
-                    last_stroke_end = (idx, f_type)
-                elif f_type == 'BOTTOM' and lows[idx] < lows[last_stroke_end[0]]:
-                    old = strokes.pop()
-                    replaced_candidates.append(old)
-                    strokes.append((idx, f_type))
-                    last_stroke_end = (idx, f_type)
-                continue
-            
-            if dist < min_dist:
-                continue
-            
-            pending = (idx, f_type)
-            continue
-        
-        pending_idx, pending_type = pending
-        
-        if f_type == pending_type:
-            if f_type == 'TOP':
-                if highs[idx] > highs[pending_idx]:
-                    replaced_candidates.append(pending)
-                    pending = (idx, f_type)
-            elif f_type == 'BOTTOM':
-                if lows[idx] < lows[pending_idx]:
-                    replaced_candidates.append(pending)
-                    pending = (idx, f_type)
-        else:
-            if last_stroke_end is not None:
-                dist = pending_idx - last_stroke_end[0]
-                if dist < min_dist:
-                    replaced_candidates.append(pending)
-                    
-                    if f_type == last_stroke_end[1]:
-                        if f_type == 'TOP' and highs[idx] > highs[last_stroke_end[0]]:
-                            old = strokes.pop()
-                            replaced_candidates.append(old)
-                            strokes.append((idx, f_type))
-                            last_stroke_end = (idx, f_type)
-                        elif f_type == 'BOTTOM' and lows[idx] < lows[last_stroke_end[0]]:
-                            old = strokes.pop()
-                            replaced_candidates.append(old)
-                            strokes.append((idx, f_type))
-                            last_stroke_end = (idx, f_type)
-                        pending = None
-                    else:
-                        pending = (idx, f_type)
-                    continue
-            
-            strokes.append(pending)
-            last_stroke_end = pending
-            pending = (idx, f_type)
-    
-    if pending is not None:
-        if last_stroke_end is not None:
-            dist = pending[0] - last_stroke_end[0]
-            if dist >= min_dist:
-                strokes.append(pending)
-            else:
-                replaced_candidates.append(pending)
-        else:
-            strokes.append(pending)
-    
+    """使用正式的笔过滤实现 (fractals.compute_strokes)，只替换 MIN_DIST"""
+    col_dt, col_open, col_high, col_low, col_close = _detect_columns(df)
+    result = compute_strokes(df[col_high].to_numpy(), df[col_low].to_numpy(),
+                             StrokeRules(min_dist=min_dist))
     return {
-        'strokes': strokes,
-        'replaced': replaced_candidates,
-        'raw_count': raw_count,
+        'strokes': result.strokes,
+        'replaced': result.replaced,
+        'raw_count': result.raw_count,
         'min_dist': min_dist
     }
 
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+"""
+watch.py
+监视 data/raw: 数据文件写入完成后，只对发生变化的品种运行增量流水线
+(检查点续算 + 笔端点变更集，见 run_pipeline.py --incremental --delta)，
+CSV 和图表在新数据落地后数秒内刷新，不重新扫描整个品种池。
+
+按固定间隔轮询目录 (只读取文件的修改时间和大小)；文件签名在 --debounce 秒内不再变化才视为写入完成，
+fetch_data.py 等写入过程中的中间状态不会触发处理。同一品种处理期间再次变化时，在本次完成后重新处理一次。
+工作进程异常退出 (进程池损坏) 时记为失败，重建进程池并逐个重新处理受影响的文件；
+单独处理时仍然异常退出的文件最多重试 MAX_CRASH_RETRIES 次，文件再次变化前不再处理。
+
+用法:
+    # 监视 data/raw (Ctrl+C 退出)
+    uv run watch.py
+
+    # 启动时先处理一遍已有文件，2 个进程，只生成 PNG
+    uv run watch.py --process-existing --workers 2 --plots png
+
+    # 轮询间隔 0.5 秒，写入稳定 1 秒后处理
+    uv run watch.py --interval 0.5 --debounce 1
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+
+# 添加项目根目录到 path
+PROJECT_ROOT = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from run_pipeline import DATA_RAW_DIR, METRICS_FILE, SUPPORTED_EXTENSIONS
+
+
+# Excel 打开文件时生成的锁文件、下载/写入中的临时文件
+IGNORED_PREFIXES = ('~$', '.')
+IGNORED_SUFFIXES = ('.tmp', '.part')
+
+# 单独处理时工作进程异常退出，同一文件最多连续重新处理的次数 (文件再次变化或处理完成后重新计数)
+MAX_CRASH_RETRIES = 2
+
+
+class DirectoryPoller:
+    """
+    轮询目录中的数据文件，返回写入完成 (签名稳定) 且与上次处理时不同的文件。
+
+    文件签名为 (修改时间 ns, 大小)。
+    """
+
+    def __init__(self, directory: Path, debounce: float = 2.0,
+                 extensions=SUPPORTED_EXTENSIONS, process_existing: bool = False):
+        """
+        Args:
+            directory: 监视的目录
+            debounce: 签名保持不变多少秒后视为写入完成
+            extensions: 数据文件扩展名
+            process_existing: 是否把启动时已有的文件也视为待处理
+        """
+        self.directory = Path(directory)
+        self.debounce = debounce
+        self.extensions = {e.lower() for e in extensions}
+        # 已处理 (或启动时已存在) 的文件签名
+        self._seen: dict[Path, tuple] = {} if process_existing else dict(self._scan())
+        # 变化中的文件: {path: (签名, 最后一次变化的时间)}
+        self._pending: dict[Path, tuple] = {}
+
+    def _scan(self):
+        """目录中数据文件的 (路径, 签名)"""
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            name = entry.name
+            if (name.startswith(IGNORED_PREFIXES) or name.lower().endswith(IGNORED_SUFFIXES)
+                    or Path(name).suffix.lower() not in self.extensions):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            yield Path(entry.path), (st.st_mtime_ns, st.st_size)
+
+    def poll(self, now: Optional[float] = None) -> list[Path]:
+        """
+        扫描一次目录。
+
+        Args:
+            now: 当前时间 (time.monotonic())，None 表示取当前值
+
+        Returns:
+            list[Path]: 写入完成、等待处理的文件 (返回后即记为已处理)
+        """
+        now = time.monotonic() if now is None else now
+        current = dict(self._scan())
+        ready = []
+        for path, sig in current.items():
+            if self._seen.get(path) == sig:
+                self._pending.pop(path, None)
+                continue
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != sig:
+                self._pending[path] = (sig, now)
+            elif now - pending[1] >= self.debounce:
+                ready.append(path)
+                self._seen[path] = sig
+                del self._pending[path]
+        # 已删除的文件
+        for path in set(self._seen) - set(current):
+            del self._seen[path]
+        for path in set(self._pending) - set(current):
+            del self._pending[path]
+        return sorted(ready)
+
+
+def _process_file(path: str, plots: str, verbose: bool):
+    """工作进程: 对单个文件运行增量流水线，返回计量记录 (失败时状态为 failed)"""
+    from run_pipeline import main as run_symbol
+    from src.instrument import PipelineMetrics, ProfileConfig
+    metrics = PipelineMetrics(input_file=path, profile=ProfileConfig.from_env())
+    try:
+        with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+            run_symbol(path, metrics=metrics, plots=plots, incremental=True, delta=True)
+    except Exception as e:
+        metrics.status = 'failed'
+        metrics.error = metrics.error or f"{type(e).__name__}: {e}"
+    return metrics
+
+
+def _crashed_metrics(path: Path, exc: BaseException):
+    """工作进程异常退出 (未返回计量记录) 时的失败记录"""
+    from src.instrument import PipelineMetrics
+    metrics = PipelineMetrics(input_file=str(path))
+    metrics.status = 'failed'
+    metrics.error = f"工作进程异常退出 ({type(exc).__name__}: {exc})"
+    return metrics
+
+
+def _report(path: Path, metrics) -> None:
+    """打印一个品种的处理结果"""
+    stamp = time.strftime('%H:%M:%S')
+    if metrics.status != 'ok':
+        print(f"[{stamp}] ❌ {path.name}: {metrics.error}")
+        return
+    resumed = metrics.counters.get('resumed_bars', 0)
+    mode = f"续算 (跳过 {resumed} 根)" if resumed else "从头计算"
+    print(f"[{stamp}] ✅ {path.name}  {metrics.wall_s:.2f}s  {mode}  "
+          f"笔端点 {metrics.counters.get('strokes', 0)}")
+
+
+def watch(directory: Path = DATA_RAW_DIR, interval: float = 1.0, debounce: float = 2.0,
+          workers: Optional[int] = None, plots: str = 'all', process_existing: bool = False,
+          verbose: bool = False, metrics_path: Optional[Path] = METRICS_FILE,
+          max_cycles: Optional[int] = None) -> None:
+    """
+    监视目录并处理变化的数据文件，直到 Ctrl+C (或达到 max_cycles)。
+
+    Args:
+        directory: 监视的目录
+        interval: 轮询间隔 (秒)
+        debounce: 文件签名保持不变多少秒后开始处理
+        workers: 并行处理的品种数 (进程数)，None 表示 min(4, CPU 核数)
+        plots: 静态图表格式 'none' / 'png' / 'svg' / 'all'
+        process_existing: 启动时是否先处理已有文件
+        verbose: 是否显示流水线的完整输出
+        metrics_path: 计量记录追加写入的文件，None 表示不写入
+        max_cycles: 轮询次数上限 (用于测试)，None 表示不限
+    """
+    from src.instrument import write_jsonl
+
+    workers = workers or min(4, os.cpu_count() or 1)
+    poller = DirectoryPoller(directory, debounce=debounce, process_existing=process_existing)
+    running: dict[Path, Future] = {}
+    # 处理期间再次变化的文件，本次完成后重新处理
+    dirty: set[Path] = set()
+    # 工作进程异常退出时受影响、等待逐个重新处理的文件
+    suspects: list[Path] = []
+    # 单独处理时工作进程连续异常退出的次数
+    crashes: dict[Path, int] = {}
+
+    print(f"监视 {directory} (轮询 {interval}s，写入稳定 {debounce}s 后处理，{workers} 个进程)，Ctrl+C 退出")
+    executor = ProcessPoolExecutor(max_workers=workers)
+    cycles = 0
+    try:
+        while max_cycles is None or cycles < max_cycles:
+            cycles += 1
+            for path in poller.poll():
+                crashes.pop(path, None)
+                if path in running:
+                    dirty.add(path)
+                elif suspects:
+                    if path not in suspects:
+                        suspects.append(path)
+                else:
+                    running[path] = executor.submit(_process_file, str(path), plots, verbose)
+
+            broken = False
+            failed: list[Path] = []
+            for path, future in list(running.items()):
+                if not future.done():
+                    continue
+                del running[path]
+                try:
+                    metrics = future.result()
+                except Exception as e:
+                    # 流水线异常已在工作进程内转为失败记录，这里是工作进程本身退出 (BrokenProcessPool 等)
+                    broken = broken or isinstance(e, BrokenProcessPool)
+                    metrics = _crashed_metrics(path, e)
+                    failed.append(path)
+                else:
+                    crashes.pop(path, None)
+                _report(path, metrics)
+                if metrics_path is not None:
+                    write_jsonl([metrics], metrics_path)
+                if path in dirty and path not in failed:
+                    dirty.discard(path)
+                    if suspects:
+                        suspects.append(path)
+                    else:
+                        running[path] = executor.submit(_process_file, str(path), plots, verbose)
+
+            if broken:
+                # 进程池已不可用: 其余任务同样无法完成，一并重新处理
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ProcessPoolExecutor(max_workers=workers)
+                failed += list(running)
+                running.clear()
+            if len(failed) == 1:
+                # 只有一个文件在处理时的异常退出才计入该文件
+                path = failed[0]
+                crashes[path] = crashes.get(path, 0) + 1
+                if crashes[path] > MAX_CRASH_RETRIES:
+                    print(f"[{time.strftime('%H:%M:%S')}] ⚠️ {path.name}: 工作进程连续 {crashes[path]} 次异常退出，"
+                          f"文件再次变化前不再处理")
+                    failed.clear()
+            for path in failed:
+                dirty.discard(path)
+                if path not in suspects:
+                    suspects.append(path)
+            # 受影响的文件逐个重新处理，再次异常退出时可以确定是哪个文件
+            if suspects and not running:
+                path = suspects.pop(0)
+                running[path] = executor.submit(_process_file, str(path), plots, verbose)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n停止监视")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="监视原始数据目录，对变化的品种运行增量流水线",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+    uv run watch.py                                   # 监视 data/raw
+    uv run watch.py --process-existing --plots png    # 先处理已有文件
+        """
+    )
+    parser.add_argument("directory", nargs="?", type=Path, default=DATA_RAW_DIR,
+                        help=f"监视的目录 (默认 {DATA_RAW_DIR})")
+    parser.add_argument("--interval", type=float, default=1.0, help="轮询间隔秒数，默认 1")
+    parser.add_argument("--debounce", type=float, default=2.0,
+                        help="文件写入稳定多少秒后开始处理，默认 2")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="并行处理的品种数 (默认 min(4, CPU 核数))")
+    parser.add_argument("--plots", choices=["none", "png", "svg", "all"], default="all",
+                        help="静态图表格式，none 表示只刷新 CSV 和交互式图表 (默认 all)")
+    parser.add_argument("--process-existing", action="store_true", help="启动时先处理目录中已有的文件")
+    parser.add_argument("--metrics", type=Path, default=METRICS_FILE,
+                        help=f"计量记录追加写入的文件 (默认 {METRICS_FILE})")
+    parser.add_argument("--no-metrics", action="store_true", help="不写入计量记录文件")
+    parser.add_argument("--verbose", action="store_true", help="显示流水线的完整输出")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    if args.workers is not None and args.workers < 1:
+        print("--workers 至少为 1")
+        return 1
+    watch(args.directory, interval=args.interval, debounce=args.debounce, workers=args.workers,
+          plots=args.plots, process_existing=args.process_existing, verbose=args.verbose,
+          metrics_path=None if args.no_metrics else args.metrics)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())